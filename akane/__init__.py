@@ -14,8 +14,17 @@ __version__ = '0.1.0'
 __license__ = 'MIT'
 
 
-from .client import Client
+from .batch import BatchClient
+from .cache import CachingClient, LRUCache
+from .client import Client, Pipeline, Transaction
+from .cluster import ClusterClient
 from .connection import Pool
-from .exceptions import PoolError
+from .pubsub import PubSub
+from .scan import ScanIterator
+from .scripting import Script
+from .sharding import ShardedClient
+from .stats import Stats
+from .exceptions import (ClusterError, ConnectionError, PoolError,
+                         TimeoutError, WatchError)
 
 from hiredis import ProtocolError, ReplyError
@@ -0,0 +1,109 @@
+"""
+    akane.aio
+    ~~~~~~~~~
+
+    A connection that runs directly on an asyncio transport.
+"""
+
+import asyncio
+
+from .connection import Connection, set_socket_options
+
+
+class AsyncioConnection(Connection, asyncio.Protocol):
+    """A :class:`akane.connection.Connection` implemented as an asyncio
+    protocol. Received data is fed to the reply parser straight from
+    :meth:`data_received`, without the read callbacks of ``IOStream``.
+
+    The connection runs on the asyncio loop of `ioloop` (a Tornado 5+
+    IOLoop), or on the current asyncio loop. Requests that are sent before
+    the connection is made are written as soon as it is.
+
+    Select it with ``'backend': 'asyncio'`` in the client settings.
+    """
+
+    Future = asyncio.Future
+
+    _transport = None
+    _lost = False
+
+    def __init__(self, host='localhost', port=6379, ioloop=None, cork=False,
+                 cork_threshold=65536, decode_responses=False,
+                 encoding='utf-8', unix_socket_path=None, keepalive=False,
+                 sndbuf=None, rcvbuf=None, max_buffer_size=None,
+                 command_timeout=None):
+        # `max_buffer_size` is accepted for compatibility with the IOStream
+        # connection. Data is parsed as it arrives, nothing is buffered.
+        self.host = host
+        self.port = port
+        self.unix_socket_path = unix_socket_path
+        self._loop = getattr(ioloop, 'asyncio_loop', None) or \
+            asyncio.get_event_loop()
+        self._setup(cork, cork_threshold, decode_responses, encoding,
+                    command_timeout)
+        self._socket_options = (keepalive, sndbuf, rcvbuf)
+
+        self._closed = False
+        self._unsent = []
+        if unix_socket_path is not None:
+            connect = self._loop.create_unix_connection(lambda: self,
+                                                        unix_socket_path)
+        else:
+            connect = self._loop.create_connection(lambda: self, host, port)
+        self._loop.create_task(connect).add_done_callback(self._connected)
+
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._transport is not None:
+            self._transport.close()
+        else:
+            self._loop.call_soon(self.connection_lost, None)
+
+    def _connected(self, task):
+        if task.cancelled() or task.exception() is not None:
+            self.connection_lost(None)
+
+    def connection_made(self, transport):
+        if self._closed:
+            transport.close()
+            return
+        self._transport = transport
+        sock = transport.get_extra_info('socket')
+        if sock is not None:
+            set_socket_options(sock, *self._socket_options)
+        unsent, self._unsent = self._unsent, []
+        self._write_buffers(unsent)
+
+    def data_received(self, data):
+        self._handle_read(data)
+
+    def connection_lost(self, exc):
+        # Also called for a connection that was closed before it was made.
+        if self._lost:
+            return
+        self._lost = True
+        self._closed = True
+        self._transport = None
+        self._handle_close()
+
+    def _write_buffers(self, buffers):
+        if self._transport is None:
+            if not self._closed:
+                self._unsent.extend(buffers)
+            return
+        for buf in buffers:
+            self._transport.write(buf)
+
+    def _call_soon(self, callback):
+        self._loop.call_soon(callback)
+
+    def _call_later(self, delay, callback):
+        return self._loop.call_later(delay, callback)
+
+    def _cancel_call(self, timer):
+        timer.cancel()
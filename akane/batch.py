@@ -0,0 +1,106 @@
+"""
+    akane.batch
+    ~~~~~~~~~~~
+
+    Batches single key reads that are done in the same IOLoop iteration into
+    one multi-key request.
+"""
+
+
+class BatchClient(object):
+    """Wraps a :class:`akane.Client` and collects the ``GET`` and ``HGET``
+    requests that are made during one IOLoop iteration. At the end of the
+    iteration they are sent as one ``MGET`` and one ``HMGET`` per hash and
+    the replies are handed to the original callbacks.
+
+    A key that is already requested and is waiting for a reply is not
+    requested again; the callback is added to the request that is in
+    flight. This means a read can't observe a write that was sent after
+    the first read of the same key.
+
+    All other commands are passed to the client unchanged.
+    """
+
+    def __init__(self, client, max_batch_size=1000, ioloop=None):
+        self._client = client
+        self._max_batch_size = max_batch_size
+        self._ioloop = ioloop or client._pool._ioloop
+        self._flush_scheduled = False
+
+        # Callbacks per requested key, for batched and in flight requests.
+        self._get_callbacks = {}
+        self._hget_callbacks = {}
+
+        # Keys that still have to be sent.
+        self._get_batch = []
+        self._hget_batch = {}
+        self._batch_size = 0
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def get(self, key, callback=None):
+        callback, future = self._client._future_callback(callback)
+        callbacks = self._get_callbacks.get(key)
+        if callbacks is not None:
+            callbacks.append(callback)
+            return future
+        self._get_callbacks[key] = [callback]
+        self._get_batch.append(key)
+        self._batched()
+        return future
+
+    def hget(self, key, field, callback=None):
+        callback, future = self._client._future_callback(callback)
+        callbacks = self._hget_callbacks.get((key, field))
+        if callbacks is not None:
+            callbacks.append(callback)
+            return future
+        self._hget_callbacks[(key, field)] = [callback]
+        self._hget_batch.setdefault(key, []).append(field)
+        self._batched()
+        return future
+
+    def _batched(self):
+        self._batch_size += 1
+        if self._batch_size >= self._max_batch_size:
+            self.flush()
+        elif not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._ioloop.add_callback(self.flush)
+
+    def flush(self):
+        """Send all batched requests."""
+        self._flush_scheduled = False
+        self._batch_size = 0
+
+        if self._get_batch:
+            keys, self._get_batch = self._get_batch, []
+            self._client.mget(keys, callback=self._mget_callback(keys))
+
+        if self._hget_batch:
+            batch, self._hget_batch = self._hget_batch, {}
+            for key, fields in batch.items():
+                self._client.hmget(key, fields,
+                                   callback=self._hmget_callback(key, fields))
+
+    def _mget_callback(self, keys):
+        def callback(values):
+            _dispatch(self._get_callbacks, keys, values)
+        return callback
+
+    def _hmget_callback(self, key, fields):
+        def callback(values):
+            _dispatch(self._hget_callbacks,
+                      [(key, field) for field in fields], values)
+        return callback
+
+
+def _dispatch(callbacks, keys, values):
+    # An error is handed to every callback of the batch.
+    if isinstance(values, Exception):
+        values = [values] * len(keys)
+    for key, value in zip(keys, values):
+        for callback in callbacks.pop(key):
+            if callback is not None:
+                callback(value)
@@ -0,0 +1,139 @@
+"""
+    akane.bulk
+    ~~~~~~~~~~
+
+    Loading large amounts of commands with a bounded amount of them in
+    flight.
+"""
+
+from itertools import islice
+
+from .exceptions import ConnectionError, PoolError, TimeoutError
+from .protocol import buffer_size, text_type
+
+
+# Errors after which no more commands can be sent.
+_FATAL = (ConnectionError, PoolError, TimeoutError)
+
+
+def request_size(args):
+    """Return about the number of bytes of the encoded request `args`."""
+    size = 16
+    for arg in args:
+        if isinstance(arg, (bytes, bytearray, memoryview)):
+            size += buffer_size(arg) + 16
+        elif isinstance(arg, text_type):
+            size += len(arg) + 16
+        else:
+            size += len(str(arg)) + 16
+    return size
+
+
+class BulkLoader(object):
+    """Sends the commands of an iterable in chunks of `chunk_size`, each in
+    a single write, on a reserved connection (so they are executed in
+    order). The iterable is only read as far as needed: when `max_pending`
+    replies or `max_bytes` of requests are in flight, nothing is sent until
+    both are down to half of that again. This bounds the memory that's used
+    in the client, in the socket buffers and in Redis no matter how many
+    commands there are.
+
+    Error replies don't stop the load. They're counted and the first
+    `max_errors` are kept with the index and the arguments of the command.
+    `progress` is called with the number of replies and errors so far every
+    time the replies of a chunk have arrived.
+
+    Created by :meth:`akane.Client.bulk_load`.
+    """
+
+    def __init__(self, pool, commands, callback, chunk_size=1000,
+                 max_pending=10000, max_bytes=16 * 1024 * 1024,
+                 max_errors=1000, progress=None):
+        self._pool = pool
+        self._commands = iter(commands)
+        self._callback = callback
+        self._chunk_size = chunk_size
+        self._max_pending = max_pending
+        self._max_bytes = max_bytes
+        self._max_errors = max_errors
+        self._progress = progress
+
+        self._conn = None
+        self._sent = 0
+        self._replies = 0
+        self._pending = 0
+        self._bytes = 0
+        self._errors = 0
+        self._failed = []
+        self._exhausted = False
+        self._fatal = None
+
+    def start(self):
+        self._pool.reserve(self._reserved)
+
+    def _reserved(self, conn):
+        if isinstance(conn, PoolError):
+            self._callback(conn)
+            return
+        self._conn = conn
+        self._fill()
+
+    def _fill(self):
+        # Send chunks until the input is exhausted or a high watermark has
+        # been reached.
+        while not self._exhausted and self._fatal is None and \
+                self._pending < self._max_pending and \
+                self._bytes < self._max_bytes:
+            chunk = list(islice(self._commands, self._chunk_size))
+            if not chunk:
+                self._exhausted = True
+                break
+            size = sum(request_size(args) for args in chunk)
+            start = self._sent
+            self._sent += len(chunk)
+            self._pending += len(chunk)
+            self._bytes += size
+            self._conn.send_requests(self._replied_callback(start, chunk,
+                                                            size), chunk)
+        if not self._pending and (self._exhausted or
+                                  self._fatal is not None):
+            self._finish()
+
+    def _replied_callback(self, start, chunk, size):
+        def replied(replies):
+            self._pending -= len(chunk)
+            self._bytes -= size
+            self._replies += len(chunk)
+            for i, reply in enumerate(replies):
+                if not isinstance(reply, Exception):
+                    continue
+                if isinstance(reply, _FATAL):
+                    self._fatal = reply
+                self._errors += 1
+                if len(self._failed) < self._max_errors:
+                    self._failed.append((start + i, chunk[i], reply))
+            if self._progress is not None:
+                self._progress(self._replies, self._errors)
+
+            if self._fatal is not None:
+                if not self._pending:
+                    self._finish()
+            # Resume at the low watermarks.
+            elif self._pending <= self._max_pending // 2 and \
+                    self._bytes <= self._max_bytes // 2:
+                self._fill()
+        return replied
+
+    def _finish(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        self._pool.release(conn)
+        if self._fatal is not None:
+            self._callback(self._fatal)
+        else:
+            self._callback({
+                'commands': self._replies,
+                'errors': self._errors,
+                'failed': self._failed
+            })
@@ -0,0 +1,348 @@
+"""
+    akane.cache
+    ~~~~~~~~~~~
+
+    An in-process cache for frequently read keys.
+"""
+
+import time
+from collections import OrderedDict
+
+from .client import Commands
+from .commands import COMMANDS, WRITE
+from .protocol import text_type
+from .pubsub import PubSub
+
+
+_MISSING = object()
+
+# Seconds before the keyspace notifications are subscribed to again after
+# the connection was lost. The delay doubles with every attempt.
+RESUBSCRIBE_DELAY = 0.1
+MAX_RESUBSCRIBE_DELAY = 10.0
+
+
+def _normalize_key(key):
+    # Entries are indexed by the key as bytes, so ``'k'``, ``b'k'`` and the
+    # key of a keyspace notification all find the same entries.
+    if isinstance(key, bytes):
+        return key
+    if not isinstance(key, text_type):
+        key = str(key)
+    return key.encode('utf-8')
+
+
+def _copy(value):
+    # Cached hashes and lists are copied, so callers can't change the
+    # cached value.
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return list(value)
+    return value
+
+
+class LRUCache(object):
+    """A cache that holds at most `max_size` entries. When it's full the
+    least recently used entry is evicted. Entries expire after `ttl`
+    seconds, unless a different TTL is given when the entry is stored.
+    """
+
+    def __init__(self, max_size=10000, ttl=None, evict_callback=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._evict_callback = evict_callback
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        entry = self._entries.pop(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+
+        value, expires = entry
+        if expires is not None and expires <= time.time():
+            self.misses += 1
+            self.expirations += 1
+            self._evicted(key)
+            return default
+
+        # Move the entry to the end, which is the most recently used side.
+        self._entries[key] = entry
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        expires = time.time() + ttl if ttl is not None else None
+
+        self._entries.pop(key, None)
+        self._entries[key] = (value, expires)
+        while len(self._entries) > self.max_size:
+            evicted = next(iter(self._entries))
+            del self._entries[evicted]
+            self.evictions += 1
+            self._evicted(evicted)
+
+    def delete(self, key):
+        if self._entries.pop(key, _MISSING) is not _MISSING:
+            self._evicted(key)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+    def _evicted(self, key):
+        if self._evict_callback is not None:
+            self._evict_callback(key)
+
+
+class CachingClient(Commands):
+    """Wraps a :class:`akane.Client` and caches the replies of ``GET``,
+    ``HGET`` and ``HGETALL`` in an :class:`LRUCache`.
+
+    Every write through this client (any command that's marked as a write
+    in :mod:`akane.commands`, also in pipelines, transactions and bulk
+    loads) invalidates the cached entries of its keys immediately. Writes
+    by other clients are picked up through keyspace notifications when
+    `notifications` is enabled, which requires ``notify-keyspace-events``
+    to be set on the server (``KA`` covers all commands). Until the
+    subscription is confirmed the cache is bypassed. When the notification
+    connection is lost the cache is cleared and bypassed until a new
+    subscription is confirmed.
+
+    All other methods are passed to the client unchanged.
+    """
+
+    _closed = False
+
+    def __init__(self, client, max_size=10000, ttl=None, notifications=True,
+                 db=0):
+        self._client = client
+        self._cache = LRUCache(max_size, ttl, self._entry_evicted)
+
+        # Cache keys per Redis key, so all entries of a key can be dropped.
+        self._entries = {}
+
+        # A read that is in flight while its key is invalidated must not
+        # store its (possibly outdated) reply.
+        self._reads = {}
+        self._versions = {}
+
+        self.invalidations = 0
+
+        self._listener = None
+        self._subscribed = not notifications
+        if notifications:
+            self._prefix = '__keyspace@%d__:' % db
+            self._resubscribe_delay = RESUBSCRIBE_DELAY
+            self._subscribe()
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def _create_future(self):
+        return self._client._create_future()
+
+    def send_request(self, callback, *args):
+        self._invalidate_request(args)
+        return self._client.send_request(callback, *args)
+
+    def _invalidate_request(self, args):
+        command = COMMANDS.get(args[0])
+        if command is None or command.flag != WRITE:
+            return
+        if not command.first_key and command.numkeys is None:
+            # Writes without keys, like ``FLUSHDB``.
+            self.clear()
+            return
+        for key in command.keys(args):
+            self.invalidate(key)
+
+    def pipeline(self):
+        """Return a pipeline of the client whose writes invalidate the
+        cache.
+        """
+        return _Invalidating(self, self._client.pipeline())
+
+    def transaction(self, callback=None, watch=(), timeout=None):
+        """Like :meth:`akane.Client.transaction`, the writes of the
+        transaction invalidate the cache.
+        """
+        callback, future = self._future_callback(callback)
+
+        def started(transaction):
+            if not isinstance(transaction, Exception):
+                transaction = _Invalidating(self, transaction)
+            callback(transaction)
+        self._client.transaction(started, watch, timeout)
+        return future
+
+    def bulk_load(self, commands, callback=None, **kwargs):
+        """Like :meth:`akane.Client.bulk_load`, every write invalidates the
+        cache right before it's sent.
+        """
+        def invalidating():
+            for args in commands:
+                self._invalidate_request(args)
+                yield args
+        return self._client.bulk_load(invalidating(), callback, **kwargs)
+
+    def stats(self):
+        """Return the cache statistics."""
+        stats = self._cache.stats()
+        stats['invalidations'] = self.invalidations
+        return stats
+
+    def invalidate(self, key):
+        """Drop all cached entries of `key`."""
+        key = _normalize_key(key)
+        if key in self._reads:
+            self._versions[key] += 1
+        cache_keys = self._entries.pop(key, None)
+        if cache_keys is None:
+            return
+        self.invalidations += 1
+        for cache_key in list(cache_keys):
+            self._cache.delete(cache_key)
+
+    def clear(self):
+        """Drop all cached entries."""
+        for key in self._reads:
+            self._versions[key] += 1
+        self._entries.clear()
+        self._cache.clear()
+
+    def close(self):
+        self._closed = True
+        if self._listener is not None:
+            listener, self._listener = self._listener, None
+            listener.close()
+        self.clear()
+
+    def _subscribe(self):
+        listener = self._listener = PubSub(self._client._pool)
+        listener.set_close_callback(
+            lambda: self._listener_closed(listener))
+        listener.psubscribe([self._prefix + '*'], self._handle_notifications,
+                            callback=self._subscription_confirmed)
+
+    def _subscription_confirmed(self):
+        self._subscribed = True
+        self._resubscribe_delay = RESUBSCRIBE_DELAY
+
+    def _listener_closed(self, listener):
+        if self._closed or listener is not self._listener:
+            return
+        # Nothing invalidates the cache until there's a new subscription.
+        self._subscribed = False
+        self._listener = None
+        self.clear()
+
+        delay = self._resubscribe_delay
+        self._resubscribe_delay = min(delay * 2, MAX_RESUBSCRIBE_DELAY)
+        ioloop = self._client._pool._ioloop
+        ioloop.add_timeout(time.time() + delay, self._resubscribe)
+
+    def _resubscribe(self):
+        if not self._closed:
+            self._subscribe()
+
+    def get(self, key, callback=None):
+        return self._read(('GET', key), key, callback, self._client.get,
+                          key)
+
+    def hget(self, key, field, callback=None):
+        return self._read(('HGET', key, field), key, callback,
+                          self._client.hget, key, field)
+
+    def hgetall(self, key, callback=None):
+        return self._read(('HGETALL', key), key, callback,
+                          self._client.hgetall, key)
+
+    def _read(self, cache_key, key, callback, method, *args):
+        if not self._subscribed:
+            return method(*args, callback=callback)
+
+        callback, future = self._future_callback(callback)
+        value = self._cache.get(cache_key, _MISSING)
+        if value is not _MISSING:
+            callback(_copy(value))
+            return future
+
+        key = _normalize_key(key)
+        if key in self._reads:
+            self._reads[key] += 1
+        else:
+            self._reads[key] = 1
+            self._versions[key] = 0
+        version = self._versions[key]
+
+        def wraps(reply):
+            if self._versions[key] == version and self._subscribed and \
+                    not isinstance(reply, Exception):
+                self._cache.set(cache_key, _copy(reply))
+                self._entries.setdefault(key, set()).add(cache_key)
+
+            self._reads[key] -= 1
+            if not self._reads[key]:
+                del self._reads[key]
+                del self._versions[key]
+
+            callback(reply)
+        method(*args, callback=wraps)
+        return future
+
+    def _entry_evicted(self, cache_key):
+        key = _normalize_key(cache_key[1])
+        cache_keys = self._entries.get(key)
+        if cache_keys is not None:
+            cache_keys.discard(cache_key)
+            if not cache_keys:
+                del self._entries[key]
+
+    def _handle_notifications(self, pattern, messages):
+        # The channel is the prefix and the key, the message is the event.
+        start = len(self._prefix)
+        for channel, event in messages:
+            self.invalidate(channel[start:])
+
+
+class _Invalidating(Commands):
+    """Passes the requests of a pipeline or transaction on, after
+    invalidating the cached entries of the keys they write.
+    """
+
+    def __init__(self, cache, target):
+        self._cache = cache
+        self._target = target
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    def __len__(self):
+        return len(self._target)
+
+    def _create_future(self):
+        return self._target._create_future()
+
+    def send_request(self, callback, *args):
+        self._cache._invalidate_request(args)
+        return self._target.send_request(callback, *args)
@@ -6,179 +6,509 @@
     supported commands.
 """
 
-from .connection import Pool
-
-
-class Client(object):
-    def __init__(self, settings={}):
-        self._pool = Pool(**settings)
+import logging
 
-    def send_request(self, callback, *args):
-        conn = self._pool.get_free_conn()
-        conn.send_request(callback, *args)
+from .bulk import BulkLoader
+from .commands import COMMANDS, REPLY_CONVERTERS
+from .connection import Pool
+from .exceptions import ConnectionError, PoolError, TimeoutError, WatchError
+from .pubsub import PubSub
+from .scan import ScanIterator
+from .scripting import Script
 
-    # Keys
 
-    def delete(self, keys, callback=None):
-        self.send_request(callback, 'DEL', *keys)
+log = logging.getLogger(__name__)
 
-    def dump(self, key, callback=None):
-        self.send_request(callback, 'DUMP', key)
+# Values of at least this many bytes are streamed by `Client.get_stream`.
+STREAM_THRESHOLD = 1024 * 1024
 
-    def exists(self, key, callback=None):
-        self.send_request(callback, 'EXISTS', key)
 
-    def expire(self, key, seconds, callback=None):
-        self.send_request(callback, 'EXPIRE', key, seconds)
+def convert_reply(args, reply):
+    converter = REPLY_CONVERTERS.get(args[0])
+    if converter is None or isinstance(reply, Exception):
+        return reply
+    return converter(reply, args)
 
-    def expire_at(self, key, timestamp, callback=None):
-        self.send_request(callback, 'EXPIREAT', key, timestamp)
 
-    def keys(self, pattern, callback=None):
-        self.send_request(callback, 'KEYS', pattern)
+def client_settings(settings):
+    """Split `settings` into the settings of the client and those of the
+    connection pools.
+    """
+    settings = dict(settings)
+    retries = settings.pop('retries', 0)
+    return retries, settings
 
-    def migrate(self, host, port, key, destination_db, timeout, callback=None):
-        self.send_request(callback, 'MIGRATE', host, port, key, destination_db, timeout)
 
-    def move(self, key, db, callback=None):
-        self.send_request(callback, 'MOVE', key, db)
+class Commands(object):
+    """The methods of the Redis commands, shared by :class:`Client` and
+    :class:`Pipeline`. They all go through :meth:`send_request`.
+    """
 
-    def object(self, subcommand, arguments=(), callback=None):
-        self.send_request(callback, 'OBJECT', subcommand, *arguments)
-
-    def persist(self, key, callback=None):
-        self.send_request(callback, 'PERSIST', key)
+    def send_request(self, callback, *args):
+        raise NotImplementedError
 
-    def pexpire(self, key, milliseconds, callback=None):
-        self.send_request(callback, 'PEXPIRE', key, milliseconds)
+    def _future_callback(self, callback):
+        # Without a callback the reply (or error) is set on a Future, which
+        # is returned by the command.
+        if callback is not None:
+            return callback, None
+        future = self._create_future()
+        return _resolve(future), future
 
-    def pexpire_at(self, key, milliseconds_timestamp, callback=None):
-        self.send_request(callback, 'PEXPIREAT', key, milliseconds_timestamp)
+    def _create_future(self):
+        return self._pool.create_future()
 
-    def pttl(self, key, callback=None):
-        self.send_request(callback, 'PTTL', key)
+    def _wrap_callback(self, callback, args):
+        def wraps(reply):
+            callback(convert_reply(args, reply))
+        return wraps
 
-    def random_key(self, callback=None):
-        self.send_request(callback, 'RANDOMKEY')
+    # Commands that don't map their arguments one to one. The other
+    # commands are generated from the table in :mod:`akane.commands`.
 
-    def rename(self, key, newkey, callback=None):
-        self.send_request(callback, 'RENAME', key, newkey)
+    def delete(self, keys, callback=None):
+        return self.send_request(callback, 'DEL', *keys)
 
-    def rename_nx(self, key, newkey, callback=None):
-        self.send_request(callback, 'RENAMENX', key, newkey)
+    def object(self, subcommand, arguments=(), callback=None):
+        return self.send_request(callback, 'OBJECT', subcommand, *arguments)
 
-    def restore(self, key, ttl, serialized_value, callback=None):
-        self.send_request(callback, 'RESTORE', key, ttl, serialized_value)
+    def mget(self, keys, callback=None):
+        return self.send_request(callback, 'MGET', *keys)
 
-    # TODO: SORT - http://redis.io/commands/sort
+    def mset(self, mapping, callback=None):
+        return self.send_request(callback, 'MSET', *_pairs(mapping))
 
-    def ttl(self, key, callback=None):
-        self.send_request(callback, 'TTL', key)
+    def mset_nx(self, mapping, callback=None):
+        return self.send_request(callback, 'MSETNX', *_pairs(mapping))
 
-    def type(self, key, callback=None):
-        self.send_request(callback, 'TYPE', key)
+    def hmget(self, key, fields, callback=None):
+        return self.send_request(callback, 'HMGET', key, *fields)
 
-    # Strings
+    def hmset(self, key, mapping, callback=None):
+        return self.send_request(callback, 'HMSET', key, *_pairs(mapping))
 
-    # TODO: APPEND - http://redis.io/commands/append
-    # TODO: GETRANGE - http://redis.io/commands/getrange
+    def zadd(self, key, score_member, callback=None):
+        return self.send_request(callback, 'ZADD', key, *score_member)
 
-    def mget(self, keys, callback=None):
-        self.send_request(callback, 'MGET', *keys)
+    def zrange(self, key, start, stop, with_scores=False, callback=None):
+        if with_scores:
+            return self.send_request(callback, 'ZRANGE', key, start, stop,
+                                     'WITHSCORES')
+        return self.send_request(callback, 'ZRANGE', key, start, stop)
 
-    # TODO: SETBIT - http://redis.io/commands/setbit
+    def eval(self, script, keys=(), args=(), callback=None):
+        return self.send_request(callback, 'EVAL', script, len(keys),
+                          *(tuple(keys) + tuple(args)))
 
-    def decr(self, key, callback=None):
-        self.send_request(callback, 'DECR', key)
+    def evalsha(self, sha, keys=(), args=(), callback=None):
+        return self.send_request(callback, 'EVALSHA', sha, len(keys),
+                          *(tuple(keys) + tuple(args)))
 
-    def getset(self, key, value, callback=None):
-        self.send_request(callback, 'GETSET', key, value)
+    def script_exists(self, shas, callback=None):
+        return self.send_request(callback, 'SCRIPT', 'EXISTS', *shas)
 
-    def mset(self, mapping, callback=None):
-        items = []
-        for pair in mapping.iteritems():
-            items.extend(pair)
-        self.send_request(callback, 'MSET', *items)
+    def script_flush(self, callback=None):
+        return self.send_request(callback, 'SCRIPT', 'FLUSH')
 
-    # TODO: SETEX - http://redis.io/commands/setex
+    def script_kill(self, callback=None):
+        return self.send_request(callback, 'SCRIPT', 'KILL')
 
-    def decrby(self, key, by, callback=None):
-        self.send_request(callback, 'DECRBY', key, by)
+    def script_load(self, script, callback=None):
+        return self.send_request(callback, 'SCRIPT', 'LOAD', script)
 
-    def incr(self, key, callback=None):
-        self.send_request(callback, 'INCR', key)
 
-    # TODO: MSETNX - http://redis.io/commands/msetnx
-    # TODO: SETNX - http://redis.io/commands/setnx
+class Client(Commands):
+    """A client for one Redis server. `settings` are passed to the
+    :class:`Pool`, except for `retries`: the number of times a read-only
+    command is sent again (on another connection) when its connection was
+    lost or timed out.
+    """
 
-    def get(self, key, callback=None):
-        self.send_request(callback, 'GET', key)
+    _retries = 0
 
-    def incrby(self, key, by, callback=None):
-        self.send_request(callback, 'INCRBY', key, by)
+    def __init__(self, settings={}):
+        self._retries, settings = client_settings(settings)
+        self._pool = Pool(**settings)
+        self._scripts = {}
 
-    # TODO: PSETNX - http://redis.io/commands/psetnx
-    # TODO: SETRANGE - http://redis.io/commands/setrange
-    # TODO: GETBIT - http://redis.io/commands/getbit
-    # TODO: INCRBYFLOAT - http://redis.io/commands/incrbyfloat
+    def send_request(self, callback, *args):
+        callback, future = self._future_callback(callback)
+        self._send_request(self._pool, callback, args)
+        return future
+
+    def _send_request(self, pool, callback, args):
+        if callback is not None:
+            if args[0] in REPLY_CONVERTERS:
+                callback = self._wrap_callback(callback, args)
+            if self._retries:
+                command = COMMANDS.get(args[0])
+                if command is not None and command.readonly:
+                    callback = self._retry_callback(pool, callback, args,
+                                                    self._retries)
+        self._acquire_and_send(pool, callback, args)
+
+    def _acquire_and_send(self, pool, callback, args):
+        def send(conn):
+            if isinstance(conn, PoolError):
+                if callback is not None:
+                    callback(conn)
+                return
+            conn.send_request(callback, *args)
+        pool.acquire(send)
+
+    def _retry_callback(self, pool, callback, args, retries):
+        def wraps(reply):
+            if isinstance(reply, (ConnectionError, TimeoutError)):
+                if retries > 1:
+                    retry = self._retry_callback(pool, callback, args,
+                                                 retries - 1)
+                else:
+                    retry = callback
+                self._acquire_and_send(pool, retry, args)
+            else:
+                callback(reply)
+        return wraps
+
+    def _stream_request(self, pool, callback, sink, threshold, args):
+        callback, future = self._future_callback(callback)
+
+        # The connection is reserved so no other requests are queued
+        # before the streamed one.
+        def reserved(conn):
+            if isinstance(conn, PoolError):
+                callback(conn)
+                return
+
+            def done(reply):
+                pool.release(conn)
+                callback(reply)
+            conn.send_stream_request(done, sink, threshold, *args)
+        pool.reserve(reserved)
+        return future
+
+    def get_stream(self, key, sink, threshold=STREAM_THRESHOLD,
+                   callback=None):
+        """Like :meth:`get`, but a value of at least `threshold` bytes is
+        streamed to `sink` instead of being returned. `sink` is a function
+        that is called with every chunk, or a writable buffer (like a
+        ``bytearray`` or ``mmap``) that is large enough for the value. The
+        callback gets the size of a streamed value instead of the value.
+        """
+        return self._stream_request(self._pool, callback, sink, threshold,
+                                    ('GET', key))
+
+    def dump_stream(self, key, sink, threshold=STREAM_THRESHOLD,
+                    callback=None):
+        """Like :meth:`get_stream`, for the serialized value of ``DUMP``."""
+        return self._stream_request(self._pool, callback, sink, threshold,
+                                    ('DUMP', key))
+
+    def pipeline(self):
+        """Return a :class:`Pipeline` that buffers commands and sends them
+        to Redis in one write.
+        """
+        return Pipeline(self._pool)
+
+    def transaction(self, callback=None, watch=(), timeout=None):
+        """Reserve a connection and call `callback` with a
+        :class:`Transaction` that uses it. When `watch` is given the keys
+        are watched before the callback is called. `callback` is called
+        with a `PoolError` if no connection became available within
+        `timeout` seconds.
+        """
+        callback, future = self._future_callback(callback)
+
+        def reserved(conn):
+            if isinstance(conn, PoolError):
+                callback(conn)
+                return
+
+            # Without watched keys there's nothing to read first, the
+            # commands are queued right away.
+            transaction = Transaction(self._pool, conn, queueing=not watch)
+            if not watch:
+                callback(transaction)
+                return
+
+            def watched(reply):
+                if isinstance(reply, Exception):
+                    transaction.discard(callback=_log_error('UNWATCH'))
+                    callback(reply)
+                else:
+                    callback(transaction)
+            transaction.watch(watch, callback=watched)
+        self._pool.reserve(reserved, timeout)
+        return future
+
+    def bulk_load(self, commands, callback=None, chunk_size=1000,
+                  max_pending=10000, max_bytes=16 * 1024 * 1024,
+                  max_errors=1000, progress=None):
+        """Send every command (a tuple of arguments, like ``('ZADD', key,
+        0, member)``) of the iterable `commands`, pipelined in chunks and
+        with a bounded amount in flight (see :class:`akane.bulk.BulkLoader`).
+        `callback` is called with a dictionary with the number of commands
+        that got a reply, the number of errors and the first `max_errors`
+        errors as ``(index, args, error)`` tuples. If the connection is
+        lost it's called with the error instead.
+        """
+        callback, future = self._future_callback(callback)
+        BulkLoader(self._pool, commands, callback, chunk_size, max_pending,
+                   max_bytes, max_errors, progress).start()
+        return future
+
+    def register_script(self, source):
+        """Return a :class:`Script` for `source` and load it into the
+        script cache of the server, so the first call doesn't have to send
+        the source either. If loading fails the error is logged, and the
+        first call sends the source with ``EVAL``.
+        """
+        script = Script(self, source)
+        if script.sha not in self._scripts:
+            self._scripts[script.sha] = script
+            script.load(callback=_log_error('loading script %s'
+                                            % script.sha))
+        return self._scripts[script.sha]
+
+    def load_scripts(self, callback=None):
+        """Load all registered scripts into the script cache of the server
+        again, for example after it has been flushed.
+        """
+        pipe = self.pipeline()
+        for script in self._scripts.values():
+            pipe.script_load(script.source)
+        return pipe.execute(callback)
+
+    def scan_iter(self, match=None, count=None, type=None):
+        """Return a :class:`ScanIterator` over the keys in the database."""
+        return ScanIterator(self, 'SCAN', None, match, count, type)
+
+    def hscan_iter(self, key, match=None, count=None):
+        """Return a :class:`ScanIterator` over the fields of a hash."""
+        return ScanIterator(self, 'HSCAN', key, match, count)
+
+    def sscan_iter(self, key, match=None, count=None):
+        """Return a :class:`ScanIterator` over the members of a set."""
+        return ScanIterator(self, 'SSCAN', key, match, count)
+
+    def zscan_iter(self, key, match=None, count=None):
+        """Return a :class:`ScanIterator` over the members of a sorted
+        set.
+        """
+        return ScanIterator(self, 'ZSCAN', key, match, count)
+
+    def pubsub(self):
+        """Return a :class:`PubSub` with its own connection."""
+        return PubSub(self._pool)
+
+    def stats(self):
+        """Return the statistics of the connection pool."""
+        return self._pool.stats()
+
+
+def _resolve(future):
+    def callback(reply):
+        if isinstance(reply, Exception):
+            future.set_exception(reply)
+        else:
+            future.set_result(reply)
+    return callback
 
-    def set(self, key, value, callback=None):
-        self.send_request(callback, 'SET', key, value)
 
-    def strlen(self, key, callback=None):
-        self.send_request(callback, 'STRLEN', key)
+def _log_error(action):
+    # The callback of a request that nobody waits for. Errors are logged,
+    # instead of being set on a Future that is never read.
+    def callback(reply):
+        if isinstance(reply, Exception):
+            log.warning('%s failed: %s', action, reply)
+    return callback
 
-    # Hashes
 
-    # TODO: HDEL - http://redis.io/commands/hdel
-    # TODO: HINCRBY - http://redis.io/commands/hincrby
-    # TODO: HMGET - http://redis.io/commands/hmget
-    # TODO: HVALS - http://redis.io/commands/hvals
-    # TODO: HEXISTS - http://redis.io/commands/hexists
-    # TODO: HINCRBYFLOAT - http://redis.io/commands/hincrbyfloat
-    # TODO: HMSET - http://redis.io/commands/hmset
+def _pairs(mapping):
+    items = []
+    for pair in mapping.items():
+        items.extend(pair)
+    return items
 
-    def hset(self, key, field, value, callback=None):
-        self.send_request(callback, 'HSET', key, field, value)
 
-    # TODO: HKEYS - http://redis.io/commands/hkeys
+def _command_method(command):
+    def method(self, *args, **kwargs):
+        callback = kwargs.pop('callback', None)
+        if kwargs:
+            raise TypeError('unexpected keyword arguments: %s'
+                            % ', '.join(kwargs))
+        if not command.check_arity(len(args) + 1):
+            raise TypeError('wrong number of arguments for %s' % command.name)
+        return self.send_request(callback, command.name, *args)
+    method.__name__ = command.method
+    method.__doc__ = 'Send ``%s``.' % command.name
+    return method
 
-    def hget(self, key, field, callback=None):
-        self.send_request(callback, 'HGET', key, field)
 
-    def hgetall(self, key, callback=None):
-        def wraps(hash_list):
-            hash_dict = {}
-            for i in xrange(0, len(hash_list), 2):
-                hash_dict[hash_list[i]] = hash_list[i+1]
-            callback(hash_dict)
-        self.send_request(wraps, 'HGETALL', key)
+for _command in COMMANDS.values():
+    if _command.method is not None and \
+            not hasattr(Commands, _command.method):
+        setattr(Commands, _command.method, _command_method(_command))
+del _command
 
-    # TODO: HLEN - http://redis.io/commands/hlen
-    # TODO: HSETNX - http://redis.io/commands/hsetnx
 
-    # TODO: Lists
-    # TODO: Sets
+class Pipeline(Commands):
+    """Buffers commands until :meth:`execute` is called. All buffered
+    commands are then sent in a single write and the replies are returned
+    as a list. A command that failed has a ``ReplyError`` in its place in
+    the list. Pipelines can be reused after they have been executed.
 
-    # Sorted Sets
+    Usage::
 
-    def zadd(self, key, score_member, callback=None):
-        self.send_request(callback, 'ZADD', key, *score_member)
+        pipe = client.pipeline()
+        pipe.set('key', 'value')
+        pipe.get('key')
+        pipe.execute(callback)  # callback(['OK', 'value'])
+    """
 
-    def zcard(self, key, callback=None):
-        self.send_request(callback, 'ZCARD', key)
+    def __init__(self, pool):
+        self._pool = pool
+        self._commands = []
 
-    def zrank(self, key, member, callback=None):
-        self.send_request(callback, 'ZRANK', key, member)
+    def __len__(self):
+        return len(self._commands)
 
-    def zrange(self, key, start, stop, with_scores=False, callback=None):
-        if with_scores:
-            self.send_request(callback, 'ZRANGE', key, start, stop, 'WITHSCORES')
-        else:
-            self.send_request(callback, 'ZRANGE', key, start, stop)
+    def send_request(self, callback, *args):
+        self._commands.append((callback, args))
+
+    def reset(self):
+        """Discard all buffered commands."""
+        self._commands = []
+
+    def execute(self, callback=None):
+        callback, future = self._future_callback(callback)
+        commands, self._commands = self._commands, []
+        if not commands:
+            callback([])
+            return future
+
+        def wraps(replies):
+            results = []
+            for (cb, args), reply in zip(commands, replies):
+                reply = convert_reply(args, reply)
+                if cb is not None:
+                    cb(reply)
+                results.append(reply)
+            callback(results)
+
+        def send(conn):
+            if isinstance(conn, PoolError):
+                wraps([conn] * len(commands))
+                return
+            conn.send_requests(wraps, [args for cb, args in commands])
+        self._pool.acquire(send)
+        return future
+
+
+class Transaction(Pipeline):
+    """A ``MULTI``/``EXEC`` block on a reserved connection. Transactions are
+    created with :meth:`Client.transaction`.
+
+    When keys are watched, commands are sent right away until :meth:`multi`
+    is called, so the keys can be read on the same connection. After
+    :meth:`multi` (which is where transactions without watched keys start)
+    the commands are buffered and :meth:`execute` sends them wrapped in
+    ``MULTI`` and ``EXEC`` in a single write. :meth:`execute` raises a
+    `ValueError` when :meth:`multi` hasn't been called. The callback of
+    :meth:`execute` gets the list of replies, or a `WatchError` when a
+    watched key was changed. The connection goes back to the pool when the
+    transaction is executed or discarded.
+
+    Usage::
+
+        def start(tr):
+            tr.get('counter', callback=partial(update, tr))
+
+        def update(tr, value):
+            tr.multi()
+            tr.set('counter', int(value or 0) + 1)
+            tr.execute(callback)
+
+        client.transaction(start, watch=('counter',))
+    """
+
+    def __init__(self, pool, conn, queueing=False):
+        Pipeline.__init__(self, pool)
+        self._conn = conn
+        self._queueing = queueing
 
-    # TODO: Pub/Sub
-    # TODO: Transactions
-    # TODO: Scripting
-    # TODO: Connection
-    # TODO: Server
+    def send_request(self, callback, *args):
+        if self._conn is None:
+            raise PoolError('transaction is finished')
+        if self._queueing:
+            Pipeline.send_request(self, callback, *args)
+            return
+        return self._send_now(callback, args)
+
+    def _send_now(self, callback, args):
+        callback, future = self._future_callback(callback)
+        if args[0] in REPLY_CONVERTERS:
+            callback = self._wrap_callback(callback, args)
+        self._conn.send_request(callback, *args)
+        return future
+
+    def watch(self, keys, callback=None):
+        """Watch `keys` on the connection of the transaction. This is
+        also possible after :meth:`multi`, as ``MULTI`` is only sent by
+        :meth:`execute`.
+        """
+        if self._conn is None:
+            raise PoolError('transaction is finished')
+        return self._send_now(callback, ('WATCH',) + tuple(keys))
+
+    def unwatch(self, callback=None):
+        if self._conn is None:
+            raise PoolError('transaction is finished')
+        return self._send_now(callback, ('UNWATCH',))
+
+    def multi(self):
+        """Start buffering commands."""
+        self._queueing = True
+
+    def execute(self, callback=None):
+        if self._conn is None:
+            raise PoolError('transaction is finished')
+        if not self._queueing:
+            # The commands so far have been executed on their own.
+            raise ValueError('multi() has not been called')
+        callback, future = self._future_callback(callback)
+        commands, self._commands = self._commands, []
+        requests = [('MULTI',)] + [args for cb, args in commands] + [('EXEC',)]
+
+        def wraps(replies):
+            self._finish()
+            result = replies[-1]
+            if result is None:
+                result = WatchError('watched keys have been changed')
+            elif not isinstance(result, Exception):
+                results = []
+                for (cb, args), reply in zip(commands, result):
+                    reply = convert_reply(args, reply)
+                    if cb is not None:
+                        cb(reply)
+                    results.append(reply)
+                result = results
+            callback(result)
+
+        self._conn.send_requests(wraps, requests)
+        return future
+
+    def discard(self, callback=None):
+        """Forget the buffered commands, unwatch all keys and give the
+        connection back to the pool.
+        """
+        if self._conn is None:
+            raise PoolError('transaction is finished')
+        callback, future = self._future_callback(callback)
+        self._commands = []
+        self._conn.send_request(callback, 'UNWATCH')
+        self._finish()
+        return future
+
+    def _finish(self):
+        conn, self._conn = self._conn, None
+        self._pool.release(conn)
@@ -0,0 +1,306 @@
+"""
+    akane.cluster
+    ~~~~~~~~~~~~~
+
+    A client for Redis Cluster.
+"""
+
+import random
+
+from hiredis import ReplyError
+
+from .client import Pipeline, client_settings, convert_reply
+from .connection import Pool
+from .exceptions import ClusterError, PoolError
+from .protocol import native_str
+from .sharding import ShardedClient, command_key, _group_request, \
+    _parse_node
+
+
+SLOTS = 16384
+
+
+def _crc16_table():
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for j in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xffff
+            else:
+                crc = (crc << 1) & 0xffff
+        table.append(crc)
+    return table
+
+_CRC16_TABLE = _crc16_table()
+
+
+def crc16(data):
+    """CRC16-CCITT (XMODEM), the checksum Redis Cluster uses for keys."""
+    crc = 0
+    for byte in bytearray(data):
+        crc = ((crc << 8) & 0xffff) ^ _CRC16_TABLE[((crc >> 8) ^ byte) & 0xff]
+    return crc
+
+
+def key_slot(key):
+    """Return the hash slot of `key`. Like in Redis, only the part between
+    the first ``{`` and the following ``}`` is hashed if it's not empty.
+    """
+    if not isinstance(key, bytes):
+        key = key.encode('utf-8')
+    start = key.find(b'{')
+    if start != -1:
+        end = key.find(b'}', start + 1)
+        if end > start + 1:
+            key = key[start + 1:end]
+    return crc16(key) % SLOTS
+
+
+def _redirection(reply):
+    # Return ``(kind, slot, host, port)`` for MOVED and ASK errors.
+    if not isinstance(reply, ReplyError):
+        return None
+    parts = str(reply).split()
+    if len(parts) != 3 or parts[0] not in ('MOVED', 'ASK'):
+        return None
+    host, port = parts[2].rsplit(':', 1)
+    return parts[0], int(parts[1]), host, int(port)
+
+
+class ClusterClient(ShardedClient):
+    """A client for Redis Cluster.
+
+    The client asks one of the `startup_nodes` for the slot layout with
+    ``CLUSTER SLOTS`` and keeps a table of the node for every one of the
+    16384 slots. Key slots are computed locally (hash tags included), so
+    commands are sent straight to the node that owns the key.
+
+    A ``MOVED`` reply updates the table, triggers a refresh of the whole
+    layout and the command is sent again to the new node. An ``ASK`` reply
+    sends the command once more to the given node, preceded by ``ASKING``.
+    After `max_redirects` redirections the callback gets a `ClusterError`.
+
+    ``MGET``, ``MSET`` and ``DEL`` are split per slot and the requests for
+    the slots of a node are sent in one write, like pipelines. Values are
+    streamed from the node of their slot, without following redirections.
+    Transactions, bulk loads and pub/sub are not supported.
+    """
+
+    max_redirects = 5
+
+    def __init__(self, startup_nodes, settings={}):
+        self._retries, self._settings = client_settings(settings)
+        self._pools = {}
+        self._scripts = {}
+        self._slots = [None] * SLOTS
+        self._refresh_callbacks = None
+
+        for node in startup_nodes:
+            node = _parse_node(node)
+            self._node(node['host'], node['port'])
+        self.refresh_slots()
+
+    def _node(self, host, port):
+        name = '%s:%d' % (host, port)
+        if name not in self._pools:
+            self._pools[name] = Pool(**dict(self._settings, host=host,
+                                            port=port))
+        return name
+
+    def _group(self, key):
+        return key_slot(key)
+
+    def _group_pool(self, slot):
+        name = self._slots[slot]
+        if name is None:
+            # The slot is not known (yet), the node will redirect.
+            name = next(iter(self._pools))
+        return self._pools[name]
+
+    def refresh_slots(self, callback=None):
+        """Fetch the slot layout of the cluster. Refreshes that are
+        requested while one is in progress share its result.
+        """
+        if self._refresh_callbacks is not None:
+            self._refresh_callbacks.append(callback)
+            return
+        self._refresh_callbacks = [callback]
+
+        def handle(reply):
+            if not isinstance(reply, Exception):
+                slots = [None] * SLOTS
+                # [[start, end, [host, port, id], replica, ...], ...]
+                for entry in reply:
+                    start, end, master = entry[0], entry[1], entry[2]
+                    name = self._node(native_str(master[0]),
+                                      int(master[1]))
+                    slots[start:end + 1] = [name] * (end - start + 1)
+                self._slots = slots
+
+            callbacks, self._refresh_callbacks = self._refresh_callbacks, None
+            for cb in callbacks:
+                if cb is not None:
+                    cb(reply)
+
+        pool = random.choice(list(self._pools.values()))
+        ShardedClient._send_request(self, pool, handle, ('CLUSTER', 'SLOTS'))
+
+    def _send_request(self, pool, callback, args, redirects=0):
+        def wraps(reply):
+            redirection = _redirection(reply)
+            if redirection is not None:
+                self._redirect(redirection, callback, args, redirects + 1)
+            elif callback is not None:
+                callback(reply)
+        ShardedClient._send_request(self, pool, wraps, args)
+
+    def _redirect(self, redirection, callback, args, redirects):
+        kind, slot, host, port = redirection
+        if redirects > self.max_redirects:
+            if callback is not None:
+                callback(ClusterError('too many redirections for slot %d'
+                                      % slot))
+            return
+
+        name = self._node(host, port)
+        pool = self._pools[name]
+        if kind == 'MOVED':
+            self._slots[slot] = name
+            self.refresh_slots()
+            self._send_request(pool, callback, args, redirects)
+            return
+
+        # The slot is being migrated. ASKING only applies to the next
+        # command on the same connection, so both are sent together.
+        def wraps(replies):
+            reply = replies[1]
+            redirection = _redirection(reply)
+            if redirection is not None:
+                self._redirect(redirection, callback, args, redirects + 1)
+            elif callback is not None:
+                callback(convert_reply(args, reply))
+
+        def send(conn):
+            if isinstance(conn, PoolError):
+                wraps([conn, conn])
+            else:
+                conn.send_requests(wraps, [('ASKING',), args])
+        pool.acquire(send)
+
+    def _send_grouped(self, command, keys, values, callback):
+        # One request per slot, but the requests for the slots of a node
+        # are sent in a single write. Redirected requests are sent again
+        # on their own.
+        slots = {}
+        for i, key in enumerate(keys):
+            slots.setdefault(key_slot(key), []).append(i)
+
+        if not slots:
+            callback([])
+            return
+
+        nodes = {}
+        for slot, indexes in slots.items():
+            nodes.setdefault(self._group_pool(slot), []).append(indexes)
+
+        replies = []
+        def add(indexes, reply):
+            replies.append((indexes, reply))
+            if len(replies) == len(slots):
+                callback(replies)
+
+        def redirected(indexes):
+            return lambda reply: add(indexes, reply)
+
+        def collect(groups, requests):
+            def wraps(group_replies):
+                for indexes, args, reply in zip(groups, requests,
+                                                group_replies):
+                    redirection = _redirection(reply)
+                    if redirection is None:
+                        add(indexes, convert_reply(args, reply))
+                    else:
+                        self._redirect(redirection, redirected(indexes),
+                                       args, 1)
+            return wraps
+
+        for pool, groups in nodes.items():
+            requests = [_group_request(command, keys, values, indexes)
+                        for indexes in groups]
+            self._send_group(pool, collect(groups, requests), requests)
+
+    def _send_group(self, pool, callback, requests):
+        # Send `requests` in a single write on one connection of `pool`.
+        def send(conn):
+            if isinstance(conn, PoolError):
+                callback([conn] * len(requests))
+            else:
+                conn.send_requests(callback, requests)
+        pool.acquire(send)
+
+    def pipeline(self):
+        return ClusterPipeline(self)
+
+
+class ClusterPipeline(Pipeline):
+    """A pipeline for :class:`ClusterClient`. On :meth:`execute` the
+    commands are grouped per node and every group is sent in a single
+    write. Commands that are redirected are sent again on their own. The
+    replies are returned in the order the commands were added.
+    """
+
+    def __init__(self, client):
+        Pipeline.__init__(self, None)
+        self._client = client
+
+    def _create_future(self):
+        return self._client._create_future()
+
+    def execute(self, callback=None):
+        callback, future = self._future_callback(callback)
+        commands, self._commands = self._commands, []
+        if not commands:
+            callback([])
+            return future
+
+        groups = {}
+        for i, (cb, args) in enumerate(commands):
+            pool = self._client.get_pool(command_key(args))
+            groups.setdefault(pool, []).append(i)
+
+        results = [None] * len(commands)
+        outstanding = [len(groups)]
+
+        def done():
+            outstanding[0] -= 1
+            if outstanding[0]:
+                return
+            for (cb, args), reply in zip(commands, results):
+                if cb is not None:
+                    cb(reply)
+            callback(results)
+
+        def store(i):
+            def wraps(reply):
+                results[i] = reply
+                done()
+            return wraps
+
+        def collect(indexes):
+            def wraps(replies):
+                for i, reply in zip(indexes, replies):
+                    redirection = _redirection(reply)
+                    if redirection is None:
+                        results[i] = convert_reply(commands[i][1], reply)
+                    else:
+                        outstanding[0] += 1
+                        self._client._redirect(redirection, store(i),
+                                               commands[i][1], 1)
+                done()
+            return wraps
+
+        for pool, indexes in groups.items():
+            self._client._send_group(pool, collect(indexes),
+                                     [commands[i][1] for i in indexes])
+        return future
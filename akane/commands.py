@@ -0,0 +1,331 @@
+"""
+    akane.commands
+    ~~~~~~~~~~~~~~
+
+    A table of the Redis commands with their arity, key positions, whether
+    they only read data and how their replies are converted.
+
+    The encoded protocol prefix of every command (``$3\\r\\nSET\\r\\n``, and
+    for commands with a fixed number of arguments the complete header
+    ``*3\\r\\n$3\\r\\nSET\\r\\n``) is created once when this module is
+    imported.
+"""
+
+
+READ = 'read'
+WRITE = 'write'
+
+
+# Reply converters get the reply and the arguments of the request. Every
+# converter makes a single pass over the reply.
+
+def hash_reply(hash_list, args=None):
+    it = iter(hash_list)
+    return dict(zip(it, it))
+
+
+def bool_reply(reply, args=None):
+    return reply == 1
+
+
+def float_reply(reply, args=None):
+    if reply is None:
+        return None
+    return float(reply)
+
+
+def pairs_reply(reply, args=None):
+    it = iter(reply)
+    return [(member, float(score)) for member, score in zip(it, it)]
+
+
+def _has_option(args, option):
+    for arg in args:
+        if isinstance(arg, bytes):
+            arg = arg.decode('ascii', 'replace')
+        if hasattr(arg, 'upper') and arg.upper() == option:
+            return True
+    return False
+
+
+def scores_reply(reply, args):
+    """Convert the reply of ``ZRANGE`` and friends to ``(member, score)``
+    pairs if ``WITHSCORES`` was given.
+    """
+    if _has_option(args[4:], 'WITHSCORES'):
+        return pairs_reply(reply)
+    return reply
+
+
+class Command(object):
+    """A Redis command.
+
+    `arity` is the number of arguments including the command name, like in
+    the output of ``COMMAND``. A negative arity means at least that many
+    arguments. Keys are found at `first_key` up to `last_key` (negative
+    counts from the end) in steps of `key_step`. Commands like ``EVAL`` have
+    the number of keys at `numkeys` and the keys right after it.
+    """
+
+    __slots__ = ('name', 'arity', 'first_key', 'last_key', 'key_step',
+                 'numkeys', 'flag', 'method', 'reply', 'name_prefix',
+                 'prefix')
+
+    def __init__(self, name, arity, first_key, last_key, key_step, flag,
+                 method, reply=None, numkeys=None):
+        self.name = name
+        self.arity = arity
+        self.first_key = first_key
+        self.last_key = last_key
+        self.key_step = key_step
+        self.numkeys = numkeys
+        self.flag = flag
+        self.method = method
+        self.reply = reply
+
+        encoded = name.encode('ascii')
+        self.name_prefix = b'$' + str(len(encoded)).encode('ascii') + \
+            b'\r\n' + encoded + b'\r\n'
+        if arity > 0:
+            self.prefix = b'*' + str(arity).encode('ascii') + b'\r\n' + \
+                self.name_prefix
+        else:
+            self.prefix = None
+
+    @property
+    def readonly(self):
+        return self.flag == READ
+
+    def check_arity(self, count):
+        """Check the number of arguments, including the command name."""
+        if self.arity >= 0:
+            return count == self.arity
+        return count >= -self.arity
+
+    def keys(self, args):
+        """Return the keys in `args`, which starts with the command name."""
+        keys = []
+        if self.first_key:
+            last = self.last_key
+            if last < 0:
+                last += len(args)
+            keys.extend(args[self.first_key:last + 1:self.key_step])
+        if self.numkeys is not None:
+            start = self.numkeys + 1
+            keys.extend(args[start:start + int(args[self.numkeys])])
+        return keys
+
+
+def _table(entries):
+    commands = {}
+    for entry in entries:
+        command = Command(*entry)
+        commands[command.name] = command
+    return commands
+
+
+# The method is the name of the generated `Client` method, or None when the
+# command doesn't get one (because it depends on the state of a connection
+# or has a hand-written method).
+COMMANDS = _table([
+    # name, arity, first key, last key, key step, flag, method
+
+    # Keys
+    ('COPY', -3, 1, 2, 1, WRITE, 'copy'),
+    ('DEL', -2, 1, -1, 1, WRITE, None),
+    ('DUMP', 2, 1, 1, 1, READ, 'dump'),
+    ('EXISTS', -2, 1, -1, 1, READ, 'exists'),
+    ('EXPIRE', 3, 1, 1, 1, WRITE, 'expire', bool_reply),
+    ('EXPIREAT', 3, 1, 1, 1, WRITE, 'expire_at', bool_reply),
+    ('KEYS', 2, 0, 0, 0, READ, 'keys'),
+    ('MIGRATE', -6, 3, 3, 1, WRITE, 'migrate'),
+    ('MOVE', 3, 1, 1, 1, WRITE, 'move', bool_reply),
+    ('OBJECT', -2, 2, 2, 1, READ, None),
+    ('PERSIST', 2, 1, 1, 1, WRITE, 'persist', bool_reply),
+    ('PEXPIRE', 3, 1, 1, 1, WRITE, 'pexpire', bool_reply),
+    ('PEXPIREAT', 3, 1, 1, 1, WRITE, 'pexpire_at',
+     bool_reply),
+    ('PTTL', 2, 1, 1, 1, READ, 'pttl'),
+    ('RANDOMKEY', 1, 0, 0, 0, READ, 'random_key'),
+    ('RENAME', 3, 1, 2, 1, WRITE, 'rename'),
+    ('RENAMENX', 3, 1, 2, 1, WRITE, 'rename_nx', bool_reply),
+    ('RESTORE', -4, 1, 1, 1, WRITE, 'restore'),
+    ('SCAN', -2, 0, 0, 0, READ, 'scan'),
+    ('SORT', -2, 1, 1, 1, WRITE, 'sort'),
+    ('TOUCH', -2, 1, -1, 1, READ, 'touch'),
+    ('TTL', 2, 1, 1, 1, READ, 'ttl'),
+    ('TYPE', 2, 1, 1, 1, READ, 'type'),
+    ('UNLINK', -2, 1, -1, 1, WRITE, 'unlink'),
+    ('WAIT', 3, 0, 0, 0, None, 'wait'),
+
+    # Strings
+    ('APPEND', 3, 1, 1, 1, WRITE, 'append'),
+    ('BITCOUNT', -2, 1, 1, 1, READ, 'bitcount'),
+    ('BITOP', -4, 2, -1, 1, WRITE, 'bitop'),
+    ('BITPOS', -3, 1, 1, 1, READ, 'bitpos'),
+    ('DECR', 2, 1, 1, 1, WRITE, 'decr'),
+    ('DECRBY', 3, 1, 1, 1, WRITE, 'decrby'),
+    ('GET', 2, 1, 1, 1, READ, 'get'),
+    ('GETBIT', 3, 1, 1, 1, READ, 'getbit'),
+    ('GETDEL', 2, 1, 1, 1, WRITE, 'getdel'),
+    ('GETRANGE', 4, 1, 1, 1, READ, 'getrange'),
+    ('GETSET', 3, 1, 1, 1, WRITE, 'getset'),
+    ('INCR', 2, 1, 1, 1, WRITE, 'incr'),
+    ('INCRBY', 3, 1, 1, 1, WRITE, 'incrby'),
+    ('INCRBYFLOAT', 3, 1, 1, 1, WRITE, 'incrbyfloat', float_reply),
+    ('MGET', -2, 1, -1, 1, READ, None),
+    ('MSET', -3, 1, -1, 2, WRITE, None),
+    ('MSETNX', -3, 1, -1, 2, WRITE, None, bool_reply),
+    ('PSETEX', 4, 1, 1, 1, WRITE, 'psetex'),
+    ('SET', -3, 1, 1, 1, WRITE, 'set'),
+    ('SETBIT', 4, 1, 1, 1, WRITE, 'setbit'),
+    ('SETEX', 4, 1, 1, 1, WRITE, 'setex'),
+    ('SETNX', 3, 1, 1, 1, WRITE, 'set_nx', bool_reply),
+    ('SETRANGE', 4, 1, 1, 1, WRITE, 'setrange'),
+    ('STRLEN', 2, 1, 1, 1, READ, 'strlen'),
+
+    # Hashes
+    ('HDEL', -3, 1, 1, 1, WRITE, 'hdel'),
+    ('HEXISTS', 3, 1, 1, 1, READ, 'hexists', bool_reply),
+    ('HGET', 3, 1, 1, 1, READ, 'hget'),
+    ('HGETALL', 2, 1, 1, 1, READ, 'hgetall', hash_reply),
+    ('HINCRBY', 4, 1, 1, 1, WRITE, 'hincrby'),
+    ('HINCRBYFLOAT', 4, 1, 1, 1, WRITE, 'hincrbyfloat',
+     float_reply),
+    ('HKEYS', 2, 1, 1, 1, READ, 'hkeys'),
+    ('HLEN', 2, 1, 1, 1, READ, 'hlen'),
+    ('HMGET', -3, 1, 1, 1, READ, None),
+    ('HMSET', -4, 1, 1, 1, WRITE, None),
+    ('HSCAN', -3, 1, 1, 1, READ, 'hscan'),
+    ('HSET', -4, 1, 1, 1, WRITE, 'hset'),
+    ('HSETNX', 4, 1, 1, 1, WRITE, 'hset_nx', bool_reply),
+    ('HSTRLEN', 3, 1, 1, 1, READ, 'hstrlen'),
+    ('HVALS', 2, 1, 1, 1, READ, 'hvals'),
+
+    # Lists
+    ('BLPOP', -3, 1, -2, 1, WRITE, 'blpop'),
+    ('BRPOP', -3, 1, -2, 1, WRITE, 'brpop'),
+    ('BRPOPLPUSH', 4, 1, 2, 1, WRITE, 'brpoplpush'),
+    ('LINDEX', 3, 1, 1, 1, READ, 'lindex'),
+    ('LINSERT', 5, 1, 1, 1, WRITE, 'linsert'),
+    ('LLEN', 2, 1, 1, 1, READ, 'llen'),
+    ('LMOVE', 5, 1, 2, 1, WRITE, 'lmove'),
+    ('LPOP', -2, 1, 1, 1, WRITE, 'lpop'),
+    ('LPOS', -3, 1, 1, 1, READ, 'lpos'),
+    ('LPUSH', -3, 1, 1, 1, WRITE, 'lpush'),
+    ('LPUSHX', -3, 1, 1, 1, WRITE, 'lpushx'),
+    ('LRANGE', 4, 1, 1, 1, READ, 'lrange'),
+    ('LREM', 4, 1, 1, 1, WRITE, 'lrem'),
+    ('LSET', 4, 1, 1, 1, WRITE, 'lset'),
+    ('LTRIM', 4, 1, 1, 1, WRITE, 'ltrim'),
+    ('RPOP', -2, 1, 1, 1, WRITE, 'rpop'),
+    ('RPOPLPUSH', 3, 1, 2, 1, WRITE, 'rpoplpush'),
+    ('RPUSH', -3, 1, 1, 1, WRITE, 'rpush'),
+    ('RPUSHX', -3, 1, 1, 1, WRITE, 'rpushx'),
+
+    # Sets
+    ('SADD', -3, 1, 1, 1, WRITE, 'sadd'),
+    ('SCARD', 2, 1, 1, 1, READ, 'scard'),
+    ('SDIFF', -2, 1, -1, 1, READ, 'sdiff'),
+    ('SDIFFSTORE', -3, 1, -1, 1, WRITE, 'sdiffstore'),
+    ('SINTER', -2, 1, -1, 1, READ, 'sinter'),
+    ('SINTERSTORE', -3, 1, -1, 1, WRITE, 'sinterstore'),
+    ('SISMEMBER', 3, 1, 1, 1, READ, 'sismember', bool_reply),
+    ('SMEMBERS', 2, 1, 1, 1, READ, 'smembers'),
+    ('SMISMEMBER', -3, 1, 1, 1, READ, 'smismember'),
+    ('SMOVE', 4, 1, 2, 1, WRITE, 'smove', bool_reply),
+    ('SPOP', -2, 1, 1, 1, WRITE, 'spop'),
+    ('SRANDMEMBER', -2, 1, 1, 1, READ, 'srandmember'),
+    ('SREM', -3, 1, 1, 1, WRITE, 'srem'),
+    ('SSCAN', -3, 1, 1, 1, READ, 'sscan'),
+    ('SUNION', -2, 1, -1, 1, READ, 'sunion'),
+    ('SUNIONSTORE', -3, 1, -1, 1, WRITE, 'sunionstore'),
+
+    # Sorted Sets
+    ('ZADD', -4, 1, 1, 1, WRITE, None),
+    ('ZCARD', 2, 1, 1, 1, READ, 'zcard'),
+    ('ZCOUNT', 4, 1, 1, 1, READ, 'zcount'),
+    ('ZINCRBY', 4, 1, 1, 1, WRITE, 'zincrby', float_reply),
+    ('ZINTERSTORE', -4, 1, 1, 1, WRITE, 'zinterstore', None, 2),
+    ('ZLEXCOUNT', 4, 1, 1, 1, READ, 'zlexcount'),
+    ('ZMSCORE', -3, 1, 1, 1, READ, 'zmscore'),
+    ('ZPOPMAX', -2, 1, 1, 1, WRITE, 'zpopmax', pairs_reply),
+    ('ZPOPMIN', -2, 1, 1, 1, WRITE, 'zpopmin', pairs_reply),
+    ('ZRANGE', -4, 1, 1, 1, READ, None, scores_reply),
+    ('ZRANGEBYLEX', -4, 1, 1, 1, READ, 'zrangebylex'),
+    ('ZRANGEBYSCORE', -4, 1, 1, 1, READ, 'zrangebyscore',
+     scores_reply),
+    ('ZRANK', 3, 1, 1, 1, READ, 'zrank'),
+    ('ZREM', -3, 1, 1, 1, WRITE, 'zrem'),
+    ('ZREMRANGEBYLEX', 4, 1, 1, 1, WRITE, 'zremrangebylex'),
+    ('ZREMRANGEBYRANK', 4, 1, 1, 1, WRITE, 'zremrangebyrank'),
+    ('ZREMRANGEBYSCORE', 4, 1, 1, 1, WRITE, 'zremrangebyscore'),
+    ('ZREVRANGE', -4, 1, 1, 1, READ, 'zrevrange', scores_reply),
+    ('ZREVRANGEBYLEX', -4, 1, 1, 1, READ, 'zrevrangebylex'),
+    ('ZREVRANGEBYSCORE', -4, 1, 1, 1, READ, 'zrevrangebyscore',
+     scores_reply),
+    ('ZREVRANK', 3, 1, 1, 1, READ, 'zrevrank'),
+    ('ZSCAN', -3, 1, 1, 1, READ, 'zscan'),
+    ('ZSCORE', 3, 1, 1, 1, READ, 'zscore', float_reply),
+    ('ZUNIONSTORE', -4, 1, 1, 1, WRITE, 'zunionstore', None, 2),
+
+    # HyperLogLog
+    ('PFADD', -2, 1, 1, 1, WRITE, 'pfadd'),
+    ('PFCOUNT', -2, 1, -1, 1, READ, 'pfcount'),
+    ('PFMERGE', -2, 1, -1, 1, WRITE, 'pfmerge'),
+
+    # Pub/Sub
+    ('PSUBSCRIBE', -2, 0, 0, 0, None, None),
+    ('PUBLISH', 3, 0, 0, 0, None, 'publish'),
+    ('PUBSUB', -2, 0, 0, 0, None, 'pubsub_info'),
+    ('PUNSUBSCRIBE', -1, 0, 0, 0, None, None),
+    ('SUBSCRIBE', -2, 0, 0, 0, None, None),
+    ('UNSUBSCRIBE', -1, 0, 0, 0, None, None),
+
+    # Transactions
+    ('DISCARD', 1, 0, 0, 0, None, None),
+    ('EXEC', 1, 0, 0, 0, None, None),
+    ('MULTI', 1, 0, 0, 0, None, None),
+    ('UNWATCH', 1, 0, 0, 0, None, None),
+    ('WATCH', -2, 1, -1, 1, None, None),
+
+    # Scripting
+    ('EVAL', -3, 0, 0, 0, None, None, None, 2),
+    ('EVALSHA', -3, 0, 0, 0, None, None, None, 2),
+    ('SCRIPT', -2, 0, 0, 0, None, None),
+
+    # Connection
+    ('AUTH', -2, 0, 0, 0, None, None),
+    ('ECHO', 2, 0, 0, 0, None, 'echo'),
+    ('PING', -1, 0, 0, 0, None, 'ping'),
+    ('QUIT', 1, 0, 0, 0, None, None),
+    ('SELECT', 2, 0, 0, 0, None, None),
+
+    # Server
+    ('BGREWRITEAOF', 1, 0, 0, 0, None, 'bgrewriteaof'),
+    ('BGSAVE', -1, 0, 0, 0, None, 'bgsave'),
+    ('CLIENT', -2, 0, 0, 0, None, 'client'),
+    ('COMMAND', -1, 0, 0, 0, None, 'command'),
+    ('CONFIG', -2, 0, 0, 0, None, 'config'),
+    ('DBSIZE', 1, 0, 0, 0, READ, 'dbsize'),
+    ('FLUSHALL', -1, 0, 0, 0, WRITE, 'flushall'),
+    ('FLUSHDB', -1, 0, 0, 0, WRITE, 'flushdb'),
+    ('INFO', -1, 0, 0, 0, None, 'info'),
+    ('LASTSAVE', 1, 0, 0, 0, None, 'lastsave'),
+    ('MEMORY', -2, 0, 0, 0, None, 'memory'),
+    ('SAVE', 1, 0, 0, 0, None, 'save'),
+    ('SLOWLOG', -2, 0, 0, 0, None, 'slowlog'),
+    ('SWAPDB', 3, 0, 0, 0, WRITE, 'swapdb'),
+    ('TIME', 1, 0, 0, 0, None, 'time'),
+
+    # Cluster
+    ('ASKING', 1, 0, 0, 0, None, None),
+    ('CLUSTER', -2, 0, 0, 0, None, None),
+    ('READONLY', 1, 0, 0, 0, None, None),
+])
+
+
+# Functions that convert a raw reply to a more useful Python object.
+REPLY_CONVERTERS = dict((command.name, command.reply)
+                        for command in COMMANDS.values()
+                        if command.reply is not None)
@@ -5,102 +5,865 @@
     All functionality regarding sending and receiving data to redis.
 """
 
-import sys
+import time
+import random
 import socket
+from collections import deque
 
 from tornado.ioloop import IOLoop
-from tornado import iostream
+from tornado import iostream, version_info
+
+try:
+    from tornado.concurrent import Future
+except ImportError:
+    Future = None  # Tornado < 3.0
 
 import hiredis
 
-from .exceptions import PoolError
-from .utils import redis_request
+from .exceptions import ConnectionError, PoolError, TimeoutError
+from .protocol import buffer_size, coalesce, encode_request, encode_requests
 
 
-if sys.version_info[0] < 3:
-    DELIMITER = '\r\n'
+# IOStream only accepts bytes before Tornado 4.5. Later 4.x versions accept
+# any buffer, but still copy it into their write buffer. Tornado 5 keeps
+# large buffers as they are.
+if version_info < (4, 5):
+    def _stream_buffer(buf):
+        if isinstance(buf, memoryview):
+            return buf.tobytes()
+        if isinstance(buf, bytearray):
+            return bytes(buf)
+        return buf
 else:
-    DELIMITER = b'\r\n'
+    def _stream_buffer(buf):
+        return buf
+
+
+def set_socket_options(sock, keepalive=False, sndbuf=None, rcvbuf=None):
+    """Enable ``SO_KEEPALIVE`` and set the sizes of the kernel send and
+    receive buffers of `sock`. Options that are None are left alone.
+    """
+    if keepalive:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    if sndbuf is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+    if rcvbuf is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
 
 
 class Connection(object):
 
-    _busy = False
-    _callback = None
+    # The type of the Futures that are returned when no callback is given.
+    Future = Future
+
+    _release_callback = None
+    _push_callback = None
+    _close_callback = None
+    _flush_scheduled = False
+    _bulk = None
+    _deadline_timer = None
+    _stats = None
 
-    def __init__(self, host='localhost', port=6379, ioloop=None):
+    def __init__(self, host='localhost', port=6379, ioloop=None, cork=False,
+                 cork_threshold=65536, decode_responses=False,
+                 encoding='utf-8', unix_socket_path=None, keepalive=False,
+                 sndbuf=None, rcvbuf=None, max_buffer_size=None,
+                 command_timeout=None):
         self.host = host
         self.port = port
+        self.unix_socket_path = unix_socket_path
         self._ioloop = ioloop or IOLoop.instance()
-        self._parser = hiredis.Reader(encoding="utf-8")
+        self._setup(cork, cork_threshold, decode_responses, encoding,
+                    command_timeout)
 
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0)
-        s.setsockopt(socket.SOL_TCP, socket.TCP_NODELAY, 1)
+        if unix_socket_path is not None:
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM, 0)
+            address = unix_socket_path
+        else:
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0)
+            s.setsockopt(socket.SOL_TCP, socket.TCP_NODELAY, 1)
+            address = (host, port)
+        set_socket_options(s, keepalive, sndbuf, rcvbuf)
         s.settimeout(None)
 
-        self._stream = iostream.IOStream(s, self._ioloop)
-        self._stream.connect((host, port))
+        # IOStream has its own default for the maximum buffer size.
+        stream_kwargs = {}
+        if max_buffer_size is not None:
+            stream_kwargs['max_buffer_size'] = max_buffer_size
+        self._stream = iostream.IOStream(s, self._ioloop, **stream_kwargs)
+        self._stream.set_close_callback(self._handle_close)
+        # Requests are buffered by the stream until it's connected. Reading
+        # starts once it is, a failed connect closes the stream and fails
+        # the pending requests through the close callback.
+        try:
+            self._stream.connect(address, self._start_reading)
+        except (socket.error, iostream.StreamClosedError):
+            self._stream.close()
+
+    def _setup(self, cork, cork_threshold, decode_responses, encoding,
+               command_timeout):
+        # Replies are returned as bytes, unless they should be decoded.
+        if decode_responses:
+            self._parser = hiredis.Reader(encoding=encoding)
+        else:
+            self._parser = hiredis.Reader()
+        self._callbacks = deque()
+        self._deferred_streams = deque()
+
+        # When corking is enabled requests are buffered and written once
+        # per IOLoop iteration, or as soon as `cork_threshold` bytes are
+        # buffered.
+        self._cork = cork
+        self._cork_threshold = cork_threshold
+        self._write_buffer = []
+        self._write_buffer_size = 0
+
+        # Every pending request gets a deadline. Replies arrive in order,
+        # so only the deadline of the oldest request needs a timer.
+        self._command_timeout = command_timeout
+        self._deadlines = deque()
 
     def busy(self):
-        return self._busy
+        return len(self._callbacks) > 0
+
+    def pending(self):
+        """Return the number of requests that are waiting for a reply."""
+        return len(self._callbacks)
 
     def closed(self):
-        self._stream.closed()
+        return self._stream.closed()
+
+    def close(self):
+        self._stream.close()
+
+    def set_release_callback(self, callback):
+        """Call `callback` with this connection every time a reply has been
+        handled and the number of pending requests went down.
+        """
+        self._release_callback = callback
+
+    def set_close_callback(self, callback):
+        """Call `callback` when the connection is closed. Requests that are
+        still waiting for a reply get a `ConnectionError` first.
+        """
+        self._close_callback = callback
+
+    def set_stats(self, stats):
+        """Record requests, replies and bytes in `stats` (a
+        :class:`akane.stats.Stats`).
+        """
+        self._stats = stats
+
+    def set_push_callback(self, callback):
+        """Call `callback` with replies that arrive while no request is
+        waiting for one, like Pub/Sub messages. All such replies that are
+        read at once are passed as one list.
+        """
+        self._push_callback = callback
 
     def send_request(self, callback, *args):
-        self._busy = True
-        self._callback = callback
-        self._stream.write(redis_request(args))
-        self._stream.read_until(DELIMITER, self._handle_read)
+        if self.closed():
+            self._closed_error(callback)
+            return
+        if self._stats is not None:
+            callback = self._stats.wrap(callback, args)
+        # Replies arrive in the same order as the requests are written, so
+        # the callbacks are kept in a FIFO queue and matched up one by one.
+        self._callbacks.append(callback)
+        if self._command_timeout is not None:
+            self._add_deadlines(1)
+        self._write(encode_request(args))
 
-    def _handle_read(self, data):
-        self._parser.feed(data)
+    def write_request(self, *args):
+        """Send a request without waiting for a reply. This is used for
+        commands whose replies arrive as push messages, like ``SUBSCRIBE``.
+        Raises a `ConnectionError` when the connection is closed.
+        """
+        if self.closed():
+            raise ConnectionError('connection is closed')
+        self._write(encode_request(args))
 
-        parsed_data = self._parser.gets()
-        if parsed_data is False:
-            next  = True
-            if data[0] == '$':
-                next = int(data[1:-2])
+    def send_requests(self, callback, requests):
+        """Send multiple requests in a single write. `callback` is called
+        with a list of replies, in the same order as `requests`.
+        """
+        if self.closed():
+            self._closed_error(callback, len(requests))
+            return
+
+        replies = []
+        def collect(reply):
+            replies.append(reply)
+            if len(replies) == len(requests) and callback is not None:
+                callback(replies)
+
+        if self._stats is not None:
+            self._callbacks.extend([self._stats.wrap(collect, args)
+                                    for args in requests])
         else:
-            next = False
-
-        if next is True:
-            self._stream.read_until(DELIMITER, self._handle_read)
-        elif next > 0:
-            self._stream.read_bytes(next, self._handle_read)
-        else: # if next is False
-            self._busy = False
-            cb = self._callback
-            self._callback = None
+            self._callbacks.extend([collect] * len(requests))
+        if self._command_timeout is not None:
+            self._add_deadlines(len(requests))
+        self._write(encode_requests(requests))
+
+    def _closed_error(self, callback, count=None):
+        if callback is not None:
+            error = ConnectionError('connection is closed')
+            callback(error if count is None else [error] * count)
+
+    def _add_deadlines(self, count):
+        deadline = time.time() + self._command_timeout
+        self._deadlines.extend([deadline] * count)
+        if self._deadline_timer is None:
+            self._deadline_timer = self._call_later(self._command_timeout,
+                                                    self._check_deadline)
+
+    def _check_deadline(self):
+        self._deadline_timer = None
+        if not self._deadlines:
+            return
+        now = time.time()
+        if self._deadlines[0] > now:
+            self._deadline_timer = self._call_later(self._deadlines[0] - now,
+                                                    self._check_deadline)
+            return
+
+        # The connection can't be used anymore, a reply that arrives later
+        # would be matched with the wrong request.
+        error = TimeoutError('no reply within %s seconds'
+                             % self._command_timeout)
+        callbacks, self._callbacks = self._callbacks, deque()
+        self._deadlines.clear()
+        self.close()
+        for cb in callbacks:
+            if cb is not None:
+                cb(error)
+
+    def _handle_close(self):
+        self._fail_pending(ConnectionError('connection closed'))
+        if self._close_callback is not None:
+            self._close_callback()
+
+    def _fail_pending(self, error):
+        if self._deadline_timer is not None:
+            self._cancel_call(self._deadline_timer)
+            self._deadline_timer = None
+        self._deadlines.clear()
+        self._bulk = None
+
+        callbacks, self._callbacks = self._callbacks, deque()
+        streams, self._deferred_streams = self._deferred_streams, deque()
+        for cb in callbacks:
             if cb is not None:
-                cb(parsed_data)
+                cb(error)
+        for stream in streams:
+            if stream[0] is not None:
+                stream[0](error)
+
+    def send_stream_request(self, callback, sink, threshold, *args):
+        """Send a request that replies with a bulk string, like ``GET``, and
+        stream the payload to `sink` if it's at least `threshold` bytes.
+        `sink` is either called with every chunk (a ``memoryview`` that is
+        only valid during the call) or is a writable buffer (``bytearray``,
+        ``mmap``) the payload is copied into. `callback` is called with the
+        size of the payload, or with None if the key doesn't exist.
+
+        Smaller replies and errors are passed to `callback` like any other
+        reply. Bulk replies are parsed without the reply parser, so the
+        request is only sent once all pending replies have arrived.
+        """
+        if self.closed():
+            self._closed_error(callback)
+            return
+        if self._callbacks or self._bulk is not None:
+            self._deferred_streams.append((callback, sink, threshold) + args)
+            return
+        self._bulk = _BulkReply(sink, threshold)
+        self.send_request(callback, *args)
+
+    def _write(self, buffers):
+        if self._stats is not None:
+            self._stats.bytes_sent += sum(buffer_size(buf) for buf in buffers)
+        # Large arguments are separate buffers and are written as they are
+        # instead of being copied into one request.
+        if not self._cork:
+            self._write_buffers(buffers)
+            return
+
+        self._write_buffer.extend(buffers)
+        for buf in buffers:
+            self._write_buffer_size += buffer_size(buf)
+        if self._write_buffer_size >= self._cork_threshold:
+            self.flush()
+        elif not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._call_soon(self.flush)
+
+    def flush(self):
+        """Write all buffered requests to the socket."""
+        self._flush_scheduled = False
+        if self._write_buffer:
+            buffers = coalesce(self._write_buffer)
+            self._write_buffer = []
+            self._write_buffer_size = 0
+            if self.closed():
+                # Closed while the requests were buffered, they're dropped
+                # instead of being written to the closed stream.
+                self._fail_pending(ConnectionError('connection closed'))
+                return
+            self._write_buffers(buffers)
+
+    def _write_buffers(self, buffers):
+        if len(buffers) == 1:
+            self._stream.write(_stream_buffer(buffers[0]))
+        else:
+            for buf in buffers:
+                self._stream.write(_stream_buffer(buf))
+
+    def _call_soon(self, callback):
+        self._ioloop.add_callback(callback)
+
+    def _call_later(self, delay, callback):
+        return self._ioloop.add_timeout(time.time() + delay, callback)
+
+    def _cancel_call(self, timer):
+        self._ioloop.remove_timeout(timer)
+
+    def _start_reading(self):
+        # Everything the socket receives is fed to the reply parser as soon
+        # as it arrives, instead of reading line by line.
+        self._stream.read_until_close(self._handle_read, self._handle_read)
+
+    def _handle_read(self, data):
+        if not data:
             return
+        if self._stats is not None:
+            self._stats.bytes_received += len(data)
+        if self._bulk is not None:
+            data = self._handle_bulk(data)
+            if not data:
+                return
+        self._parser.feed(data)
+
+        # A single read can contain many replies (or only a part of one),
+        # so pop replies until the parser needs more data.
+        pushed = None
+        reply = self._parser.gets()
+        while reply is not False:
+            if not self._callbacks and self._push_callback is not None:
+                if pushed is None:
+                    pushed = []
+                pushed.append(reply)
+                reply = self._parser.gets()
+                continue
+
+            cb = self._callbacks.popleft()
+            if self._deadlines:
+                self._deadlines.popleft()
+            if cb is not None:
+                cb(reply)
+            if self._release_callback is not None:
+                self._release_callback(self)
+            reply = self._parser.gets()
+
+        if pushed is not None:
+            if self._stats is not None:
+                self._stats.pushed += len(pushed)
+            self._push_callback(pushed)
+        if self._deferred_streams and not self._callbacks:
+            self.send_stream_request(*self._deferred_streams.popleft())
+
+    def _handle_bulk(self, data):
+        # Returns the data that is not part of the streamed reply.
+        bulk = self._bulk
+        data = bulk.feed(data)
+        if bulk.fallback:
+            # Not a large bulk string, the reply parser takes over.
+            self._bulk = None
+            return data
+        if bulk.done:
+            self._bulk = None
+            cb = self._callbacks.popleft()
+            if self._deadlines:
+                self._deadlines.popleft()
+            if cb is not None:
+                cb(bulk.result)
+            if self._release_callback is not None:
+                self._release_callback(self)
+            if not data and self._deferred_streams and not self._callbacks:
+                self.send_stream_request(*self._deferred_streams.popleft())
+        return data
+
+
+def connection_class(backend):
+    """Return the connection class of `backend`, ``'tornado'`` (IOStream),
+    ``'asyncio'`` (an asyncio protocol) or ``'memory'`` (an in-process
+    server, see :mod:`akane.memory`).
+    """
+    if backend == 'tornado':
+        return Connection
+    if backend == 'asyncio':
+        from .aio import AsyncioConnection
+        return AsyncioConnection
+    if backend == 'memory':
+        from .memory import MemoryConnection
+        return MemoryConnection
+    raise ValueError('unknown backend: %r' % (backend,))
+
+
+class _BulkReply(object):
+    """Parses a bulk string reply (``$<size>\\r\\n<payload>\\r\\n``) and
+    passes the payload to a sink while it arrives.
+    """
+
+    # A bulk string header is at most ``$`` + 20 digits + CRLF.
+    max_header_size = 32
+
+    def __init__(self, sink, threshold):
+        self.sink = sink
+        self.threshold = threshold
+        self.fallback = False
+        self.done = False
+        self.result = None
+        self._header = b''
+        self._left = None
+        self._crlf = 2
+        self._pos = 0
+
+    def feed(self, data):
+        """Consume `data` and return what's left after the reply. If the
+        reply isn't a bulk string of at least `threshold` bytes, `fallback`
+        is set and all data is returned.
+        """
+        if self._left is None:
+            data = self._header + data
+            end = data.find(b'\r\n')
+            if end == -1:
+                if len(data) > self.max_header_size:
+                    self.fallback = True
+                else:
+                    self._header = data
+                    data = b''
+                return data
+            if data[:1] != b'$':
+                self.fallback = True
+                return data
+
+            size = int(data[1:end])
+            if size < 0:
+                self.done = True
+                return data[end + 2:]
+            if size < self.threshold:
+                self.fallback = True
+                return data
+            if not callable(self.sink) and len(self.sink) < size:
+                self.result = ValueError(
+                    'buffer of %d bytes is too small for %d bytes'
+                    % (len(self.sink), size))
+            else:
+                self.result = size
+            self._left = size
+            data = memoryview(data)[end + 2:]
+        else:
+            data = memoryview(data)
+
+        take = min(len(data), self._left)
+        if take:
+            if not isinstance(self.result, Exception):
+                if callable(self.sink):
+                    self.sink(data[:take])
+                else:
+                    self.sink[self._pos:self._pos + take] = data[:take]
+            self._pos += take
+            self._left -= take
+            data = data[take:]
+
+        skip = min(len(data), self._crlf)
+        self._crlf -= skip
+        if not self._left and not self._crlf:
+            self.done = True
+        return data[skip:].tobytes()
+
+
+class _Waiter(object):
+
+    __slots__ = ('callback', 'start', 'reserve', 'timeout', 'active')
+
+    def __init__(self, callback, start, reserve):
+        self.callback = callback
+        self.start = start
+        self.reserve = reserve
+        self.timeout = None
+        self.active = True
 
 
 class Pool(object):
+    """A fixed amount of connections to one Redis server.
+
+    Every connection can have multiple requests in flight. When `max_pending`
+    is set, a connection with that many pending replies is not handed out
+    until some of its replies have arrived. Callers that want a connection
+    while all of them are at their limit are queued (first in, first out)
+    and served as soon as a connection is released, or get a `PoolError`
+    after `acquire_timeout` seconds.
+
+    Free connections are kept in a queue and handed out in turns, so
+    acquiring a connection does not depend on the size of the pool.
+
+    When `max_size` is set the pool is elastic and `connections` is ignored.
+    It opens `min_size` connections in the background and opens more (up to
+    `max_size`) when every connection is waiting for replies. Connections
+    that have been idle for `idle_timeout` seconds are closed again until
+    `min_size` connections are left.
+
+    A connection can also be reserved, for commands that depend on the
+    state of a connection (like ``WATCH`` and ``MULTI``). It's not handed
+    out to anyone else until it is released.
+
+    `backend` selects the connection class (see :func:`connection_class`).
+
+    A connection that is closed unexpectedly is dropped from the pool and,
+    if the pool is below its minimum size, replaced after a random delay of
+    up to `reconnect_delay` seconds. The delay doubles with every attempt
+    until a reply is received, up to `max_reconnect_delay`.
+
+    Requests sent through the connections are recorded in `stats` (a
+    :class:`akane.stats.Stats`) when it's given. It also reads the gauges
+    of :meth:`stats`.
+    """
 
     closed = True
 
-    def __init__(self, connections=1, *args, **kwargs):
+    def __init__(self, connections=1, max_pending=None, acquire_timeout=None,
+                 min_size=0, max_size=None, idle_timeout=None,
+                 backend='tornado', reconnect_delay=0.1,
+                 max_reconnect_delay=10.0, stats=None, *args, **kwargs):
         self.closed = False
+        self._connection_class = connection_class(backend)
+        self._max_pending = max_pending
+        self._acquire_timeout = acquire_timeout
+        self._ioloop = kwargs.get('ioloop') or IOLoop.instance()
+        self._conn_args = args
+        self._conn_kwargs = kwargs
         self._pool = set()
+        self._free = deque()
+        self._full = set()
+        self._reserved = set()
+        self._waiters = deque()
+        self._waiting = 0
+
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._timeouts = 0
+
+        self._idle_since = {}
+        self._idle_timeout = idle_timeout
+        self._reaper = None
+
+        self._reconnect_delay = reconnect_delay
+        self._max_reconnect_delay = max_reconnect_delay
+        self._reconnect_attempts = 0
+        self._reconnect_timers = set()
+        self._reconnecting = 0
+        self._disconnects = 0
+
+        self._stats = stats
+        if stats is not None:
+            stats.add_pool(self)
+
+        if max_size is None:
+            self._min_size = self._max_size = connections
+            for i in range(connections):
+                self._connect()
+        else:
+            self._min_size = min(min_size, max_size)
+            self._max_size = max_size
+            self._ioloop.add_callback(self._warm_up)
+            if idle_timeout is not None:
+                self._schedule_reaper()
+
+    def _connect(self):
+        # Returns None when the connection couldn't be created, a retry is
+        # then scheduled like for a connection that was closed.
+        try:
+            conn = self.create_connection()
+        except (socket.error, iostream.StreamClosedError):
+            self._disconnects += 1
+            if len(self._pool) + self._reconnecting < self._min_size:
+                self._schedule_reconnect()
+            return None
+        conn.set_release_callback(self._release)
+        conn.set_close_callback(lambda: self._connection_closed(conn))
+        self._pool.add(conn)
+        self._free.append(conn)
+        self._idle_since[conn] = time.time()
+        return conn
+
+    def _connection_closed(self, conn):
+        if self.closed or conn not in self._pool:
+            return
+        self._disconnects += 1
+        self._pool.discard(conn)
+        self._full.discard(conn)
+        self._reserved.discard(conn)
+        self._idle_since.pop(conn, None)
+        if conn in self._free:
+            self._free.remove(conn)
+        if len(self._pool) + self._reconnecting < self._min_size:
+            self._schedule_reconnect()
+
+    def _schedule_reconnect(self):
+        delay = min(self._max_reconnect_delay,
+                    self._reconnect_delay * 2 ** min(self._reconnect_attempts,
+                                                     20))
+        self._reconnect_attempts += 1
+        self._reconnecting += 1
+
+        def reconnect():
+            self._reconnect_timers.discard(timer)
+            self._reconnecting -= 1
+            if not self.closed:
+                self._connect()
+                self._serve_waiters()
+
+        # Random delays keep clients from reconnecting all at once.
+        timer = self._ioloop.add_timeout(
+            time.time() + random.uniform(0, delay), reconnect)
+        self._reconnect_timers.add(timer)
+
+    def _warm_up(self):
+        # Connections that fail are retried by `_connect`.
+        if not self.closed:
+            for i in range(self._min_size - len(self._pool) -
+                           self._reconnecting):
+                self._connect()
 
-        for i in range(connections):
-            self._pool.add(Connection(*args, **kwargs))
+    def _schedule_reaper(self):
+        self._reaper = self._ioloop.add_timeout(
+            time.time() + self._idle_timeout / 2.0, self._reap)
+
+    def _reap(self):
+        self._reaper = None
+        if self.closed:
+            return
+        now = time.time()
+        for conn in list(self._pool):
+            if len(self._pool) <= self._min_size:
+                break
+            # Closed connections are dropped by their close callback.
+            if conn.closed() or conn in self._reserved or conn.pending() or \
+                    now - self._idle_since[conn] < self._idle_timeout:
+                continue
+            self._pool.discard(conn)
+            self._full.discard(conn)
+            if conn in self._free:
+                self._free.remove(conn)
+            del self._idle_since[conn]
+            conn.close()
+        self._schedule_reaper()
+
+    def _take(self):
+        # Connections that reached `max_pending` are moved out of the free
+        # queue and are put back by `_release`.
+        found = None
+        while self._free:
+            conn = self._free.popleft()
+            if conn.closed():
+                # Dropped from the pool by its close callback.
+                continue
+            if self._max_pending is None or conn.pending() < self._max_pending:
+                self._free.append(conn)
+                found = conn
+                break
+            self._full.add(conn)
+
+        # Open a new connection instead of queueing behind pending replies.
+        if (found is None or found.pending()) and \
+                len(self._pool) + self._reconnecting < self._max_size:
+            conn = self._connect()
+            if conn is not None:
+                found = conn
+        return found
+
+    def _take_reserved(self):
+        conn = self._take()
+        if conn is not None:
+            # `_take` leaves the connection at the end of the free queue.
+            self._free.pop()
+            self._reserved.add(conn)
+        return conn
+
+    def _release(self, conn):
+        self._reconnect_attempts = 0
+        if self._idle_timeout is not None and not conn.pending():
+            self._idle_since[conn] = time.time()
+        if conn in self._full and conn.pending() < self._max_pending:
+            self._full.discard(conn)
+            self._free.append(conn)
+            self._serve_waiters()
+
+    def _serve_waiters(self):
+        while self._waiting:
+            waiter = self._waiters[0]
+            if not waiter.active:
+                self._waiters.popleft()
+                continue
+            conn = self._take_reserved() if waiter.reserve else self._take()
+            if conn is None:
+                return
+            self._waiters.popleft()
+            self._finish_waiter(waiter)
+            waiter.callback(conn)
+
+    def _finish_waiter(self, waiter):
+        waiter.active = False
+        self._waiting -= 1
+        if waiter.timeout is not None:
+            self._ioloop.remove_timeout(waiter.timeout)
+
+        wait_time = time.time() - waiter.start
+        self._wait_time += wait_time
+        if wait_time > self._max_wait_time:
+            self._max_wait_time = wait_time
+
+    def _expire_waiter(self, waiter):
+        if not waiter.active:
+            return
+        waiter.timeout = None
+        self._finish_waiter(waiter)
+        self._timeouts += 1
+        waiter.callback(PoolError('timed out waiting for a free connection'))
+
+    def acquire(self, callback, timeout=None):
+        """Call `callback` with a connection that can accept a request. If
+        no connection is available the callback is queued. It's called
+        with a `PoolError` instead of a connection when no connection
+        became available within `timeout` seconds (defaults to
+        `acquire_timeout`).
+        """
+        self._acquire(callback, timeout, False)
+
+    def reserve(self, callback, timeout=None):
+        """Like :meth:`acquire`, but the connection is not handed out to
+        other callers until it's given back with :meth:`release`.
+        """
+        self._acquire(callback, timeout, True)
+
+    def release(self, conn):
+        """Give back a connection that was reserved."""
+        self._reserved.discard(conn)
+        if conn in self._pool:
+            self._free.append(conn)
+            self._serve_waiters()
+
+    def _acquire(self, callback, timeout, reserve):
+        if self.closed:
+            raise PoolError('connection pool is closed')
+
+        if not self._waiting:
+            conn = self._take_reserved() if reserve else self._take()
+            if conn is not None:
+                callback(conn)
+                return
+
+        waiter = _Waiter(callback, time.time(), reserve)
+        timeout = timeout if timeout is not None else self._acquire_timeout
+        if timeout is not None:
+            waiter.timeout = self._ioloop.add_timeout(
+                waiter.start + timeout, lambda: self._expire_waiter(waiter))
+        self._waiters.append(waiter)
+        self._waiting += 1
+        self._waits += 1
+
+    def create_connection(self):
+        """Return a new connection to the same server. The connection is
+        not part of the pool and is not handed out to other callers.
+        """
+        conn = self._connection_class(*self._conn_args, **self._conn_kwargs)
+        if self._stats is not None:
+            conn.set_stats(self._stats)
+        return conn
+
+    @property
+    def address(self):
+        """The address of the server, ``host:port`` or a socket path."""
+        kwargs = self._conn_kwargs
+        if kwargs.get('unix_socket_path') is not None:
+            return kwargs['unix_socket_path']
+        return '%s:%s' % (kwargs.get('host', 'localhost'),
+                          kwargs.get('port', 6379))
+
+    def create_future(self):
+        """Return a Future of the kind the connections work with."""
+        if self._connection_class.Future is None:
+            raise NotImplementedError('Futures require Tornado 3.0 or newer')
+        return self._connection_class.Future()
 
     def get_free_conn(self):
+        """Return a connection that can accept a request. Connections can
+        have multiple requests in flight, so a connection that is waiting
+        for a reply is still usable until it reaches `max_pending`.
+        """
         if self.closed:
             raise PoolError('connection pool is closed')
-        for conn in self._pool:
-            if not conn.busy():
-                return conn
-        raise PoolError('connection pool exhausted')
+        conn = self._take()
+        if conn is None:
+            raise PoolError('connection pool exhausted')
+        return conn
+
+    def stats(self):
+        """Return a dictionary with the current state of the pool and the
+        time spent waiting for connections (in seconds). Connections that
+        are reserved or waiting for replies are busy, the others are idle.
+        """
+        busy = len(self._reserved) + sum(
+            1 for conn in self._pool
+            if conn.pending() and conn not in self._reserved)
+        return {
+            'connections': len(self._pool),
+            'busy': busy,
+            'idle': len(self._pool) - busy,
+            'min_size': self._min_size,
+            'max_size': self._max_size,
+            'full': len(self._full),
+            'reserved': len(self._reserved),
+            'pending': sum(conn.pending() for conn in self._pool),
+            'waiters': self._waiting,
+            'waits': self._waits,
+            'timeouts': self._timeouts,
+            'wait_time': self._wait_time,
+            'max_wait_time': self._max_wait_time,
+            'reconnecting': self._reconnecting,
+            'disconnects': self._disconnects
+        }
 
     def close(self):
         if self.closed:
             raise PoolError('connection pool is closed')
+        self.closed = True
+        if self._stats is not None:
+            self._stats.remove_pool(self)
         for conn in self._pool:
             if not conn.closed():
                 conn.close()
         self._pool = set()
-        self.closed = True
+        self._free = deque()
+        self._full = set()
+        self._reserved = set()
+        self._idle_since = {}
+
+        for timer in self._reconnect_timers:
+            self._ioloop.remove_timeout(timer)
+        self._reconnect_timers = set()
+        self._reconnecting = 0
+
+        if self._reaper is not None:
+            self._ioloop.remove_timeout(self._reaper)
+            self._reaper = None
+
+        waiters, self._waiters = self._waiters, deque()
+        for waiter in waiters:
+            if waiter.active:
+                self._finish_waiter(waiter)
+                waiter.callback(PoolError('connection pool is closed'))
@@ -8,3 +8,19 @@
 
 class PoolError(Exception):
     pass
+
+
+class WatchError(Exception):
+    """A watched key was changed before the transaction was executed."""
+
+
+class ClusterError(Exception):
+    """A command could not be routed to the right cluster node."""
+
+
+class ConnectionError(Exception):
+    """The connection was closed before the reply arrived."""
+
+
+class TimeoutError(Exception):
+    """No reply arrived within the command timeout."""
@@ -0,0 +1,960 @@
+"""
+    akane.memory
+    ~~~~~~~~~~~~
+
+    An in-process stand-in for a Redis server, so code that uses a client
+    can be tested without one. It keeps strings, hashes and sorted sets in
+    memory, supports expiry and transactions, and replies in the Redis
+    protocol.
+"""
+
+import math
+import time
+import random
+import fnmatch
+
+from tornado.ioloop import IOLoop
+
+import hiredis
+
+from .commands import COMMANDS, WRITE
+from .connection import Connection
+from .protocol import native_str
+
+
+try:
+    integer_types = (int, long)
+except NameError:
+    integer_types = (int,)
+
+
+WRONGTYPE = 'WRONGTYPE Operation against a key holding the wrong kind of ' \
+    'value'
+NOT_INTEGER = 'ERR value is not an integer or out of range'
+NOT_FLOAT = 'ERR value is not a valid float'
+SYNTAX = 'ERR syntax error'
+
+
+class CommandError(Exception):
+    """An error reply of the server."""
+
+
+class Status(object):
+    """A status reply, like ``+OK``."""
+
+    def __init__(self, value):
+        self.value = value
+
+
+OK = Status(b'OK')
+QUEUED = Status(b'QUEUED')
+
+
+def encode_reply(reply, buffers):
+    """Append `reply` in the Redis protocol to the list `buffers`."""
+    if reply is None:
+        buffers.append(b'$-1\r\n')
+    elif isinstance(reply, bytes):
+        buffers.append(b'$' + str(len(reply)).encode() + b'\r\n')
+        buffers.append(reply)
+        buffers.append(b'\r\n')
+    elif isinstance(reply, integer_types):
+        buffers.append(b':' + str(reply).encode() + b'\r\n')
+    elif isinstance(reply, list):
+        buffers.append(b'*' + str(len(reply)).encode() + b'\r\n')
+        for item in reply:
+            encode_reply(item, buffers)
+    elif isinstance(reply, Status):
+        buffers.append(b'+' + reply.value + b'\r\n')
+    elif isinstance(reply, CommandError):
+        buffers.append(b'-' + str(reply).encode() + b'\r\n')
+    else:
+        raise TypeError('cannot encode %r' % (reply,))
+
+
+def _int(value, message=NOT_INTEGER):
+    try:
+        return int(value)
+    except ValueError:
+        raise CommandError(message)
+
+
+def _float(value, message=NOT_FLOAT):
+    try:
+        value = float(value)
+    except ValueError:
+        raise CommandError(message)
+    if math.isnan(value):
+        raise CommandError(message)
+    return value
+
+
+def _format_float(value):
+    if math.isinf(value):
+        return b'inf' if value > 0 else b'-inf'
+    if value == int(value) and abs(value) < 1e17:
+        return str(int(value)).encode()
+    return repr(value).encode()
+
+
+def _score_bound(value):
+    # Returns the score and whether the bound is exclusive.
+    value = native_str(value)
+    exclusive = value.startswith('(')
+    if exclusive:
+        value = value[1:]
+    return _float(value, 'ERR min or max is not a float'), exclusive
+
+
+def _in_range(score, low, high):
+    (low, low_excl), (high, high_excl) = low, high
+    if score < low or (low_excl and score == low):
+        return False
+    return not (score > high or (high_excl and score == high))
+
+
+def _rank_range(start, stop, size):
+    # Apply the rules of ``ZRANGE`` and ``GETRANGE`` for negative indexes.
+    if start < 0:
+        start += size
+    if stop < 0:
+        stop += size
+    start = max(start, 0)
+    stop = min(stop, size - 1)
+    return start, stop
+
+
+def _options(args):
+    return [native_str(arg).upper() for arg in args]
+
+
+class SortedSet(dict):
+    """Maps the members of a sorted set to their scores."""
+
+    def ordered(self):
+        """Return the members ordered by score and then by member."""
+        return sorted(self, key=lambda member: (self[member], member))
+
+
+class Session(object):
+    """The state of one connection: the selected database and the
+    transaction that is being queued.
+    """
+
+    def __init__(self):
+        self.db = 0
+        self.multi = None
+        self.multi_error = False
+        self.watched = set()
+        self.watch_failed = False
+
+
+class MemoryServer(object):
+    """The data of a Redis server that is kept in memory. Commands are
+    executed with :meth:`execute`, with a :class:`Session` per connection.
+
+    Keys expire according to `clock`, which can be replaced to let time
+    pass in tests.
+    """
+
+    databases = 16
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._data = [{} for i in range(self.databases)]
+        self._expires = [{} for i in range(self.databases)]
+        # The sessions that watch a (database, key).
+        self._watchers = {}
+
+    def execute(self, session, request):
+        """Execute `request` (a list of ``bytes``) and return the reply.
+        Errors are returned as :class:`CommandError`.
+        """
+        name = native_str(request[0]).upper()
+        command = COMMANDS.get(name)
+        handler = getattr(self, 'do_' + name.lower(), None)
+        try:
+            if handler is None:
+                if command is None:
+                    raise CommandError("ERR unknown command '%s'" % name)
+                raise CommandError("ERR '%s' is not supported by the "
+                                   "in-memory server" % name)
+            if command is not None and \
+                    not command.check_arity(len(request)):
+                raise CommandError("ERR wrong number of arguments for '%s' "
+                                   "command" % name.lower())
+        except CommandError as e:
+            if session.multi is not None:
+                session.multi_error = True
+            return e
+
+        if session.multi is not None and \
+                name not in ('EXEC', 'DISCARD', 'MULTI', 'WATCH'):
+            session.multi.append(request)
+            return QUEUED
+        try:
+            reply = handler(session, *request[1:])
+        except CommandError as e:
+            return e
+        if command is not None and command.flag == WRITE:
+            for key in command.keys(request):
+                self._touch(session.db, key)
+        return reply
+
+    def flushall(self):
+        """Delete the keys of all databases."""
+        for db in range(self.databases):
+            self._flush(db)
+
+    def disconnect(self, session):
+        """Forget the state of a connection that was closed."""
+        self._unwatch(session)
+
+    # Keys
+
+    def _touch(self, db, key):
+        for session in self._watchers.get((db, key), ()):
+            session.watch_failed = True
+
+    def _unwatch(self, session):
+        for watched in session.watched:
+            watchers = self._watchers[watched]
+            watchers.discard(session)
+            if not watchers:
+                del self._watchers[watched]
+        session.watched = set()
+        session.watch_failed = False
+
+    def _flush(self, db):
+        for key in list(self._data[db]):
+            self._touch(db, key)
+        self._data[db].clear()
+        self._expires[db].clear()
+
+    def _get(self, session, key, kind=None):
+        # Return the value of `key` if it exists and hasn't expired. With
+        # `kind` the value has to be of that type.
+        data = self._data[session.db]
+        expires = self._expires[session.db]
+        if key in expires and expires[key] <= self.clock():
+            del data[key]
+            del expires[key]
+            self._touch(session.db, key)
+        value = data.get(key)
+        if value is not None and kind is not None and \
+                type(value) is not kind:
+            raise CommandError(WRONGTYPE)
+        return value
+
+    def _set(self, session, key, value, keep_ttl=False):
+        self._data[session.db][key] = value
+        if not keep_ttl:
+            self._expires[session.db].pop(key, None)
+
+    def _delete(self, session, key):
+        self._expires[session.db].pop(key, None)
+        return self._data[session.db].pop(key, None) is not None
+
+    def _keys(self, session):
+        return [key for key in list(self._data[session.db])
+                if self._get(session, key) is not None]
+
+    def _expire_at(self, session, key, when):
+        if self._get(session, key) is None:
+            return 0
+        if when <= self.clock():
+            self._delete(session, key)
+        else:
+            self._expires[session.db][key] = when
+        return 1
+
+    def _ttl(self, session, key):
+        # Returns None for keys without a TTL and False for missing keys.
+        if self._get(session, key) is None:
+            return False
+        when = self._expires[session.db].get(key)
+        if when is None:
+            return None
+        return max(when - self.clock(), 0)
+
+    def _scan(self, items, cursor, options):
+        # `items` is a sorted list, the cursor is the index of the next one.
+        match = None
+        count = 10
+        kind = None
+        options = list(options)
+        while options:
+            option = native_str(options.pop(0)).upper()
+            if not options:
+                raise CommandError(SYNTAX)
+            if option == 'MATCH':
+                match = options.pop(0)
+            elif option == 'COUNT':
+                count = _int(options.pop(0))
+            elif option == 'TYPE':
+                kind = native_str(options.pop(0)).lower()
+            else:
+                raise CommandError(SYNTAX)
+        cursor = _int(cursor, 'ERR invalid cursor')
+        page = items[cursor:cursor + count]
+        cursor += len(page)
+        if cursor >= len(items):
+            cursor = 0
+        if match is not None:
+            page = [item for item in page
+                    if fnmatch.fnmatchcase(item[0], match)]
+        return str(cursor).encode(), page, kind
+
+    def do_ping(self, session, message=None):
+        if message is None:
+            return Status(b'PONG')
+        return message
+
+    def do_echo(self, session, message):
+        return message
+
+    def do_select(self, session, db):
+        db = _int(db)
+        if not 0 <= db < self.databases:
+            raise CommandError('ERR DB index is out of range')
+        session.db = db
+        return OK
+
+    def do_quit(self, session):
+        return OK
+
+    def do_time(self, session):
+        now = self.clock()
+        return [str(int(now)).encode(),
+                str(int(now % 1 * 1000000)).encode()]
+
+    def do_dbsize(self, session):
+        return len(self._keys(session))
+
+    def do_flushdb(self, session, *options):
+        self._flush(session.db)
+        return OK
+
+    def do_flushall(self, session, *options):
+        self.flushall()
+        return OK
+
+    def do_del(self, session, *keys):
+        return sum(1 for key in keys
+                   if self._get(session, key) is not None and
+                   self._delete(session, key))
+
+    do_unlink = do_del
+
+    def do_exists(self, session, *keys):
+        return sum(1 for key in keys if self._get(session, key) is not None)
+
+    do_touch = do_exists
+
+    def do_type(self, session, key):
+        value = self._get(session, key)
+        if value is None:
+            return Status(b'none')
+        if isinstance(value, bytes):
+            return Status(b'string')
+        if isinstance(value, SortedSet):
+            return Status(b'zset')
+        return Status(b'hash')
+
+    def do_keys(self, session, pattern):
+        return sorted(key for key in self._keys(session)
+                      if fnmatch.fnmatchcase(key, pattern))
+
+    def do_scan(self, session, cursor, *options):
+        keys = [(key,) for key in sorted(self._keys(session))]
+        cursor, page, kind = self._scan(keys, cursor, options)
+        if kind is not None:
+            page = [item for item in page
+                    if self.do_type(session, item[0]).value.decode() == kind]
+        return [cursor, [item[0] for item in page]]
+
+    def do_randomkey(self, session):
+        keys = self._keys(session)
+        return random.choice(keys) if keys else None
+
+    def do_rename(self, session, key, new_key):
+        value = self._get(session, key)
+        if value is None:
+            raise CommandError('ERR no such key')
+        when = self._expires[session.db].get(key)
+        self._delete(session, key)
+        self._set(session, new_key, value)
+        if when is not None:
+            self._expires[session.db][new_key] = when
+        return OK
+
+    def do_renamenx(self, session, key, new_key):
+        if self._get(session, key) is None:
+            raise CommandError('ERR no such key')
+        if self._get(session, new_key) is not None:
+            return 0
+        self.do_rename(session, key, new_key)
+        return 1
+
+    def do_expire(self, session, key, seconds):
+        return self._expire_at(session, key, self.clock() + _int(seconds))
+
+    def do_pexpire(self, session, key, milliseconds):
+        return self._expire_at(session, key,
+                               self.clock() + _int(milliseconds) / 1000.0)
+
+    def do_expireat(self, session, key, timestamp):
+        return self._expire_at(session, key, _int(timestamp))
+
+    def do_pexpireat(self, session, key, timestamp):
+        return self._expire_at(session, key, _int(timestamp) / 1000.0)
+
+    def do_ttl(self, session, key):
+        ttl = self._ttl(session, key)
+        if ttl is False:
+            return -2
+        return -1 if ttl is None else int(ttl + 0.5)
+
+    def do_pttl(self, session, key):
+        ttl = self._ttl(session, key)
+        if ttl is False:
+            return -2
+        return -1 if ttl is None else int(ttl * 1000 + 0.5)
+
+    def do_persist(self, session, key):
+        if self._get(session, key) is None:
+            return 0
+        return int(self._expires[session.db].pop(key, None) is not None)
+
+    # Strings
+
+    def do_get(self, session, key):
+        return self._get(session, key, bytes)
+
+    def do_set(self, session, key, value, *options):
+        options = list(options)
+        when = None
+        condition = None
+        keep_ttl = get = False
+        while options:
+            option = native_str(options.pop(0)).upper()
+            if option in ('EX', 'PX', 'EXAT', 'PXAT'):
+                if not options or when is not None or keep_ttl:
+                    raise CommandError(SYNTAX)
+                amount = _int(options.pop(0))
+                if amount <= 0:
+                    raise CommandError("ERR invalid expire time in 'set' "
+                                       "command")
+                if option in ('PX', 'PXAT'):
+                    amount /= 1000.0
+                when = amount if option.endswith('AT') else \
+                    self.clock() + amount
+            elif option in ('NX', 'XX') and condition is None:
+                condition = option
+            elif option == 'KEEPTTL' and when is None:
+                keep_ttl = True
+            elif option == 'GET':
+                get = True
+            else:
+                raise CommandError(SYNTAX)
+
+        old = self._get(session, key, bytes if get else None)
+        if (condition == 'NX' and old is not None) or \
+                (condition == 'XX' and old is None):
+            return old if get else None
+        self._set(session, key, value, keep_ttl)
+        if when is not None:
+            self._expires[session.db][key] = when
+        return old if get else OK
+
+    def do_setnx(self, session, key, value):
+        return 0 if self.do_set(session, key, value, b'NX') is None else 1
+
+    def do_setex(self, session, key, seconds, value):
+        if _int(seconds) <= 0:
+            raise CommandError("ERR invalid expire time in 'setex' command")
+        return self.do_set(session, key, value, b'EX', seconds)
+
+    def do_psetex(self, session, key, milliseconds, value):
+        if _int(milliseconds) <= 0:
+            raise CommandError("ERR invalid expire time in 'psetex' "
+                               "command")
+        return self.do_set(session, key, value, b'PX', milliseconds)
+
+    def do_getset(self, session, key, value):
+        return self.do_set(session, key, value, b'GET')
+
+    def do_getdel(self, session, key):
+        value = self._get(session, key, bytes)
+        if value is not None:
+            self._delete(session, key)
+        return value
+
+    def do_mget(self, session, *keys):
+        values = []
+        for key in keys:
+            value = self._get(session, key)
+            values.append(value if isinstance(value, bytes) else None)
+        return values
+
+    def do_mset(self, session, *pairs):
+        if len(pairs) % 2:
+            raise CommandError("ERR wrong number of arguments for 'mset' "
+                               "command")
+        for i in range(0, len(pairs), 2):
+            self._set(session, pairs[i], pairs[i + 1])
+        return OK
+
+    def do_msetnx(self, session, *pairs):
+        if len(pairs) % 2:
+            raise CommandError("ERR wrong number of arguments for 'msetnx' "
+                               "command")
+        for i in range(0, len(pairs), 2):
+            if self._get(session, pairs[i]) is not None:
+                return 0
+        self.do_mset(session, *pairs)
+        return 1
+
+    def do_incrby(self, session, key, amount):
+        value = _int(self._get(session, key, bytes) or 0) + _int(amount)
+        self._set(session, key, str(value).encode(), keep_ttl=True)
+        return value
+
+    def do_incr(self, session, key):
+        return self.do_incrby(session, key, 1)
+
+    def do_decr(self, session, key):
+        return self.do_incrby(session, key, -1)
+
+    def do_decrby(self, session, key, amount):
+        return self.do_incrby(session, key, -_int(amount))
+
+    def do_incrbyfloat(self, session, key, amount):
+        value = _float(self._get(session, key, bytes) or 0) + \
+            _float(amount)
+        value = _format_float(value)
+        self._set(session, key, value, keep_ttl=True)
+        return value
+
+    def do_append(self, session, key, value):
+        value = (self._get(session, key, bytes) or b'') + value
+        self._set(session, key, value, keep_ttl=True)
+        return len(value)
+
+    def do_strlen(self, session, key):
+        return len(self._get(session, key, bytes) or b'')
+
+    def do_getrange(self, session, key, start, end):
+        value = self._get(session, key, bytes) or b''
+        start, end = _rank_range(_int(start), _int(end), len(value))
+        return value[start:end + 1]
+
+    def do_setrange(self, session, key, offset, value):
+        offset = _int(offset)
+        if offset < 0:
+            raise CommandError('ERR offset is out of range')
+        old = self._get(session, key, bytes) or b''
+        if value:
+            old = old.ljust(offset, b'\0')
+            old = old[:offset] + value + old[offset + len(value):]
+            self._set(session, key, old, keep_ttl=True)
+        return len(old)
+
+    # Hashes
+
+    def _hash(self, session, key, create=False):
+        fields = self._get(session, key, dict)
+        if fields is None:
+            fields = {}
+            if create:
+                self._set(session, key, fields)
+        return fields
+
+    def _drop_empty(self, session, key, fields):
+        if not fields:
+            self._delete(session, key)
+
+    def do_hset(self, session, key, *pairs):
+        if len(pairs) % 2:
+            raise CommandError("ERR wrong number of arguments for 'hset' "
+                               "command")
+        fields = self._hash(session, key, create=True)
+        added = 0
+        for i in range(0, len(pairs), 2):
+            if pairs[i] not in fields:
+                added += 1
+            fields[pairs[i]] = pairs[i + 1]
+        return added
+
+    def do_hmset(self, session, key, *pairs):
+        self.do_hset(session, key, *pairs)
+        return OK
+
+    def do_hsetnx(self, session, key, field, value):
+        fields = self._hash(session, key, create=True)
+        if field in fields:
+            return 0
+        fields[field] = value
+        return 1
+
+    def do_hget(self, session, key, field):
+        return self._hash(session, key).get(field)
+
+    def do_hmget(self, session, key, *fields):
+        values = self._hash(session, key)
+        return [values.get(field) for field in fields]
+
+    def do_hgetall(self, session, key):
+        reply = []
+        for item in sorted(self._hash(session, key).items()):
+            reply.extend(item)
+        return reply
+
+    def do_hdel(self, session, key, *fields):
+        values = self._hash(session, key)
+        deleted = sum(1 for field in fields
+                      if values.pop(field, None) is not None)
+        self._drop_empty(session, key, values)
+        return deleted
+
+    def do_hexists(self, session, key, field):
+        return int(field in self._hash(session, key))
+
+    def do_hlen(self, session, key):
+        return len(self._hash(session, key))
+
+    def do_hkeys(self, session, key):
+        return sorted(self._hash(session, key))
+
+    def do_hvals(self, session, key):
+        fields = self._hash(session, key)
+        return [fields[field] for field in sorted(fields)]
+
+    def do_hstrlen(self, session, key, field):
+        return len(self._hash(session, key).get(field, b''))
+
+    def do_hincrby(self, session, key, field, amount):
+        amount = _int(amount)
+        fields = self._hash(session, key, create=True)
+        value = _int(fields.get(field, 0),
+                     'ERR hash value is not an integer') + amount
+        fields[field] = str(value).encode()
+        return value
+
+    def do_hincrbyfloat(self, session, key, field, amount):
+        amount = _float(amount)
+        fields = self._hash(session, key, create=True)
+        value = _float(fields.get(field, 0),
+                       'ERR hash value is not a float') + amount
+        fields[field] = _format_float(value)
+        return fields[field]
+
+    def do_hscan(self, session, key, cursor, *options):
+        items = sorted(self._hash(session, key).items())
+        cursor, page, kind = self._scan(items, cursor, options)
+        reply = []
+        for item in page:
+            reply.extend(item)
+        return [cursor, reply]
+
+    # Sorted sets
+
+    def _zset(self, session, key, create=False):
+        members = self._get(session, key, SortedSet)
+        if members is None:
+            members = SortedSet()
+            if create:
+                self._set(session, key, members)
+        return members
+
+    def _zrange_reply(self, members, zset, with_scores):
+        if not with_scores:
+            return members
+        reply = []
+        for member in members:
+            reply.extend((member, _format_float(zset[member])))
+        return reply
+
+    def _zrange_by_score(self, session, key, low, high, options, reverse):
+        zset = self._zset(session, key)
+        low, high = _score_bound(low), _score_bound(high)
+        with_scores = False
+        offset, count = 0, -1
+        options = list(options)
+        while options:
+            option = native_str(options.pop(0)).upper()
+            if option == 'WITHSCORES':
+                with_scores = True
+            elif option == 'LIMIT' and len(options) >= 2:
+                offset, count = _int(options.pop(0)), _int(options.pop(0))
+            else:
+                raise CommandError(SYNTAX)
+        members = [member for member in zset.ordered()
+                   if _in_range(zset[member], low, high)]
+        if reverse:
+            members.reverse()
+        if offset < 0:
+            members = []
+        members = members[offset:]
+        if count >= 0:
+            members = members[:count]
+        return self._zrange_reply(members, zset, with_scores)
+
+    def do_zadd(self, session, key, *args):
+        flags = set()
+        args = list(args)
+        while args and native_str(args[0]).upper() in \
+                ('NX', 'XX', 'GT', 'LT', 'CH', 'INCR'):
+            flags.add(native_str(args.pop(0)).upper())
+        if not args or len(args) % 2 or ('NX' in flags and 'XX' in flags):
+            raise CommandError(SYNTAX)
+        if 'INCR' in flags and len(args) != 2:
+            raise CommandError('ERR INCR option supports a single '
+                               'increment-element pair')
+        scores = [_float(args[i]) for i in range(0, len(args), 2)]
+
+        zset = self._zset(session, key, create=True)
+        added = changed = 0
+        for score, member in zip(scores, args[1::2]):
+            old = zset.get(member)
+            if 'INCR' in flags and old is not None:
+                score += old
+            if (old is None and 'XX' in flags) or \
+                    (old is not None and 'NX' in flags) or \
+                    (old is not None and 'GT' in flags and score <= old) or \
+                    (old is not None and 'LT' in flags and score >= old):
+                if 'INCR' in flags:
+                    self._drop_empty(session, key, zset)
+                    return None
+                continue
+            zset[member] = score
+            if old is None:
+                added += 1
+            elif old != score:
+                changed += 1
+        self._drop_empty(session, key, zset)
+        if 'INCR' in flags:
+            return _format_float(zset[args[1]])
+        return added + changed if 'CH' in flags else added
+
+    def do_zcard(self, session, key):
+        return len(self._zset(session, key))
+
+    def do_zscore(self, session, key, member):
+        score = self._zset(session, key).get(member)
+        return None if score is None else _format_float(score)
+
+    def do_zmscore(self, session, key, *members):
+        return [self.do_zscore(session, key, member) for member in members]
+
+    def do_zincrby(self, session, key, amount, member):
+        return self.do_zadd(session, key, b'INCR', amount, member)
+
+    def do_zrange(self, session, key, start, stop, *options):
+        options = _options(options)
+        reverse = 'REV' in options
+        if reverse:
+            options.remove('REV')
+        if 'BYSCORE' in options:
+            options.remove('BYSCORE')
+            if reverse:
+                start, stop = stop, start
+            return self._zrange_by_score(session, key, start, stop, options,
+                                         reverse)
+        if options not in ([], ['WITHSCORES']):
+            raise CommandError(SYNTAX)
+        zset = self._zset(session, key)
+        members = zset.ordered()
+        if reverse:
+            members.reverse()
+        start, stop = _rank_range(_int(start), _int(stop), len(members))
+        return self._zrange_reply(members[start:stop + 1], zset,
+                                  bool(options))
+
+    def do_zrevrange(self, session, key, start, stop, *options):
+        return self.do_zrange(session, key, start, stop, b'REV', *options)
+
+    def do_zrangebyscore(self, session, key, low, high, *options):
+        return self._zrange_by_score(session, key, low, high, options,
+                                     False)
+
+    def do_zrevrangebyscore(self, session, key, high, low, *options):
+        return self._zrange_by_score(session, key, low, high, options,
+                                     True)
+
+    def do_zrank(self, session, key, member):
+        zset = self._zset(session, key)
+        if member not in zset:
+            return None
+        return zset.ordered().index(member)
+
+    def do_zrevrank(self, session, key, member):
+        rank = self.do_zrank(session, key, member)
+        if rank is None:
+            return None
+        return len(self._zset(session, key)) - rank - 1
+
+    def do_zcount(self, session, key, low, high):
+        zset = self._zset(session, key)
+        low, high = _score_bound(low), _score_bound(high)
+        return sum(1 for score in zset.values()
+                   if _in_range(score, low, high))
+
+    def do_zrem(self, session, key, *members):
+        zset = self._zset(session, key)
+        removed = sum(1 for member in members
+                      if zset.pop(member, None) is not None)
+        self._drop_empty(session, key, zset)
+        return removed
+
+    def do_zremrangebyrank(self, session, key, start, stop):
+        members = self.do_zrange(session, key, start, stop)
+        return self.do_zrem(session, key, *members)
+
+    def do_zremrangebyscore(self, session, key, low, high):
+        members = self.do_zrangebyscore(session, key, low, high)
+        return self.do_zrem(session, key, *members)
+
+    def _zpop(self, session, key, count, reverse):
+        zset = self._zset(session, key)
+        count = 1 if count is None else _int(count)
+        members = zset.ordered()
+        if reverse:
+            members.reverse()
+        reply = self._zrange_reply(members[:count], zset, True)
+        self.do_zrem(session, key, *members[:count])
+        return reply
+
+    def do_zpopmin(self, session, key, count=None):
+        return self._zpop(session, key, count, False)
+
+    def do_zpopmax(self, session, key, count=None):
+        return self._zpop(session, key, count, True)
+
+    def do_zscan(self, session, key, cursor, *options):
+        zset = self._zset(session, key)
+        items = [(member, _format_float(zset[member]))
+                 for member in sorted(zset)]
+        cursor, page, kind = self._scan(items, cursor, options)
+        reply = []
+        for item in page:
+            reply.extend(item)
+        return [cursor, reply]
+
+    # Transactions
+
+    def do_multi(self, session):
+        if session.multi is not None:
+            raise CommandError('ERR MULTI calls can not be nested')
+        session.multi = []
+        session.multi_error = False
+        return OK
+
+    def do_exec(self, session):
+        if session.multi is None:
+            raise CommandError('ERR EXEC without MULTI')
+        requests, session.multi = session.multi, None
+        failed = session.watch_failed
+        self._unwatch(session)
+        if session.multi_error:
+            raise CommandError('EXECABORT Transaction discarded because of '
+                               'previous errors.')
+        if failed:
+            return None
+        return [self.execute(session, request) for request in requests]
+
+    def do_discard(self, session):
+        if session.multi is None:
+            raise CommandError('ERR DISCARD without MULTI')
+        session.multi = None
+        self._unwatch(session)
+        return OK
+
+    def do_watch(self, session, *keys):
+        if session.multi is not None:
+            raise CommandError('ERR WATCH inside MULTI is not allowed')
+        for key in keys:
+            # Expire the key now, so it doesn't fail the transaction later.
+            self._get(session, key)
+            watched = (session.db, key)
+            session.watched.add(watched)
+            self._watchers.setdefault(watched, set()).add(session)
+        return OK
+
+    def do_unwatch(self, session):
+        self._unwatch(session)
+        return OK
+
+
+_servers = {}
+
+
+def get_server(host='localhost', port=6379, unix_socket_path=None):
+    """Return the :class:`MemoryServer` of an address. It's created when
+    it's first used, after that all connections to the address share it.
+    """
+    address = unix_socket_path if unix_socket_path is not None else \
+        (host, port)
+    server = _servers.get(address)
+    if server is None:
+        server = _servers[address] = MemoryServer()
+    return server
+
+
+class MemoryConnection(Connection):
+    """A :class:`akane.connection.Connection` to the :class:`MemoryServer`
+    of its address, without a socket. Requests are encoded and parsed like
+    they would be by Redis, and the replies are handled on the next IOLoop
+    iteration, so the client behaves like it does with a real server.
+
+    Select it with ``'backend': 'memory'`` in the client settings.
+    """
+
+    def __init__(self, host='localhost', port=6379, ioloop=None, cork=False,
+                 cork_threshold=65536, decode_responses=False,
+                 encoding='utf-8', unix_socket_path=None, keepalive=False,
+                 sndbuf=None, rcvbuf=None, max_buffer_size=None,
+                 command_timeout=None):
+        # The socket options are accepted for compatibility, there's no
+        # socket.
+        self.host = host
+        self.port = port
+        self.unix_socket_path = unix_socket_path
+        self._ioloop = ioloop or IOLoop.instance()
+        self._setup(cork, cork_threshold, decode_responses, encoding,
+                    command_timeout)
+
+        self._closed = False
+        self._server = get_server(host, port, unix_socket_path)
+        self._session = Session()
+        self._requests = hiredis.Reader()
+
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._server.disconnect(self._session)
+        self._call_soon(self._handle_close)
+
+    def _write_buffers(self, buffers):
+        if self._closed:
+            return
+        for buf in buffers:
+            self._requests.feed(buf)
+
+        replies = []
+        request = self._requests.gets()
+        while request is not False:
+            encode_reply(self._server.execute(self._session, request),
+                         replies)
+            request = self._requests.gets()
+        if replies:
+            data = b''.join(replies)
+            self._call_soon(lambda: self._receive(data))
+
+    def _receive(self, data):
+        if not self._closed:
+            self._handle_read(data)
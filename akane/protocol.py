@@ -0,0 +1,152 @@
+"""
+    akane.protocol
+    ~~~~~~~~~~~~~~
+
+    Encoding of requests in the Redis protocol.
+
+    Requests are encoded to a list of buffers. Protocol headers and small
+    arguments are joined into one buffer, but arguments of at least
+    `SCATTER_THRESHOLD` bytes are passed on as they are (``bytes``,
+    ``bytearray`` or ``memoryview``), so a large value is never copied into
+    a request buffer. (The ``IOStream`` of Tornado 4.x still copies it
+    once into its own write buffer, Tornado 5 doesn't.) The names of the
+    commands in :mod:`akane.commands` are encoded once, when the module is
+    imported.
+"""
+
+try:
+    from .utils import redis_request as _c_redis_request
+except ImportError:
+    _c_redis_request = None
+
+
+from .commands import COMMANDS
+
+
+try:
+    text_type = unicode
+except NameError:
+    text_type = str
+
+
+SCATTER_THRESHOLD = 64 * 1024
+
+# Argument types the C encoder can handle.
+_C_TYPES = (bytes, text_type)
+
+CRLF = b'\r\n'
+
+# Headers for the common argument counts and sizes, created once.
+_COUNT_HEADERS = [b'*' + str(i).encode('ascii') + CRLF for i in range(32)]
+_SIZE_HEADERS = [b'$' + str(i).encode('ascii') + CRLF for i in range(1024)]
+
+
+def _encode(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return value
+    if isinstance(value, text_type):
+        return value.encode('utf-8')
+    return str(value).encode('ascii')
+
+
+def native_str(value):
+    """Return `value` as a ``str``. Replies are ``bytes`` unless
+    ``decode_responses`` is enabled, but names of channels and nodes are
+    handled as ``str``.
+    """
+    if isinstance(value, bytes) and not isinstance(value, str):
+        return value.decode('utf-8')
+    return value
+
+
+def buffer_size(value):
+    if isinstance(value, memoryview):
+        return len(value) * value.itemsize
+    return len(value)
+
+
+def _small(value):
+    # Python 2 can only join ``str`` objects.
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    if isinstance(value, bytearray):
+        return bytes(value)
+    return value
+
+
+def _count_header(count):
+    if count < 32:
+        return _COUNT_HEADERS[count]
+    return b'*' + str(count).encode('ascii') + CRLF
+
+
+def encode_request(args):
+    """Return the request for `args` as a list of buffers."""
+    if _c_redis_request is not None:
+        for arg in args:
+            if type(arg) not in _C_TYPES or len(arg) >= SCATTER_THRESHOLD:
+                break
+        else:
+            return [_c_redis_request(tuple(args))]
+
+    buffers = []
+    count = len(args)
+    command = COMMANDS.get(args[0])
+    if command is not None:
+        # The name of a known command is encoded already.
+        if count == command.arity:
+            parts = [command.prefix]
+        else:
+            parts = [_count_header(count), command.name_prefix]
+        args = args[1:]
+    else:
+        parts = [_count_header(count)]
+
+    for arg in args:
+        arg = _encode(arg)
+        size = buffer_size(arg)
+        if size < 1024:
+            parts.append(_SIZE_HEADERS[size])
+        else:
+            parts.extend((b'$', str(size).encode('ascii'), CRLF))
+        if size >= SCATTER_THRESHOLD:
+            buffers.append(b''.join(parts))
+            buffers.append(arg)
+            parts = [CRLF]
+        else:
+            parts.append(_small(arg))
+            parts.append(CRLF)
+    buffers.append(b''.join(parts))
+    return buffers
+
+
+def encode_requests(requests):
+    """Return multiple requests as a list of buffers."""
+    buffers = []
+    for args in requests:
+        buffers.extend(encode_request(args))
+    return coalesce(buffers)
+
+
+def coalesce(buffers):
+    """Join consecutive small buffers together. Large buffers are left
+    alone.
+    """
+    result = []
+    small = []
+    for buf in buffers:
+        if buffer_size(buf) >= SCATTER_THRESHOLD:
+            if small:
+                result.append(b''.join(small))
+                small = []
+            result.append(buf)
+        else:
+            small.append(buf)
+    if small:
+        result.append(b''.join(small))
+    return result
+
+
+def redis_request(args):
+    """Return the request for `args` as one ``bytes`` object."""
+    return b''.join([_small(buf) for buf in encode_request(args)])
@@ -0,0 +1,136 @@
+"""
+    akane.pubsub
+    ~~~~~~~~~~~~
+
+    Subscribing to channels and patterns on a dedicated connection.
+"""
+
+from .protocol import native_str
+
+
+class PubSub(object):
+    """A subscriber connection. Once a connection has subscribed to a
+    channel it can only be used for (un)subscribing, so :class:`PubSub`
+    opens its own connection instead of using one from the pool.
+
+    Handlers are registered per channel and per pattern. All messages for
+    a channel that arrive in a single read are delivered in one call as a
+    list: ``handler(channel, [message, ...])`` for channels and
+    ``handler(pattern, [(channel, message), ...])`` for patterns.
+
+    Usage::
+
+        pubsub = client.pubsub()
+        pubsub.subscribe(['news'], on_news)
+        pubsub.psubscribe(['user:*'], on_user_event)
+    """
+
+    def __init__(self, pool):
+        self._conn = pool.create_connection()
+        self._conn.set_push_callback(self._handle_messages)
+        self._channels = {}
+        self._patterns = {}
+        # Callbacks that wait for the confirmation of a subscription.
+        self._confirmations = {}
+
+    @property
+    def channels(self):
+        return list(self._channels)
+
+    @property
+    def patterns(self):
+        return list(self._patterns)
+
+    def set_close_callback(self, callback):
+        self._conn.set_close_callback(callback)
+
+    def subscribe(self, channels, handler, callback=None):
+        """Subscribe `handler` to `channels`. `callback` is called once
+        Redis has confirmed the subscription to all of them.
+        """
+        for channel in channels:
+            self._channels[channel] = handler
+        self._wait_for('subscribe', channels, callback)
+        self._conn.write_request('SUBSCRIBE', *channels)
+
+    def psubscribe(self, patterns, handler, callback=None):
+        """Like :meth:`subscribe`, for channels that match `patterns`."""
+        for pattern in patterns:
+            self._patterns[pattern] = handler
+        self._wait_for('psubscribe', patterns, callback)
+        self._conn.write_request('PSUBSCRIBE', *patterns)
+
+    def _wait_for(self, kind, names, callback):
+        if callback is None:
+            return
+        names = [native_str(name) for name in names]
+        waiting = set(names)
+        def confirmed(name):
+            waiting.discard(name)
+            if not waiting:
+                callback()
+        for name in names:
+            self._confirmations.setdefault((kind, name), []).append(
+                confirmed)
+
+    def unsubscribe(self, channels=()):
+        """Unsubscribe from `channels`, or from all channels if none are
+        given.
+        """
+        if channels:
+            for channel in channels:
+                self._channels.pop(channel, None)
+        else:
+            self._channels.clear()
+        self._conn.write_request('UNSUBSCRIBE', *channels)
+
+    def punsubscribe(self, patterns=()):
+        """Unsubscribe from `patterns`, or from all patterns if none are
+        given.
+        """
+        if patterns:
+            for pattern in patterns:
+                self._patterns.pop(pattern, None)
+        else:
+            self._patterns.clear()
+        self._conn.write_request('PUNSUBSCRIBE', *patterns)
+
+    def close(self):
+        self._channels.clear()
+        self._patterns.clear()
+        self._conn.close()
+
+    def _handle_messages(self, replies):
+        channel_messages = {}
+        pattern_messages = {}
+
+        for reply in replies:
+            kind = native_str(reply[0])
+            if kind == 'message':
+                channel = native_str(reply[1])
+                messages = channel_messages.get(channel)
+                if messages is None:
+                    messages = channel_messages[channel] = []
+                messages.append(reply[2])
+            elif kind == 'pmessage':
+                pattern = native_str(reply[1])
+                messages = pattern_messages.get(pattern)
+                if messages is None:
+                    messages = pattern_messages[pattern] = []
+                messages.append((native_str(reply[2]), reply[3]))
+            elif kind in ('subscribe', 'psubscribe'):
+                callbacks = self._confirmations.pop(
+                    (kind, native_str(reply[1])), ())
+                for callback in callbacks:
+                    callback(native_str(reply[1]))
+            # Confirmations of unsubscribe requests are not passed on.
+
+        for channel, messages in channel_messages.items():
+            handler = self._channels.get(channel)
+            if handler is not None:
+                handler(channel, messages)
+
+        for pattern, messages in pattern_messages.items():
+            handler = self._patterns.get(pattern)
+            if handler is not None:
+                handler(pattern, messages)
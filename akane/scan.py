@@ -0,0 +1,156 @@
+"""
+    akane.scan
+    ~~~~~~~~~~
+
+    Incremental iteration over keys and the members of hashes, sets and
+    sorted sets with ``SCAN``, ``HSCAN``, ``SSCAN`` and ``ZSCAN``.
+"""
+
+from collections import deque
+
+from .commands import pairs_reply
+
+
+def _hash_items(items):
+    it = iter(items)
+    return list(zip(it, it))
+
+
+# How the items of a page are returned.
+_ITEM_CONVERTERS = {
+    'HSCAN': _hash_items,
+    'ZSCAN': pairs_reply
+}
+
+
+class ScanIterator(object):
+    """Walks a cursor and returns the items page by page. The request for
+    the next page is sent as soon as a page has been handed out, so it
+    arrives while the current page is processed. At most one page is
+    buffered, so memory use is bounded by the page size (see `count`).
+
+    Pages of ``SCAN`` and ``SSCAN`` are lists of keys or members, pages of
+    ``HSCAN`` are ``(field, value)`` pairs and pages of ``ZSCAN`` are
+    ``(member, score)`` pairs. Like the commands themselves, an item can be
+    returned more than once.
+
+    Usage::
+
+        def handle(page):
+            if page is None:
+                return  # done
+            ...
+            keys.next(handle)
+
+        keys = client.scan_iter(match='user:*', count=1000)
+        keys.next(handle)
+
+    Or with ``async for page in client.scan_iter(...)`` on Python 3.5+.
+    """
+
+    def __init__(self, client, command, key=None, match=None, count=None,
+                 type=None):
+        self._client = client
+        self._command = command
+        self._key = key
+        self._options = []
+        if match is not None:
+            self._options.extend(('MATCH', match))
+        if count is not None:
+            self._options.extend(('COUNT', count))
+        if type is not None:
+            self._options.extend(('TYPE', type))
+        self._convert = _ITEM_CONVERTERS.get(command)
+
+        self._cursor = 0
+        self._pages = deque()
+        self._callbacks = deque()
+        self._fetching = False
+        self._finished = False
+
+    def next(self, callback=None):
+        """Call `callback` with the next page, or with None when all pages
+        have been returned. An error is passed to the callback and ends the
+        iteration.
+        """
+        callback, future = self._client._future_callback(callback)
+        self._callbacks.append(callback)
+        self._deliver()
+        self._prefetch()
+        return future
+
+    def each(self, handler, callback=None):
+        """Call `handler` with every page and `callback` with None when the
+        iteration is done, or with the error that ended it.
+        """
+        callback, future = self._client._future_callback(callback)
+
+        def step(page):
+            if page is None or isinstance(page, Exception):
+                callback(page)
+                return
+            handler(page)
+            self.next(step)
+        self.next(step)
+        return future
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        future = self._client._create_future()
+
+        def resolve(page):
+            if page is None:
+                future.set_exception(StopAsyncIteration())
+            elif isinstance(page, Exception):
+                future.set_exception(page)
+            else:
+                future.set_result(page)
+        self.next(resolve)
+        return future
+
+    def _prefetch(self):
+        if not self._finished and not self._fetching and not self._pages:
+            self._fetching = True
+            args = [self._command]
+            if self._key is not None:
+                args.append(self._key)
+            args.append(self._cursor)
+            args.extend(self._options)
+            self._send(args)
+
+    def _send(self, args):
+        self._client.send_request(self._handle_page, *args)
+
+    def _cursor_done(self):
+        # Called when the cursor is back at 0. Returns whether the
+        # iteration is finished.
+        return True
+
+    def _handle_page(self, reply):
+        self._fetching = False
+        if isinstance(reply, Exception):
+            self._finished = True
+            self._pages.append(reply)
+        else:
+            self._cursor, items = reply
+            if int(self._cursor) == 0:
+                self._finished = self._cursor_done()
+            # Pages can be empty while the cursor is not finished yet.
+            if items:
+                if self._convert is not None:
+                    items = self._convert(items)
+                self._pages.append(items)
+        self._deliver()
+        self._prefetch()
+
+    def _deliver(self):
+        while self._callbacks:
+            if self._pages:
+                page = self._pages.popleft()
+            elif self._finished:
+                page = None
+            else:
+                return
+            self._callbacks.popleft()(page)
@@ -0,0 +1,46 @@
+"""
+    akane.scripting
+    ~~~~~~~~~~~~~~~
+
+    Lua scripts that are called by their SHA1 digest.
+"""
+
+import hashlib
+
+from hiredis import ReplyError
+
+
+class Script(object):
+    """A Lua script that is run with ``EVALSHA``, so the source doesn't have
+    to be sent with every call. When the server doesn't know the script
+    (``NOSCRIPT``), for example after a restart or ``SCRIPT FLUSH``, it is
+    run once with ``EVAL``, which also caches it on the server again.
+
+    Scripts are created with :meth:`akane.Client.register_script`::
+
+        incr_max = client.register_script(source)
+        incr_max(keys=('counter',), args=(10,), callback=callback)
+    """
+
+    def __init__(self, client, source):
+        self._client = client
+        self.source = source
+        if not isinstance(source, bytes):
+            source = source.encode('utf-8')
+        self.sha = hashlib.sha1(source).hexdigest()
+
+    def __call__(self, keys=(), args=(), callback=None):
+        callback, future = self._client._future_callback(callback)
+
+        def wraps(reply):
+            if isinstance(reply, ReplyError) and \
+                    str(reply).startswith('NOSCRIPT'):
+                self._client.eval(self.source, keys, args, callback=callback)
+            else:
+                callback(reply)
+        self._client.evalsha(self.sha, keys, args, callback=wraps)
+        return future
+
+    def load(self, callback=None):
+        """Load the script into the script cache of the server."""
+        return self._client.script_load(self.source, callback=callback)
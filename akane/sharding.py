@@ -0,0 +1,346 @@
+"""
+    akane.sharding
+    ~~~~~~~~~~~~~~
+
+    Spreading keys over multiple Redis servers with consistent hashing.
+"""
+
+import struct
+import hashlib
+from bisect import bisect
+from collections import deque
+
+from .client import STREAM_THRESHOLD, Client, client_settings
+from .commands import COMMANDS
+from .connection import Pool
+from .scan import ScanIterator
+
+
+def hash_tag(key):
+    """Return the part of `key` that is used for hashing. If the key
+    contains a non-empty ``{...}`` section, only that section is used, so
+    related keys can be kept on the same server.
+    """
+    if isinstance(key, bytes):
+        open_brace, close_brace = b'{', b'}'
+    else:
+        open_brace, close_brace = '{', '}'
+    start = key.find(open_brace)
+    if start != -1:
+        end = key.find(close_brace, start + 1)
+        if end > start + 1:
+            return key[start + 1:end]
+    return key
+
+
+def command_key(args):
+    """Return the key that a command should be routed on. The key positions
+    of known commands are looked up in the command table, other commands are
+    routed on their first argument.
+    """
+    command = COMMANDS.get(args[0])
+    if command is not None:
+        keys = command.keys(args)
+        if keys:
+            return keys[0]
+        if command.numkeys is not None:
+            raise ValueError('%s needs at least one key for routing'
+                             % args[0])
+    elif len(args) > 1:
+        return args[1]
+    raise ValueError('%s has no key to route on' % args[0])
+
+
+def _digest(value):
+    if not isinstance(value, bytes):
+        value = value.encode('utf-8')
+    return hashlib.md5(value).digest()
+
+
+class HashRing(object):
+    """A ketama compatible hash ring. Every node gets 160 points on the
+    ring per unit of weight, so adding or removing a node only moves the
+    keys of that node.
+    """
+
+    points_per_weight = 160
+
+    def __init__(self, nodes):
+        """`nodes` is a list of ``(name, weight)`` tuples."""
+        total_weight = sum(weight for name, weight in nodes)
+        ring = {}
+        for name, weight in nodes:
+            factor = len(nodes) * self.points_per_weight * weight
+            for i in range(int(factor // total_weight // 4)):
+                digest = _digest('%s-%d' % (name, i))
+                for point in struct.unpack('<4I', digest):
+                    ring[point] = name
+        self._points = sorted(ring)
+        self._nodes = [ring[point] for point in self._points]
+
+    def get_node(self, key):
+        point = struct.unpack('<I', _digest(hash_tag(key))[:4])[0]
+        index = bisect(self._points, point)
+        if index == len(self._points):
+            index = 0
+        return self._nodes[index]
+
+
+def _group_request(command, keys, values, indexes):
+    # The arguments of `command` for the keys (and values) at `indexes`.
+    args = [command]
+    for i in indexes:
+        args.append(keys[i])
+        if values is not None:
+            args.append(values[i])
+    return tuple(args)
+
+
+def _parse_node(node):
+    if isinstance(node, dict):
+        node = dict(node)
+    else:
+        host, port = node.rsplit(':', 1)
+        node = {'host': host, 'port': int(port)}
+    node.setdefault('host', 'localhost')
+    node.setdefault('port', 6379)
+    node.setdefault('weight', 1)
+    return node
+
+
+class ShardedClient(Client):
+    """A client for keys that are spread over multiple Redis servers.
+
+    `nodes` is a list of ``'host:port'`` strings, or dictionaries with
+    ``host``, ``port`` and optionally ``weight``. Every node gets its own
+    pool, created with `settings`. Keys are assigned to nodes with a
+    :class:`HashRing`.
+
+    Single key commands are routed by their first argument. ``MGET``,
+    ``MSET`` and ``DEL`` are split per node, sent in parallel and the
+    results are combined in the original key order. Other commands that use
+    multiple keys only work if all keys are on the same node, which can be
+    ensured with hash tags: ``{user:1}:name`` and ``{user:1}:email`` are
+    always on the same node.
+
+    ``KEYS``, ``SCAN`` (through :meth:`scan_iter`) and ``SCRIPT LOAD`` are
+    sent to every node. Other commands without a key, like ``PUBLISH``,
+    ``FLUSHDB`` or ``INFO``, can't be routed: their callback gets a
+    `ValueError`. Values are streamed from the node of their key.
+    Pipelines, transactions, bulk loads and pub/sub are not supported.
+    """
+
+    def __init__(self, nodes, settings={}):
+        self._retries, settings = client_settings(settings)
+        self._pools = {}
+        ring_nodes = []
+        for node in nodes:
+            node = _parse_node(node)
+            name = '%s:%d' % (node['host'], node['port'])
+            node_settings = dict(settings, host=node['host'],
+                                 port=node['port'])
+            self._pools[name] = Pool(**node_settings)
+            ring_nodes.append((name, node['weight']))
+
+        self._ring = HashRing(ring_nodes)
+        self._scripts = {}
+
+    def get_pool(self, key):
+        """Return the pool of the node `key` belongs to."""
+        return self._group_pool(self._group(key))
+
+    def _group(self, key):
+        # Keys in the same group can be used in one multi-key command.
+        return self._ring.get_node(key)
+
+    def _group_pool(self, group):
+        return self._pools[group]
+
+    def send_request(self, callback, *args):
+        callback, future = self._future_callback(callback)
+        try:
+            pool = self.get_pool(command_key(args))
+        except ValueError as e:
+            callback(e)
+            return future
+        self._send_request(pool, callback, args)
+        return future
+
+    def _create_future(self):
+        return next(iter(self._pools.values())).create_future()
+
+    def _send_grouped(self, command, keys, values, callback):
+        # Send one request per group with the keys (and values) of that
+        # group and call `callback` with a list of ``(indexes, reply)``
+        # tuples.
+        groups = {}
+        for i, key in enumerate(keys):
+            groups.setdefault(self._group(key), []).append(i)
+
+        if not groups:
+            callback([])
+            return
+
+        replies = []
+        def collect(indexes):
+            def wraps(reply):
+                replies.append((indexes, reply))
+                if len(replies) == len(groups):
+                    callback(replies)
+            return wraps
+
+        for group, indexes in groups.items():
+            self._send_request(self._group_pool(group), collect(indexes),
+                               _group_request(command, keys, values,
+                                              indexes))
+
+    def mget(self, keys, callback=None):
+        callback, future = self._future_callback(callback)
+        keys = list(keys)
+
+        def combine(replies):
+            results = [None] * len(keys)
+            for indexes, reply in replies:
+                if isinstance(reply, Exception):
+                    reply = [reply] * len(indexes)
+                for i, value in zip(indexes, reply):
+                    results[i] = value
+            callback(results)
+        self._send_grouped('MGET', keys, None, combine)
+        return future
+
+    def mset(self, mapping, callback=None):
+        callback, future = self._future_callback(callback)
+        keys = list(mapping)
+
+        def combine(replies):
+            # Every node replies with the same status, the first error wins.
+            result = None
+            for indexes, reply in replies:
+                result = reply
+                if isinstance(reply, Exception):
+                    break
+            callback(result)
+        self._send_grouped('MSET', keys, [mapping[k] for k in keys], combine)
+        return future
+
+    def delete(self, keys, callback=None):
+        callback, future = self._future_callback(callback)
+
+        def combine(replies):
+            total = 0
+            for indexes, reply in replies:
+                if isinstance(reply, Exception):
+                    total = reply
+                    break
+                total += reply
+            callback(total)
+        self._send_grouped('DEL', list(keys), None, combine)
+        return future
+
+    def keys(self, pattern, callback=None):
+        callback, future = self._future_callback(callback)
+        replies = []
+        def collect(reply):
+            replies.append(reply)
+            if len(replies) == len(self._pools):
+                keys = []
+                for reply in replies:
+                    if isinstance(reply, Exception):
+                        callback(reply)
+                        return
+                    keys.extend(reply)
+                callback(keys)
+
+        for pool in self._pools.values():
+            self._send_request(pool, collect, ('KEYS', pattern))
+        return future
+
+    def scan_iter(self, match=None, count=None, type=None):
+        """Return a :class:`ScanIterator` over the keys of all nodes, one
+        node after the other.
+        """
+        return _NodeScanIterator(self, list(self._pools.values()), match,
+                                 count, type)
+
+    def load_scripts(self, callback=None):
+        # Every script is loaded on every node, the callback gets the
+        # digests (or errors) in the order of the scripts.
+        callback, future = self._future_callback(callback)
+        scripts = list(self._scripts.values())
+        if not scripts:
+            callback([])
+            return future
+
+        replies = [None] * len(scripts)
+        outstanding = [len(scripts)]
+        def collect(i):
+            def wraps(reply):
+                replies[i] = reply
+                outstanding[0] -= 1
+                if not outstanding[0]:
+                    callback(replies)
+            return wraps
+
+        for i, script in enumerate(scripts):
+            self.script_load(script.source, callback=collect(i))
+        return future
+
+    def script_load(self, script, callback=None):
+        # Scripts are loaded on every node, the reply is the same for all.
+        callback, future = self._future_callback(callback)
+        replies = []
+        def collect(reply):
+            replies.append(reply)
+            if len(replies) == len(self._pools):
+                errors = [r for r in replies if isinstance(r, Exception)]
+                callback(errors[0] if errors else reply)
+
+        for pool in self._pools.values():
+            self._send_request(pool, collect, ('SCRIPT', 'LOAD', script))
+        return future
+
+    def get_stream(self, key, sink, threshold=STREAM_THRESHOLD,
+                   callback=None):
+        return self._stream_request(self.get_pool(key), callback, sink,
+                                    threshold, ('GET', key))
+
+    def dump_stream(self, key, sink, threshold=STREAM_THRESHOLD,
+                    callback=None):
+        return self._stream_request(self.get_pool(key), callback, sink,
+                                    threshold, ('DUMP', key))
+
+    def stats(self):
+        """Return the statistics of the pool of every node."""
+        return dict((name, pool.stats())
+                    for name, pool in self._pools.items())
+
+    def pipeline(self):
+        raise NotImplementedError('pipelines are not supported')
+
+    def transaction(self, callback=None, watch=(), timeout=None):
+        raise NotImplementedError('transactions are not supported')
+
+    def bulk_load(self, commands, callback=None, **kwargs):
+        raise NotImplementedError('bulk loads are not supported')
+
+    def pubsub(self):
+        raise NotImplementedError('pub/sub is not supported')
+
+
+class _NodeScanIterator(ScanIterator):
+    """A :class:`ScanIterator` that walks the cursor of every node in
+    turn.
+    """
+
+    def __init__(self, client, pools, match=None, count=None, type=None):
+        ScanIterator.__init__(self, client, 'SCAN', None, match, count, type)
+        self._nodes = deque(pools)
+
+    def _send(self, args):
+        self._client._send_request(self._nodes[0], self._handle_page,
+                                   tuple(args))
+
+    def _cursor_done(self):
+        self._nodes.popleft()
+        return not self._nodes
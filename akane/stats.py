@@ -0,0 +1,163 @@
+"""
+    akane.stats
+    ~~~~~~~~~~~
+
+    Latency histograms, counters and hooks for the requests that are sent
+    through the connections of a pool.
+"""
+
+import time
+
+
+# A monotonic clock where there is one (Python 3.3+).
+_clock = getattr(time, 'perf_counter', time.time)
+
+# Quantiles that are included in a snapshot.
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class Histogram(object):
+    """Counts values (microseconds) in buckets whose width grows with the
+    value, like an HDR histogram. Values below ``2 * 2 ** precision`` are
+    counted exactly, larger values with a relative error of at most
+    ``2 ** -precision`` (about 3% with the default of 5 bits).
+    """
+
+    def __init__(self, precision=5):
+        self._bits = precision
+        self._sub = 1 << precision
+        self._counts = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def _index(self, value):
+        shift = value.bit_length() - self._bits - 1
+        if shift <= 0:
+            return value
+        return shift * self._sub + (value >> shift)
+
+    def _upper_bound(self, index):
+        # The highest value that is counted in the bucket at `index`.
+        shift = index // self._sub - 1
+        if shift <= 0:
+            return index
+        return ((index - shift * self._sub + 1) << shift) - 1
+
+    def record(self, value):
+        """Count `value`, an integer that's not negative."""
+        index = self._index(value)
+        self._counts[index] = self._counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, quantile):
+        """Return the value below which `quantile` (0.0 to 1.0) of the
+        counted values are. It's an upper bound of the real value.
+        """
+        if not self.count:
+            return 0
+        rank = max(1, int(quantile * self.count + 0.5))
+        seen = 0
+        for index in sorted(self._counts):
+            seen += self._counts[index]
+            if seen >= rank:
+                return min(self._upper_bound(index), self.max)
+        return self.max
+
+
+class Stats(object):
+    """Collects the latency of every command (from the moment it's sent
+    until its reply has arrived) in a :class:`Histogram` per command name,
+    counts the bytes that are sent and received and the number of replies,
+    errors and push messages, and reads the gauges of the pools that use
+    it.
+
+    Pass it to a client with ``'stats': stats`` in the settings. The same
+    instance can be shared by multiple clients. Connections without stats
+    skip all of this with a single attribute check.
+    """
+
+    def __init__(self):
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.replies = 0
+        self.errors = 0
+        self.pushed = 0
+        self._latency = {}
+        self._hooks = ()
+        self._pools = []
+
+    def add_hook(self, before=None, after=None):
+        """Call `before` with the arguments of every request when it's
+        sent, and `after` with the arguments, the reply, the latency in
+        seconds and the value that `before` returned when the reply has
+        arrived. This can be used to trace requests.
+        """
+        self._hooks += ((before, after),)
+
+    def add_pool(self, pool):
+        self._pools.append(pool)
+
+    def remove_pool(self, pool):
+        if pool in self._pools:
+            self._pools.remove(pool)
+
+    def wrap(self, callback, args):
+        """Return a callback that records the reply to the request `args`
+        and then calls `callback` (if it's not None).
+        """
+        hooks = self._hooks
+        tokens = None
+        if hooks:
+            tokens = [before(args) if before is not None else None
+                      for before, after in hooks]
+        start = _clock()
+
+        def recorded(reply):
+            elapsed = _clock() - start
+            self.record(args[0], elapsed, reply)
+            if tokens is not None:
+                for (before, after), token in zip(hooks, tokens):
+                    if after is not None:
+                        after(args, reply, elapsed, token)
+            if callback is not None:
+                callback(reply)
+        return recorded
+
+    def record(self, command, elapsed, reply):
+        """Count a reply to `command` that took `elapsed` seconds."""
+        histogram = self._latency.get(command)
+        if histogram is None:
+            histogram = self._latency[command] = Histogram()
+        histogram.record(int(elapsed * 1000000))
+        self.replies += 1
+        if isinstance(reply, Exception):
+            self.errors += 1
+
+    def snapshot(self):
+        """Return the current values as a dictionary. Latencies are in
+        seconds. Counters only go up, so they can be exported as is (for
+        example as Prometheus counters and summaries).
+        """
+        commands = {}
+        for command, histogram in self._latency.items():
+            commands[command] = {
+                'count': histogram.count,
+                'sum': histogram.total / 1000000.0,
+                'max': histogram.max / 1000000.0,
+                'quantiles': dict((q, histogram.percentile(q) / 1000000.0)
+                                  for q in QUANTILES)
+            }
+        return {
+            'commands': commands,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'replies': self.replies,
+            'errors': self.errors,
+            'pushed': self.pushed,
+            'pools': [dict(pool.stats(), address=pool.address)
+                      for pool in self._pools]
+        }
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""
+    Corking benchmark
+    ~~~~~~~~~~~~~~~~~
+
+    Measures the number of writes the client does and the number of reads
+    the server needs per request, with and without corking. Every round
+    `concurrency` requests are issued in the same IOLoop iteration, like a
+    handler that yields a list of ``gen.Task`` objects::
+
+        python benchmarks/corking.py --concurrency 30 --rounds 500
+"""
+
+import sys
+import time
+from os import path
+from optparse import OptionParser
+
+sys.path.insert(0, path.join(path.dirname(__file__), '..'))
+
+from tornado.ioloop import IOLoop
+
+from akane import Client
+from server import CannedServer
+
+
+def run(server, cork, concurrency, rounds):
+    ioloop = IOLoop()
+    client = Client({
+        'connections': 1,
+        'port': server.port,
+        'ioloop': ioloop,
+        'cork': cork
+    })
+
+    # Count the writes that reach the IOStream (one ``send`` each).
+    writes = [0]
+    conn = client._pool.get_free_conn()
+    stream_write = conn._stream.write
+    def counting_write(data, *args, **kwargs):
+        writes[0] += 1
+        return stream_write(data, *args, **kwargs)
+    conn._stream.write = counting_write
+
+    state = {'left': 0, 'rounds': rounds}
+    def on_reply(reply):
+        state['left'] -= 1
+        if state['left'] == 0:
+            state['rounds'] -= 1
+            if state['rounds'] == 0:
+                ioloop.stop()
+            else:
+                start_round()
+
+    def start_round():
+        state['left'] = concurrency
+        for i in range(concurrency):
+            client.set('key:%d' % i, 'value', callback=on_reply)
+
+    # Let the connection finish connecting before measuring.
+    ioloop.add_callback(ioloop.stop)
+    ioloop.start()
+    server.reset()
+
+    start = time.time()
+    start_round()
+    ioloop.start()
+    elapsed = time.time() - start
+    ioloop.close(all_fds=True)
+    return elapsed, writes[0], server.reads
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--concurrency', type='int', default=30,
+                      help='requests issued per IOLoop iteration')
+    parser.add_option('--rounds', type='int', default=500,
+                      help='number of rounds')
+    options, args = parser.parse_args()
+
+    server = CannedServer()
+    server.start()
+
+    requests = options.concurrency * options.rounds
+    print('%d rounds of %d requests' % (options.rounds, options.concurrency))
+    for name, cork in (('no corking', False), ('corking', True)):
+        elapsed, writes, reads = run(server, cork, options.concurrency,
+                                     options.rounds)
+        print('%-12s %8.3fs %10.1f req/s %8.3f writes/req %8.3f '
+              'server reads/req' % (name, elapsed, requests / elapsed,
+                                    float(writes) / requests,
+                                    float(reads) / requests))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+    Encoder benchmark
+    ~~~~~~~~~~~~~~~~~
+
+    Compares encoding a ``SET`` request into one contiguous buffer (like the
+    C ``redis_request`` did) with the scatter encoder in ``akane.protocol``
+    for values of 1 KB, 100 KB and 10 MB. Next to the time per request it
+    reports how many bytes the encoder copied into new request buffers.
+    The copy that the ``IOStream`` of Tornado 4.x makes of every buffer
+    written to it is not included::
+
+        python benchmarks/encoder.py
+"""
+
+import sys
+import time
+from os import path
+from optparse import OptionParser
+
+sys.path.insert(0, path.join(path.dirname(__file__), '..'))
+
+from akane.protocol import encode_request, redis_request
+
+
+SIZES = (
+    ('1 KB', 1024),
+    ('100 KB', 100 * 1024),
+    ('10 MB', 10 * 1024 * 1024)
+)
+
+
+def copied(buffers, value):
+    # Only the copies made by the encoder, not those made by the IOStream.
+    return sum(len(buf) for buf in buffers if buf is not value)
+
+
+def run(encode, value, seconds):
+    args = ('SET', 'key', value)
+    buffers = encode(args)
+    count = 0
+    start = time.time()
+    while True:
+        for i in range(10):
+            encode(args)
+        count += 10
+        elapsed = time.time() - start
+        if elapsed >= seconds:
+            break
+    return elapsed / count, copied(buffers, value)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--seconds', type='float', default=1.0,
+                      help='time spent per encoder and size')
+    options, args = parser.parse_args()
+
+    encoders = (
+        ('contiguous', lambda args: [redis_request(args)]),
+        ('scatter', encode_request)
+    )
+
+    print('Only the copies of the encoder are counted, the IOStream of '
+          'Tornado 4.x copies every buffer once more.')
+    for name, size in SIZES:
+        value = b'x' * size
+        for encoder_name, encode in encoders:
+            per_request, copied_bytes = run(encode, value, options.seconds)
+            print('%-7s %-11s %12.2f us/request %12d bytes copied' % (
+                name, encoder_name, per_request * 1e6, copied_bytes))
+
+
+if __name__ == '__main__':
+    main()
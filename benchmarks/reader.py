@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+    Reply reader benchmark
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares the multi-bulk reply throughput of the chunked reader in
+    ``akane.connection.Connection`` with the reader it replaced, which did
+    one IOStream read per protocol line and per bulk.
+
+    A small threaded server answers every request with the same multi-bulk
+    reply, so only the client side is measured::
+
+        python benchmarks/reader.py --items 1000 --requests 200
+"""
+
+import sys
+import time
+from os import path
+from optparse import OptionParser
+
+sys.path.insert(0, path.join(path.dirname(__file__), '..'))
+
+from tornado.ioloop import IOLoop
+
+from akane.connection import Connection
+from server import CannedServer
+
+
+DELIMITER = b'\r\n'
+
+
+def multi_bulk(items, size):
+    value = b'x' * size
+    bulk = b'$' + str(size).encode() + DELIMITER + value + DELIMITER
+    return b'*' + str(items).encode() + DELIMITER + bulk * items
+
+
+class LineConnection(Connection):
+    """The previous reader: one read per header line and per bulk."""
+
+    _reading = False
+
+    def _start_reading(self):
+        pass
+
+    def send_request(self, callback, *args):
+        Connection.send_request(self, callback, *args)
+        if not self._reading:
+            self._reading = True
+            self._stream.read_until(DELIMITER, self._handle_line)
+
+    def _handle_line(self, data):
+        self._parser.feed(data)
+
+        parsed_data = self._parser.gets()
+        if parsed_data is False:
+            next = True
+            if data[0:1] == b'$':
+                next = int(data[1:-2])
+        else:
+            next = False
+
+        if next is True:
+            self._stream.read_until(DELIMITER, self._handle_line)
+        elif next > 0:
+            self._stream.read_bytes(next, self._handle_line)
+        else:
+            cb = self._callbacks.popleft()
+            if self._callbacks:
+                self._stream.read_until(DELIMITER, self._handle_line)
+            else:
+                self._reading = False
+            if cb is not None:
+                cb(parsed_data)
+
+
+def run(connection_class, port, requests):
+    ioloop = IOLoop()
+    conn = connection_class(port=port, ioloop=ioloop)
+    state = {'left': requests}
+
+    def on_reply(reply):
+        state['left'] -= 1
+        if state['left'] == 0:
+            ioloop.stop()
+        else:
+            conn.send_request(on_reply, 'LRANGE', 'list', 0, -1)
+
+    start = time.time()
+    conn.send_request(on_reply, 'LRANGE', 'list', 0, -1)
+    ioloop.start()
+    elapsed = time.time() - start
+    ioloop.close(all_fds=True)
+    return elapsed
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--items', type='int', default=1000,
+                      help='number of elements in each reply')
+    parser.add_option('--size', type='int', default=16,
+                      help='size of each element in bytes')
+    parser.add_option('--requests', type='int', default=200,
+                      help='number of requests per run')
+    options, args = parser.parse_args()
+
+    server = CannedServer(multi_bulk(options.items, options.size))
+    server.start()
+
+    print('%d requests, %d elements of %d bytes per reply' % (
+        options.requests, options.items, options.size))
+    for name, cls in (('line reader', LineConnection),
+                      ('chunked reader', Connection)):
+        elapsed = run(cls, server.port, options.requests)
+        print('%-16s %8.3fs %10.1f replies/s %12.1f elements/s' % (
+            name, elapsed, options.requests / elapsed,
+            options.requests * options.items / elapsed))
+
+
+if __name__ == '__main__':
+    main()
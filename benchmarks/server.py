@@ -0,0 +1,110 @@
+"""
+    Benchmark server
+    ~~~~~~~~~~~~~~~~
+
+    Servers that speak enough of the Redis protocol to benchmark the client
+    without a Redis server.
+"""
+
+import time
+import socket
+import threading
+
+import hiredis
+
+from akane.memory import MemoryServer, Session, encode_reply
+
+
+class CannedServer(threading.Thread):
+    """Replies to every request with `reply` and counts the number of
+    ``recv`` calls and requests it has seen. It listens on a Unix socket
+    when `unix_socket_path` is given, otherwise on a TCP port.
+    """
+
+    daemon = True
+
+    def __init__(self, reply=b'+OK\r\n', unix_socket_path=None):
+        super(CannedServer, self).__init__()
+        self.reply = reply
+        self.reads = 0
+        self.requests = 0
+        self.unix_socket_path = unix_socket_path
+        if unix_socket_path is not None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.bind(unix_socket_path)
+            self.port = None
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.sock.bind(('127.0.0.1', 0))
+            self.port = self.sock.getsockname()[1]
+        self.sock.listen(128)
+
+    def reset(self):
+        self.reads = 0
+        self.requests = 0
+
+    def run(self):
+        while True:
+            conn, addr = self.sock.accept()
+            t = threading.Thread(target=self.serve, args=(conn,))
+            t.daemon = True
+            t.start()
+
+    def serve(self, conn):
+        reader = hiredis.Reader()
+        while True:
+            data = conn.recv(65536)
+            if not data:
+                break
+            self.reads += 1
+            reader.feed(data)
+            count = 0
+            while reader.gets() is not False:
+                count += 1
+            if count:
+                self.requests += count
+                conn.sendall(self.reply * count)
+
+
+class RespServer(CannedServer):
+    """Runs the requests on an :class:`akane.memory.MemoryServer`, the
+    same model of Redis that the ``memory`` backend uses, with a
+    :class:`akane.memory.Session` per connection. The replies to the
+    requests of one ``recv`` are sent after `latency` seconds, like a
+    server that is one round trip of `latency` away.
+    """
+
+    def __init__(self, latency=0.0, unix_socket_path=None):
+        super(RespServer, self).__init__(None, unix_socket_path)
+        self.latency = latency
+        self.server = MemoryServer()
+        self.lock = threading.Lock()
+
+    def serve(self, conn):
+        reader = hiredis.Reader()
+        session = Session()
+        try:
+            while True:
+                data = conn.recv(65536)
+                if not data:
+                    break
+                self.reads += 1
+                reader.feed(data)
+                buffers = []
+                count = 0
+                request = reader.gets()
+                while request is not False:
+                    with self.lock:
+                        encode_reply(self.server.execute(session, request),
+                                     buffers)
+                    count += 1
+                    request = reader.gets()
+                if count:
+                    self.requests += count
+                    if self.latency:
+                        time.sleep(self.latency)
+                    conn.sendall(b''.join(buffers))
+        finally:
+            with self.lock:
+                self.server.disconnect(session)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+"""
+    Benchmark suite
+    ~~~~~~~~~~~~~~~
+
+    Measures the throughput and latency of :class:`akane.Client` for
+    ``GET``, ``SET``, ``MGET``, ``HGETALL`` and ``ZRANGE`` with every
+    combination of payload size, number of connections and concurrency (the
+    number of requests in flight). The results are printed as JSON.
+
+    By default the requests go to a bundled in-process server, which can
+    add latency to every round trip, so the suite runs anywhere and mostly
+    measures the client (the reply reader, the request encoder and the
+    pool). Pass ``--port`` to use a Redis server instead. Only the keys of
+    the suite (prefixed with ``bench:``) are written and deleted::
+
+        python benchmarks/suite.py --sizes 16,1024 --concurrency 1,50
+        python benchmarks/suite.py --latency 0.5 --connections 1,4,16
+        python benchmarks/suite.py --port 6379 --output results.json
+
+    Numbers from different machines (or servers) can't be compared, so
+    compare a change with a run of the previous version on the same
+    machine.
+"""
+
+import sys
+import json
+import time
+from os import path
+from optparse import OptionParser
+
+sys.path.insert(0, path.join(path.dirname(__file__), '..'))
+
+from tornado.ioloop import IOLoop
+
+from akane import Client
+from akane.stats import QUANTILES, Histogram
+from server import RespServer
+
+
+clock = getattr(time, 'perf_counter', time.time)
+
+COMMANDS = ('GET', 'SET', 'MGET', 'HGETALL', 'ZRANGE')
+
+# The number of keys of ``MGET`` and of items in hashes and sorted sets.
+ITEMS = 10
+
+# Every key the suite writes. They are deleted before the data for a run is
+# written, the rest of the database is left alone.
+KEYS = ['bench:string', 'bench:hash', 'bench:zset'] + [
+    'bench:string:%d' % i for i in range(ITEMS)]
+
+
+def wait(ioloop, start):
+    """Call `start` with a callback and run `ioloop` until it's called."""
+    result = []
+    def done(reply=None):
+        result.append(reply)
+        ioloop.stop()
+    ioloop.add_callback(lambda: start(done))
+    ioloop.start()
+    if isinstance(result[0], Exception):
+        raise result[0]
+    return result[0]
+
+
+def populate(client, size, callback):
+    value = b'x' * size
+    pipe = client.pipeline()
+    pipe.delete(KEYS)
+    pipe.set('bench:string', value)
+    pipe.mset(dict(('bench:string:%d' % i, value) for i in range(ITEMS)))
+    pipe.hmset('bench:hash', dict(('field:%d' % i, value)
+                                  for i in range(ITEMS)))
+    score_member = []
+    for i in range(ITEMS):
+        score_member.extend((i, value + str(i).encode()))
+    pipe.zadd('bench:zset', score_member)
+    pipe.execute(callback)
+
+
+def request(client, command, size):
+    """Return a function that sends one `command` request."""
+    if command == 'GET':
+        return lambda callback: client.get('bench:string', callback=callback)
+    if command == 'SET':
+        value = b'x' * size
+        return lambda callback: client.set('bench:string', value,
+                                           callback=callback)
+    if command == 'MGET':
+        keys = ['bench:string:%d' % i for i in range(ITEMS)]
+        return lambda callback: client.mget(keys, callback=callback)
+    if command == 'HGETALL':
+        return lambda callback: client.hgetall('bench:hash',
+                                               callback=callback)
+    if command == 'ZRANGE':
+        return lambda callback: client.zrange('bench:zset', 0, -1,
+                                              callback=callback)
+    raise ValueError('unknown command: %s' % command)
+
+
+def run(settings, command, size, connections, concurrency, requests):
+    ioloop = IOLoop()
+    client = Client(dict(settings, connections=connections, ioloop=ioloop))
+    wait(ioloop, lambda done: populate(client, size, done))
+
+    send = request(client, command, size)
+    histogram = Histogram()
+    state = {'sent': 0, 'received': 0, 'errors': 0}
+
+    def send_one():
+        state['sent'] += 1
+        start = clock()
+
+        def on_reply(reply):
+            histogram.record(int((clock() - start) * 1000000))
+            if isinstance(reply, Exception):
+                state['errors'] += 1
+            state['received'] += 1
+            if state['sent'] < requests:
+                send_one()
+            elif state['received'] == requests:
+                ioloop.stop()
+        send(on_reply)
+
+    def start():
+        for i in range(min(concurrency, requests)):
+            send_one()
+
+    begin = clock()
+    ioloop.add_callback(start)
+    ioloop.start()
+    elapsed = clock() - begin
+    client._pool.close()
+    ioloop.close(all_fds=True)
+
+    result = {
+        'command': command,
+        'size': size,
+        'connections': connections,
+        'concurrency': concurrency,
+        'requests': requests,
+        'errors': state['errors'],
+        'seconds': elapsed,
+        'ops_per_second': requests / elapsed,
+        'latency_max_us': histogram.max
+    }
+    for quantile in QUANTILES:
+        key = 'latency_p%s_us' % ('%g' % (quantile * 100)).replace('.', '')
+        result[key] = histogram.percentile(quantile)
+    return result
+
+
+def integers(value):
+    return [int(item) for item in value.split(',')]
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--commands', default=','.join(COMMANDS),
+                      help='comma separated commands to run')
+    parser.add_option('--sizes', default='16,1024,65536',
+                      help='comma separated payload sizes in bytes')
+    parser.add_option('--connections', default='1,4',
+                      help='comma separated connection counts')
+    parser.add_option('--concurrency', default='1,50',
+                      help='comma separated numbers of requests in flight')
+    parser.add_option('--requests', type='int', default=10000,
+                      help='number of requests per run')
+    parser.add_option('--latency', type='float', default=0.0,
+                      help='milliseconds the bundled server waits before '
+                           'replying')
+    parser.add_option('--host', default='localhost',
+                      help='host of the Redis server (with --port)')
+    parser.add_option('--port', type='int', default=None,
+                      help='use the Redis server on this port instead of '
+                           'the bundled server')
+    parser.add_option('--output', default=None,
+                      help='write the JSON to a file instead of stdout')
+    options, args = parser.parse_args()
+
+    if options.port is None:
+        server = RespServer(latency=options.latency / 1000.0)
+        server.start()
+        settings = {'port': server.port}
+        target = 'bundled'
+    else:
+        settings = {'host': options.host, 'port': options.port}
+        target = '%s:%d' % (options.host, options.port)
+
+    results = []
+    for command in options.commands.upper().split(','):
+        for size in integers(options.sizes):
+            for connections in integers(options.connections):
+                for concurrency in integers(options.concurrency):
+                    result = run(settings, command, size, connections,
+                                 concurrency, options.requests)
+                    results.append(result)
+                    sys.stderr.write(
+                        '%-8s %7d bytes %3d conn %4d in flight '
+                        '%10.1f ops/s\n' % (
+                            command, size, connections, concurrency,
+                            result['ops_per_second']))
+
+    report = json.dumps({
+        'server': target,
+        'latency_ms': options.latency if options.port is None else None,
+        'python': sys.version.split()[0],
+        'results': results
+    }, indent=2, sort_keys=True)
+    if options.output is None:
+        print(report)
+    else:
+        with open(options.output, 'w') as f:
+            f.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main()
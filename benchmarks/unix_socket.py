@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+    Unix socket benchmark
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Compares the latency of requests over loopback TCP and over a Unix
+    socket. Requests are sent one at a time, so every request pays the full
+    round trip::
+
+        python benchmarks/unix_socket.py --requests 20000
+"""
+
+import os
+import sys
+import time
+import tempfile
+from os import path
+from optparse import OptionParser
+
+sys.path.insert(0, path.join(path.dirname(__file__), '..'))
+
+from tornado.ioloop import IOLoop
+
+from akane import Client
+from server import CannedServer
+
+
+def run(settings, requests):
+    ioloop = IOLoop()
+    client = Client(dict(settings, connections=1, ioloop=ioloop))
+
+    state = {'left': requests}
+    def on_reply(reply):
+        state['left'] -= 1
+        if state['left'] == 0:
+            ioloop.stop()
+        else:
+            client.get('key', callback=on_reply)
+
+    # Let the connection finish connecting before measuring.
+    ioloop.add_callback(ioloop.stop)
+    ioloop.start()
+
+    start = time.time()
+    client.get('key', callback=on_reply)
+    ioloop.start()
+    elapsed = time.time() - start
+    ioloop.close(all_fds=True)
+    return elapsed
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--requests', type='int', default=20000,
+                      help='number of sequential requests')
+    options, args = parser.parse_args()
+
+    reply = b'$5\r\nvalue\r\n'
+    tcp = CannedServer(reply)
+    tcp.start()
+
+    directory = tempfile.mkdtemp()
+    unix_socket_path = path.join(directory, 'akane.sock')
+    unix = CannedServer(reply, unix_socket_path=unix_socket_path)
+    unix.start()
+
+    print('%d sequential GET requests' % options.requests)
+    try:
+        for name, settings in (
+                ('tcp', {'port': tcp.port}),
+                ('unix socket', {'unix_socket_path': unix_socket_path})):
+            elapsed = run(settings, options.requests)
+            print('%-12s %8.3fs %10.1f req/s %8.1f us/req' % (
+                name, elapsed, options.requests / elapsed,
+                elapsed / options.requests * 1e6))
+    finally:
+        os.unlink(unix_socket_path)
+        os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main()
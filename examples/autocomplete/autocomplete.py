@@ -28,41 +28,65 @@ class IndexHandler(BaseHandler):
         key_exists = yield gen.Task(self.db.exists, KEY)
         if key_exists == 0:
             with open('female-names.txt', 'r') as fd:
-                for line in fd.xreadlines():
-                    if line.startswith('#'):
-                        continue
-                    line = line.strip()
-                    for end_index in range(1, len(line)):
-                        prefix = line[0:end_index]
-                        yield gen.Task(self.db.zadd, KEY, (0, prefix))
-                    yield gen.Task(self.db.zadd, KEY, (0, line + '*'))
+                yield gen.Task(self.db.bulk_load, index_commands(fd))
 
         self.render('autocomplete.html')
 
 
+def index_commands(lines):
+    """Yield a ``ZADD`` for every prefix of every name and for the name
+    itself, marked with a "*".
+    """
+    for line in lines:
+        if line.startswith('#'):
+            continue
+        line = line.strip()
+        for end_index in range(1, len(line)):
+            yield ('ZADD', KEY, 0, line[0:end_index])
+        yield ('ZADD', KEY, 0, line + '*')
+
+
+# Walks the sorted set from the position of the prefix and collects complete
+# words (marked with a "*") until an entry doesn't start with the prefix.
+COMPLETE_SCRIPT = """
+local prefix = ARGV[1]
+local count = tonumber(ARGV[2])
+local rangelen = 50
+local results = {}
+
+local start = redis.call('ZRANK', KEYS[1], prefix)
+if not start then
+    return results
+end
+
+while #results < count do
+    local entries = redis.call('ZRANGE', KEYS[1], start, start + rangelen - 1)
+    start = start + rangelen
+    if #entries == 0 then
+        break
+    end
+    for _, entry in ipairs(entries) do
+        local minlen = math.min(#entry, #prefix)
+        if string.sub(entry, 1, minlen) ~= string.sub(prefix, 1, minlen) then
+            return results
+        end
+        if string.sub(entry, -1) == '*' and #results < count then
+            table.insert(results, string.sub(entry, 1, -2))
+        end
+    end
+end
+
+return results
+"""
+
+
 class AutoCompleteHandler(BaseHandler):
     @web.asynchronous
     @gen.engine
     def post(self):
         prefix = self.get_argument('input')
-        count = 50
-
-        results = []
-        rangelen = 50
-        start = yield gen.Task(self.db.zrank, KEY, prefix)
-        if start is not None:
-            while len(results) != count:
-                r = yield gen.Task(self.db.zrange, KEY, str(start), str(start + rangelen - 1))
-                start += rangelen
-                if not r or len(r) == 0:
-                    break
-                for entry in r:
-                    minlen = min((len(entry), len(prefix)))
-                    if entry[0:minlen] != prefix[0:minlen]:
-                        count = len(results)
-                        break
-                    if entry[-1] == '*' and len(results) != count:
-                        results.append(entry[0:-1])
+        complete = self.application.complete
+        results = yield gen.Task(complete, keys=(KEY,), args=(prefix, 50))
 
         self.write(json.dumps(results))
         self.finish()
@@ -81,8 +105,10 @@ if __name__ == '__main__':
         debug=True)
 
         application.db = Client({
-            'connections': 10
+            'connections': 10,
+            'decode_responses': True
         })
+        application.complete = application.db.register_script(COMPLETE_SCRIPT)
 
         http_server = tornado.httpserver.HTTPServer(application)
         http_server.listen(8888)
@@ -57,6 +57,17 @@ class OverviewHandler(BaseHandler):
         data = yield gen.Task(self.db.hgetall, 'hash_key')
         self.write('%r<br>' % (data,))
 
+        self.write('Pipeline:<br><br>')
+
+        pipe = self.db.pipeline()
+        pipe.set('k_1', '1')
+        pipe.incr('k_1')
+        pipe.mget(('k_1', 'k_2', 'k_3'))
+        pipe.hgetall('hash_key')
+        data = yield gen.Task(pipe.execute)
+        for d in data:
+            self.write('%r<br>' % (d,))
+
         self.finish()
 
 
@@ -68,7 +79,8 @@ if __name__ == '__main__':
             (r'/', OverviewHandler),
         ), debug=True)
         application.db = Client({
-            'connections': 10
+            'connections': 10,
+            'decode_responses': True
         })
 
         http_server = tornado.httpserver.HTTPServer(application)
@@ -4,6 +4,27 @@ try:
     from setuptools import setup, Extension
 except ImportError:
     from distutils.core import setup, Extension
+from distutils.command.build_ext import build_ext
+from distutils.errors import CCompilerError, DistutilsExecError, \
+    DistutilsPlatformError
+
+
+class optional_build_ext(build_ext):
+    """The C extension only speeds up encoding small requests. When it
+    can't be built the pure Python encoder in akane.protocol is used.
+    """
+
+    def run(self):
+        try:
+            build_ext.run(self)
+        except DistutilsPlatformError:
+            self.warn('building the C extension failed, using pure Python')
+
+    def build_extension(self, ext):
+        try:
+            build_ext.build_extension(self, ext)
+        except (CCompilerError, DistutilsExecError, DistutilsPlatformError):
+            self.warn('building the C extension failed, using pure Python')
 
 
 setup(
@@ -23,6 +44,7 @@ setup(
         'akane/utils.c',
         'akane/buffer.c'
     ])],
+    cmdclass={'build_ext': optional_build_ext},
     classifiers = [
         'Development Status :: 4 - Beta',
         'Intended Audience :: Developers',
@@ -0,0 +1,51 @@
+import akane
+from akane.memory import get_server
+
+from minitest import TornadoTestCase, ok, runner
+
+
+class BulkLoadTest(TornadoTestCase):
+    name = 'Bulk Load'
+
+    def setup(self):
+        get_server().flushall()
+        self.db = akane.Client({
+            'backend': 'memory',
+            'connections': 1,
+            'ioloop': self.io_loop
+        })
+
+    def test_load(self):
+        pending = []
+        def commands():
+            for i in range(1000):
+                for conn in self.db._pool._reserved:
+                    pending.append(conn.pending())
+                yield ('ZADD', 'z', i, 'member:%d' % i)
+            yield ('INCR', 'z')
+
+        progress = []
+        self.db.bulk_load(commands(), chunk_size=10, max_pending=100,
+                          progress=lambda replies, errors:
+                          progress.append(replies),
+                          callback=self.stop)
+        result = self.wait()
+        ok(result['commands']) == 1001
+        ok(result['errors']) == 1
+        ok(result['failed'][0][:2]) == (1000, ('INCR', 'z'))
+        ok(result['failed'][0][2]).instance_of(akane.ReplyError)
+        ok(max(pending) <= 100) == True
+        ok(progress[-1]) == 1001
+
+        self.db.zcard('z', callback=self.stop)
+        ok(self.wait()) == 1000
+
+    def test_empty(self):
+        self.db.bulk_load([], callback=self.stop)
+        ok(self.wait()) == {'commands': 0, 'errors': 0, 'failed': []}
+
+
+if __name__ == '__main__':
+    runner([
+        BulkLoadTest
+    ])
@@ -0,0 +1,253 @@
+import hiredis
+
+from tornado.netutil import bind_sockets
+try:
+    from tornado.tcpserver import TCPServer
+except ImportError:
+    from tornado.netutil import TCPServer
+
+import akane
+from akane.cluster import SLOTS, crc16, key_slot
+from akane.memory import OK, CommandError, encode_reply
+
+from minitest import TornadoTestCase, TestCase, ok, runner
+
+
+class FakeCluster(object):
+    """Nodes that own slot ranges and redirect like Redis Cluster does."""
+
+    def __init__(self, io_loop, count=2):
+        self.nodes = []
+        for i in range(count):
+            sockets = bind_sockets(0, '127.0.0.1')
+            node = FakeNode(self, io_loop=io_loop)
+            node.add_sockets(sockets)
+            node.port = sockets[0].getsockname()[1]
+            self.nodes.append(node)
+
+        self.owners = [None] * SLOTS
+        self.migrating = {}
+        per_node = SLOTS // count
+        for i, node in enumerate(self.nodes):
+            end = SLOTS if i == count - 1 else (i + 1) * per_node
+            self.assign(i * per_node, end, node)
+
+    def assign(self, start, end, node):
+        self.owners[start:end] = [node] * (end - start)
+
+    def slots(self):
+        layout = []
+        start = 0
+        for slot in range(1, SLOTS + 1):
+            if slot == SLOTS or self.owners[slot] is not self.owners[start]:
+                node = self.owners[start]
+                layout.append([start, slot - 1,
+                               [b'127.0.0.1', node.port, b'node']])
+                start = slot
+        return layout
+
+    def stop(self):
+        for node in self.nodes:
+            node.stop()
+
+
+class FakeNode(TCPServer):
+
+    def __init__(self, cluster, **kwargs):
+        TCPServer.__init__(self, **kwargs)
+        self.cluster = cluster
+        self.data = {}
+        self.requests = 0
+
+    def handle_stream(self, stream, address):
+        reader = hiredis.Reader()
+        state = {'asking': False}
+
+        def handle_data(data):
+            reader.feed(data)
+            replies = []
+            request = reader.gets()
+            while request is not False:
+                self.requests += 1
+                encode_reply(self.handle(request, state), replies)
+                request = reader.gets()
+            if replies:
+                stream.write(b''.join(replies))
+        stream.read_until_close(handle_data, handle_data)
+
+    def handle(self, request, state):
+        command = request[0].upper()
+        args = request[1:]
+        if command == b'CLUSTER':
+            return self.cluster.slots()
+        if command == b'ASKING':
+            state['asking'] = True
+            return OK
+
+        if command == b'MSET':
+            keys = args[::2]
+        elif command in (b'GET', b'SET'):
+            keys = args[:1]
+        else:
+            keys = args
+        slots = set(key_slot(key) for key in keys)
+        if len(slots) > 1:
+            return CommandError("CROSSSLOT Keys don't hash to the same slot")
+        slot = slots.pop()
+
+        asking, state['asking'] = state['asking'], False
+        owner = self.cluster.owners[slot]
+        target = self.cluster.migrating.get(slot)
+        if owner is not self and not (asking and target is self):
+            return CommandError('MOVED %d 127.0.0.1:%d' % (slot, owner.port))
+        if owner is self and target is not None and \
+                not all(key in self.data for key in keys):
+            return CommandError('ASK %d 127.0.0.1:%d' % (slot, target.port))
+
+        if command == b'GET':
+            return self.data.get(args[0])
+        if command == b'SET':
+            self.data[args[0]] = args[1]
+            return OK
+        if command == b'MGET':
+            return [self.data.get(key) for key in args]
+        if command == b'MSET':
+            for i in range(0, len(args), 2):
+                self.data[args[i]] = args[i + 1]
+            return OK
+        if command == b'DEL':
+            return len([self.data.pop(key) for key in args if key in self.data])
+        return CommandError('ERR unknown command')
+
+
+class KeySlotTest(TestCase):
+    name = 'Cluster Key Slots'
+
+    def test_crc16(self):
+        ok(crc16(b'123456789')) == 0x31c3
+
+    def test_key_slot(self):
+        ok(key_slot('foo')) == 12182
+        ok(key_slot('{user1000}.following')) == key_slot('{user1000}.followers')
+        ok(key_slot('{}foo')) == key_slot(b'{}foo')
+        ok(key_slot('foo{}{bar}')) != key_slot('bar')
+
+
+class ClusterTest(TornadoTestCase):
+    name = 'Cluster Routing'
+
+    def setup(self):
+        self.cluster = FakeCluster(self.io_loop)
+        self.db = akane.ClusterClient(
+            ['127.0.0.1:%d' % self.cluster.nodes[0].port],
+            {'ioloop': self.io_loop, 'decode_responses': True})
+        self.db.refresh_slots(callback=self.stop)
+        self.wait()
+
+    def teardown(self):
+        self.cluster.stop()
+
+    def node_of(self, key):
+        return self.cluster.owners[key_slot(key)]
+
+    def test_routing(self):
+        for i in range(20):
+            self.db.set('key:%d' % i, 'value', callback=self.stop)
+            ok(self.wait()) == 'OK'
+        for i in range(20):
+            key = 'key:%d' % i
+            ok(self.node_of(key).data.get(key.encode())) == b'value'
+
+    def test_moved(self):
+        node_a, node_b = self.cluster.nodes
+        key = 'moved'
+        owner = self.node_of(key)
+        other = node_b if owner is node_a else node_a
+        slot = key_slot(key)
+        self.cluster.assign(slot, slot + 1, other)
+
+        self.db.set(key, 'value', callback=self.stop)
+        ok(self.wait()) == 'OK'
+        ok(other.data[b'moved']) == b'value'
+
+        self.db.get(key, callback=self.stop)
+        ok(self.wait()) == 'value'
+
+    def test_ask(self):
+        node_a, node_b = self.cluster.nodes
+        key = 'asked'
+        owner = self.node_of(key)
+        target = node_b if owner is node_a else node_a
+        self.cluster.migrating[key_slot(key)] = target
+        target.data[b'asked'] = b'value'
+
+        self.db.get(key, callback=self.stop)
+        ok(self.wait()) == 'value'
+        del self.cluster.migrating[key_slot(key)]
+
+    def test_mget(self):
+        keys = ['mget:%d' % i for i in range(20)]
+        self.db.mset(dict((k, k) for k in keys), callback=self.stop)
+        ok(self.wait()) == 'OK'
+        self.db.mget(keys + ['missing'], callback=self.stop)
+        ok(self.wait()) == keys + [None]
+
+    def test_multi_key_write_per_node(self):
+        keys = ['multi:%d' % i for i in range(20)]
+        self.db.mset(dict((k, k) for k in keys), callback=self.stop)
+        ok(self.wait()) == 'OK'
+
+        # 20 slots, but one connection and one write per node.
+        acquired = []
+        for pool in self.db._pools.values():
+            def acquire(callback, acquire=pool.acquire):
+                acquired.append(callback)
+                acquire(callback)
+            pool.acquire = acquire
+        self.db.mget(keys, callback=self.stop)
+        ok(self.wait()) == keys
+        ok(len(acquired)) == len(self.cluster.nodes)
+        for pool in self.db._pools.values():
+            del pool.acquire
+
+        # A slot that has moved is redirected on its own.
+        node_a, node_b = self.cluster.nodes
+        owner = self.node_of(keys[3])
+        other = node_b if owner is node_a else node_a
+        key = keys[3].encode()
+        other.data[key] = owner.data.pop(key)
+        slot = key_slot(keys[3])
+        self.cluster.assign(slot, slot + 1, other)
+        self.db.mget(keys, callback=self.stop)
+        ok(self.wait()) == keys
+        self.db.delete(keys, callback=self.stop)
+        ok(self.wait()) == 20
+
+    def test_get_stream(self):
+        for i in range(10):
+            key = 'stream:%d' % i
+            self.node_of(key).data[key.encode()] = b'x' * 100
+            chunks = []
+            self.db.get_stream(key, chunks.append, threshold=10,
+                               callback=self.stop)
+            ok(self.wait()) == 100
+            ok(b''.join(chunks)) == b'x' * 100
+
+    def test_pipeline(self):
+        pipe = self.db.pipeline()
+        for i in range(10):
+            pipe.set('pipe:%d' % i, str(i))
+        for i in range(10):
+            pipe.get('pipe:%d' % i)
+        before = [node.requests for node in self.cluster.nodes]
+        pipe.execute(callback=self.stop)
+        ok(self.wait()) == ['OK'] * 10 + [str(i) for i in range(10)]
+        after = [node.requests for node in self.cluster.nodes]
+        ok(sum(after) - sum(before)) == 20
+
+
+if __name__ == '__main__':
+    runner([
+        KeySlotTest,
+        ClusterTest
+    ])
@@ -0,0 +1,69 @@
+from akane.client import Client, Pipeline, Transaction, convert_reply
+from akane.commands import COMMANDS
+from akane.protocol import redis_request
+from akane.sharding import command_key
+
+from minitest import TestCase, ok, runner
+
+
+class CommandTableTest(TestCase):
+    name = 'Command Table'
+
+    def test_keys(self):
+        ok(COMMANDS['GET'].keys(('GET', 'a'))) == ['a']
+        ok(COMMANDS['MSET'].keys(('MSET', 'a', 1, 'b', 2))) == ['a', 'b']
+        ok(COMMANDS['BLPOP'].keys(('BLPOP', 'a', 'b', 0))) == ['a', 'b']
+        ok(COMMANDS['EVAL'].keys(('EVAL', 's', 2, 'a', 'b', 'x'))) == \
+            ['a', 'b']
+        ok(COMMANDS['ZUNIONSTORE'].keys(('ZUNIONSTORE', 'd', 2, 'a', 'b'))) \
+            == ['d', 'a', 'b']
+        ok(COMMANDS['PING'].keys(('PING',))) == []
+
+    def test_command_key(self):
+        ok(command_key(('GET', 'a'))) == 'a'
+        ok(command_key(('EVALSHA', 'sha', 1, 'a', 'x'))) == 'a'
+        ok(command_key(('UNKNOWN', 'a'))) == 'a'
+
+    def test_prefix(self):
+        ok(redis_request(('GET', 'a'))) == b'*2\r\n$3\r\nGET\r\n$1\r\na\r\n'
+        ok(redis_request(('SET', 'a', 'b', 'NX'))) == \
+            b'*4\r\n$3\r\nSET\r\n$1\r\na\r\n$1\r\nb\r\n$2\r\nNX\r\n'
+        ok(redis_request(('FOO', 1))) == b'*2\r\n$3\r\nFOO\r\n$1\r\n1\r\n'
+
+    def test_convert_reply(self):
+        ok(convert_reply(('HGETALL', 'h'), ['a', '1', 'b', '2'])) == \
+            {'a': '1', 'b': '2'}
+        ok(convert_reply(('ZRANGE', 'z', 0, -1, 'withscores'),
+                         ['a', '1', 'b', '2.5'])) == [('a', 1.0), ('b', 2.5)]
+        ok(convert_reply(('ZRANGE', 'z', 0, -1), ['a', 'b'])) == ['a', 'b']
+        ok(convert_reply(('SISMEMBER', 's', 'a'), 1)) == True
+        ok(convert_reply(('ZSCORE', 'z', 'a'), None)) == None
+        ok(convert_reply(('GET', 'a'), 'b')) == 'b'
+
+    def test_generated_methods(self):
+        ok(Client.append.__name__) == 'append'
+        ok(Client.set_nx.__doc__) == 'Send ``SETNX``.'
+        for command in COMMANDS.values():
+            if command.method is not None:
+                ok(hasattr(Client, command.method)) == True
+                ok(hasattr(Pipeline, command.method)) == True
+
+    def test_pipeline_methods(self):
+        # Methods that can't be buffered are only on the client.
+        for name in ('get_stream', 'bulk_load', 'pipeline', 'transaction',
+                     'register_script', 'scan_iter', 'pubsub'):
+            ok(hasattr(Pipeline, name)) == False
+
+    def test_watch_methods(self):
+        # Watching only makes sense on the connection of a transaction.
+        for name in ('watch', 'unwatch'):
+            ok(hasattr(Client, name)) == False
+            ok(hasattr(Pipeline, name)) == False
+            ok(hasattr(Transaction, name)) == True
+        ok(COMMANDS['WATCH'].readonly) == False
+
+
+if __name__ == '__main__':
+    runner([
+        CommandTableTest
+    ])
@@ -0,0 +1,361 @@
+import os
+import shutil
+import socket
+import tempfile
+import time
+
+import hiredis
+
+from tornado.netutil import bind_sockets, bind_unix_socket
+try:
+    from tornado.tcpserver import TCPServer
+except ImportError:
+    from tornado.netutil import TCPServer
+
+import akane
+from akane import connection
+from akane.connection import Connection, Pool, PoolError
+from akane.memory import MemoryServer, Session, encode_reply
+
+from minitest import TornadoTestCase, ok, runner
+
+
+# Nothing listens on this port.
+REFUSED_PORT = 1
+
+
+class FlakyServer(TCPServer):
+    """Runs requests on a :class:`MemoryServer`. When `silent` is set it
+    doesn't reply, when `drop` is set it closes the next connection that
+    sends a request. It listens on `unix_socket_path` when it's given.
+    """
+
+    def __init__(self, unix_socket_path=None, **kwargs):
+        TCPServer.__init__(self, **kwargs)
+        if unix_socket_path is not None:
+            self.add_socket(bind_unix_socket(unix_socket_path))
+            self.port = None
+        else:
+            sockets = bind_sockets(0, '127.0.0.1')
+            self.add_sockets(sockets)
+            self.port = sockets[0].getsockname()[1]
+        self.server = MemoryServer()
+        self.silent = False
+        self.drop = False
+        self.connections = 0
+
+    def handle_stream(self, stream, address):
+        self.connections += 1
+        reader = hiredis.Reader()
+        session = Session()
+
+        def handle_data(data):
+            if self.drop:
+                self.drop = False
+                stream.close()
+                return
+            reader.feed(data)
+            replies = []
+            request = reader.gets()
+            while request is not False:
+                encode_reply(self.server.execute(session, request), replies)
+                request = reader.gets()
+            if replies and not self.silent:
+                stream.write(b''.join(replies))
+        stream.read_until_close(handle_data, handle_data)
+
+
+class ConnectionTest(TornadoTestCase):
+    name = 'Connections'
+
+    def test_refused(self):
+        conn = Connection(port=REFUSED_PORT, ioloop=self.io_loop)
+        conn.send_request(self.stop, 'GET', 'key')
+        ok(self.wait()).instance_of(akane.ConnectionError)
+        ok(conn.closed()) == True
+
+    def test_refused_client(self):
+        db = akane.Client({'port': REFUSED_PORT, 'ioloop': self.io_loop})
+        db.get('key', callback=self.stop)
+        ok(self.wait()).instance_of(akane.ConnectionError)
+        db._pool.close()
+
+    def test_reconnect_after_connect_error(self):
+        # Creating the connection fails a few times, the pool keeps trying
+        # until it can connect.
+        pool = Pool(min_size=1, max_size=1, backend='memory',
+                    ioloop=self.io_loop, reconnect_delay=0.01)
+        create_connection = pool.create_connection
+        failures = [3]
+        def fail_first():
+            if failures[0]:
+                failures[0] -= 1
+                raise socket.error('too many open files')
+            return create_connection()
+        pool.create_connection = fail_first
+
+        pool.acquire(self.stop)
+        ok(self.wait().closed()) == False
+        ok(failures[0]) == 0
+        ok(pool.stats()['disconnects']) == 3
+        pool.close()
+
+
+class TimeoutRetryTest(TornadoTestCase):
+    name = 'Timeouts and Retries'
+
+    def setup(self):
+        self.server = FlakyServer(io_loop=self.io_loop)
+
+    def teardown(self):
+        self.server.stop()
+
+    def client(self, **settings):
+        settings.setdefault('port', self.server.port)
+        settings.setdefault('decode_responses', True)
+        return akane.Client(dict(settings, ioloop=self.io_loop))
+
+    def test_timeout(self):
+        db = self.client(command_timeout=0.05)
+        connections = self.server.connections
+        self.server.silent = True
+        replies = []
+        def collect(reply):
+            replies.append(reply)
+            if len(replies) == 3:
+                self.stop()
+        db.set('a', 'value', callback=collect)
+        db.get('a', callback=collect)
+        db.get('b', callback=collect)
+        self.wait()
+        for reply in replies:
+            ok(reply).instance_of(akane.TimeoutError)
+
+        # The connection is replaced.
+        self.server.silent = False
+        db.get('a', callback=self.stop)
+        ok(self.wait()) == 'value'
+        ok(self.server.connections - connections) == 2
+        db._pool.close()
+
+    def test_refused_backoff(self):
+        # Record the upper bounds of the random reconnect delays.
+        delays = []
+        stop = self.stop
+        class Random(object):
+            def uniform(self, low, high):
+                delays.append(high)
+                if len(delays) == 4:
+                    stop()
+                return 0.001
+        random, connection.random = connection.random, Random()
+        try:
+            pool = Pool(connections=1, port=REFUSED_PORT,
+                        ioloop=self.io_loop, reconnect_delay=0.01,
+                        max_reconnect_delay=0.04)
+            self.wait()
+        finally:
+            connection.random = random
+        pool.close()
+        ok(delays) == [0.01, 0.02, 0.04, 0.04]
+
+    def test_retry_reads(self):
+        db = self.client(retries=1, reconnect_delay=0.01)
+        connections = self.server.connections
+        db.set('a', 'value', callback=self.stop)
+        ok(self.wait()) == 'OK'
+
+        # A read is sent again on a new connection.
+        self.server.drop = True
+        db.get('a', callback=self.stop)
+        ok(self.wait()) == 'value'
+        ok(self.server.connections - connections) == 2
+
+        # A write might have been executed, it's not retried.
+        self.server.drop = True
+        db.set('a', 'other', callback=self.stop)
+        ok(self.wait()).instance_of(akane.ConnectionError)
+        db._pool.close()
+
+
+class SocketTest(TornadoTestCase):
+    name = 'Sockets'
+
+    def setup(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'redis.sock')
+        self.unix_server = FlakyServer(unix_socket_path=self.path,
+                                       io_loop=self.io_loop)
+        self.server = FlakyServer(io_loop=self.io_loop)
+
+    def teardown(self):
+        self.unix_server.stop()
+        self.server.stop()
+        shutil.rmtree(self.tempdir)
+
+    def test_unix_socket(self):
+        db = akane.Client({'unix_socket_path': self.path,
+                           'decode_responses': True,
+                           'ioloop': self.io_loop})
+        ok(db._pool.address) == self.path
+        db.set('a', 'value', callback=self.stop)
+        ok(self.wait()) == 'OK'
+        db.get('a', callback=self.stop)
+        ok(self.wait()) == 'value'
+        ok(self.unix_server.connections) == 1
+        db._pool.close()
+
+    def test_socket_options(self):
+        conn = Connection(port=self.server.port, ioloop=self.io_loop,
+                          keepalive=True, sndbuf=65536, rcvbuf=65536)
+        conn.send_request(self.stop, 'PING')
+        ok(self.wait()) == b'PONG'
+
+        sock = conn._stream.socket
+        ok(sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE)) != 0
+        ok(sock.getsockopt(socket.SOL_TCP, socket.TCP_NODELAY)) != 0
+        # Linux doubles the sizes for its own bookkeeping.
+        ok(sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)) >= 65536
+        ok(sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)) >= 65536
+        conn.close()
+
+    def test_flush_after_close(self):
+        conn = Connection(port=self.server.port, ioloop=self.io_loop,
+                          cork=True)
+        replies = []
+        conn.send_request(replies.append, 'PING')
+        conn.close()
+
+        # The buffered request is dropped, its callback gets an error once.
+        self.io_loop.add_timeout(time.time() + 0.01, self.stop)
+        self.wait()
+        ok(len(replies)) == 1
+        ok(replies[0]).instance_of(akane.ConnectionError)
+
+        try:
+            conn.write_request('SUBSCRIBE', 'channel')
+        except akane.ConnectionError:
+            pass
+        else:
+            raise AssertionError('write_request did not raise')
+
+    def test_default_socket_options(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sndbuf = sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+        connection.set_socket_options(sock)
+        ok(sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE)) == 0
+        ok(sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)) == sndbuf
+        sock.close()
+
+
+class ElasticPoolTest(TornadoTestCase):
+    name = 'Elastic Pools'
+
+    def pool(self, **kwargs):
+        kwargs.setdefault('min_size', 1)
+        kwargs.setdefault('max_size', 3)
+        return Pool(backend='memory', port=16101, ioloop=self.io_loop,
+                    **kwargs)
+
+    def wait_for(self, seconds):
+        self.io_loop.add_timeout(time.time() + seconds, self.stop)
+        self.wait()
+
+    def send(self, pool, callback):
+        conn = pool.get_free_conn()
+        conn.send_request(callback, 'PING')
+        return conn
+
+    def test_grow_on_demand(self):
+        pool = self.pool()
+        self.wait_for(0.01)
+        ok(pool.stats()['connections']) == 1
+
+        # Every connection has a reply pending, a new one is opened until
+        # there are `max_size`.
+        replies = []
+        def collect(reply):
+            replies.append(reply)
+            if len(replies) == 4:
+                self.stop()
+        conns = set(self.send(pool, collect) for i in range(4))
+        ok(len(conns)) == 3
+        ok(pool.stats()['connections']) == 3
+        self.wait()
+        ok(replies) == [b'PONG'] * 4
+        pool.close()
+
+    def test_idle_reaping(self):
+        pool = self.pool(idle_timeout=0.05)
+        self.wait_for(0.01)
+        for i in range(3):
+            self.send(pool, lambda reply: None)
+        ok(pool.stats()['connections']) == 3
+
+        # Idle connections are closed until `min_size` are left.
+        self.wait_for(0.2)
+        ok(pool.stats()['connections']) == 1
+        ok(pool.get_free_conn().closed()) == False
+        pool.close()
+
+    def test_reap_dropped_connection(self):
+        pool = self.pool(min_size=2, idle_timeout=60)
+        self.wait_for(0.01)
+        for i in range(3):
+            self.send(pool, lambda reply: None)
+        self.wait_for(0.01)
+
+        # A closed connection that is no longer in the free queue but
+        # still in the pool is left to its close callback.
+        conn = pool._free[0]
+        conn.close()
+        pool._take()
+        ok(conn in pool._free) == False
+        pool._idle_timeout = 0
+        pool._reap()
+        ok(pool.stats()['connections']) == 2
+        pool.close()
+
+    def test_wait_queue(self):
+        pool = self.pool(min_size=0, max_size=2, max_pending=1)
+        order = []
+        def acquired(name):
+            def callback(conn):
+                order.append(name)
+                if isinstance(conn, Connection):
+                    conn.send_request(lambda reply: None, 'PING')
+                if len(order) == 4:
+                    self.stop()
+            return callback
+        for name in 'abcd':
+            pool.acquire(acquired(name))
+        ok(order) == ['a', 'b']
+        ok(pool.stats()['waiters']) == 2
+        ok(pool.stats()['connections']) == 2
+
+        # The waiters are served in order when replies arrive.
+        self.wait()
+        ok(order) == ['a', 'b', 'c', 'd']
+        ok(pool.stats()['waits']) == 2
+        pool.close()
+
+    def test_wait_queue_timeout(self):
+        pool = self.pool(min_size=0, max_size=1, acquire_timeout=0.01)
+        reserved = []
+        pool.reserve(reserved.append)
+        ok(len(reserved)) == 1
+
+        # The only connection is reserved, nobody else gets one in time.
+        pool.acquire(self.stop)
+        ok(self.wait()).instance_of(PoolError)
+        ok(pool.stats()['timeouts']) == 1
+        pool.close()
+
+
+if __name__ == '__main__':
+    runner([
+        ConnectionTest,
+        TimeoutRetryTest,
+        SocketTest,
+        ElasticPoolTest
+    ])
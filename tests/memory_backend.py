@@ -0,0 +1,177 @@
+import time
+import logging
+
+import akane
+from akane.memory import get_server
+
+from minitest import TornadoTestCase, ok, runner
+
+
+class MemoryBackendTest(TornadoTestCase):
+    name = 'In-memory Backend'
+
+    def setup(self):
+        self.server = get_server()
+        self.server.flushall()
+        self.server.clock = time.time
+        self.db = akane.Client({
+            'backend': 'memory',
+            'connections': 1,
+            'decode_responses': True,
+            'ioloop': self.io_loop
+        })
+
+    def test_strings(self):
+        self.db.set('a', 'value', callback=self.stop)
+        ok(self.wait()) == 'OK'
+        self.db.get('a', callback=self.stop)
+        ok(self.wait()) == 'value'
+
+        self.db.incrby('n', 5, callback=self.stop)
+        ok(self.wait()) == 5
+        self.db.incr('a', callback=self.stop)
+        ok(self.wait()).instance_of(akane.ReplyError)
+        self.db.mget(['a', 'n', 'missing'], callback=self.stop)
+        ok(self.wait()) == ['value', '5', None]
+
+    def test_expiry(self):
+        now = [1000.0]
+        self.server.clock = lambda: now[0]
+        self.db.set('a', 'value', 'EX', 10, callback=self.stop)
+        self.wait()
+        self.db.ttl('a', callback=self.stop)
+        ok(self.wait()) == 10
+
+        now[0] += 10
+        self.db.exists('a', callback=self.stop)
+        ok(self.wait()) == 0
+        self.db.ttl('a', callback=self.stop)
+        ok(self.wait()) == -2
+
+    def test_hashes(self):
+        self.db.hmset('h', {'a': 1, 'b': 2}, callback=self.stop)
+        ok(self.wait()) == 'OK'
+        self.db.hgetall('h', callback=self.stop)
+        ok(self.wait()) == {'a': '1', 'b': '2'}
+        self.db.hincrby('h', 'a', 2, callback=self.stop)
+        ok(self.wait()) == 3
+        self.db.get('h', callback=self.stop)
+        ok(self.wait()).instance_of(akane.ReplyError)
+
+    def test_sorted_sets(self):
+        self.db.zadd('z', [2, 'b', 1, 'a', 3, 'c'], callback=self.stop)
+        ok(self.wait()) == 3
+        self.db.zrange('z', 0, -1, with_scores=True, callback=self.stop)
+        ok(self.wait()) == [('a', 1.0), ('b', 2.0), ('c', 3.0)]
+        self.db.zrangebyscore('z', '(1', '+inf', 'LIMIT', 0, 1,
+                              callback=self.stop)
+        ok(self.wait()) == ['b']
+        self.db.zincrby('z', 0.5, 'a', callback=self.stop)
+        ok(self.wait()) == 1.5
+        self.db.zrevrank('z', 'a', callback=self.stop)
+        ok(self.wait()) == 2
+
+    def test_transaction(self):
+        self.db.transaction(watch=['a'], callback=self.stop)
+        transaction = self.wait()
+        # Another connection changes the watched key.
+        other = akane.Client({'backend': 'memory', 'ioloop': self.io_loop})
+        other.set('a', 'changed', callback=self.stop)
+        self.wait()
+
+        transaction.multi()
+        transaction.set('a', 'value')
+        transaction.execute(callback=self.stop)
+        ok(self.wait()).instance_of(akane.WatchError)
+        self.db.get('a', callback=self.stop)
+        ok(self.wait()) == 'changed'
+
+    def test_transaction_without_watch(self):
+        # Commands are queued right away.
+        self.db.transaction(callback=self.stop)
+        transaction = self.wait()
+        transaction.set('t', 'value')
+        transaction.incr('t')
+        transaction.execute(callback=self.stop)
+        result = self.wait()
+        ok(result[0]) == 'OK'
+        ok(result[1]).instance_of(akane.ReplyError)
+
+    def test_execute_without_multi(self):
+        self.db.transaction(watch=['t'], callback=self.stop)
+        transaction = self.wait()
+        try:
+            transaction.execute()
+        except ValueError as e:
+            ok(str(e)) == 'multi() has not been called'
+        else:
+            raise AssertionError('execute() without multi() was accepted')
+        transaction.discard(callback=self.stop)
+        self.wait()
+
+    def test_caching_client(self):
+        db = akane.CachingClient(self.db, notifications=False)
+        self.db.hmset('cached', {'a': 1, 'b': 2}, callback=self.stop)
+        self.wait()
+        db.hgetall('cached', callback=self.stop)
+        ok(self.wait()) == {'a': '1', 'b': '2'}
+
+        # Any write invalidates, also in pipelines and bulk loads.
+        db.hdel('cached', 'a', callback=self.stop)
+        self.wait()
+        db.hgetall('cached', callback=self.stop)
+        ok(self.wait()) == {'b': '2'}
+
+        pipe = db.pipeline()
+        pipe.hincrby('cached', 'b', 1)
+        pipe.execute(callback=self.stop)
+        self.wait()
+        db.hgetall('cached', callback=self.stop)
+        ok(self.wait()) == {'b': '3'}
+
+        db.bulk_load([('HSET', 'cached', 'c', 4)], callback=self.stop)
+        self.wait()
+        db.hgetall('cached', callback=self.stop)
+        ok(self.wait()) == {'b': '3', 'c': '4'}
+        ok(db.stats()['invalidations']) == 3
+
+        # Callers get their own copy of a cached hash.
+        db.hgetall('cached', callback=self.stop)
+        self.wait()['b'] = 'changed'
+        db.hgetall('cached', callback=self.stop)
+        ok(self.wait()) == {'b': '3', 'c': '4'}
+
+        # Keyspace notifications name keys as text, entries of bytes keys
+        # are found as well.
+        db.get(b'cached:bytes', callback=self.stop)
+        self.wait()
+        ok(db.stats()['size']) == 2
+        db.invalidate('cached:bytes')
+        ok(db.stats()['size']) == 1
+
+    def test_register_script_error(self):
+        # The in-memory server has no scripting, the error is logged.
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        logging.getLogger('akane.client').addHandler(handler)
+        try:
+            self.db.register_script('return 1')
+            self.io_loop.add_timeout(time.time() + 0.05, self.stop)
+            self.wait()
+        finally:
+            logging.getLogger('akane.client').removeHandler(handler)
+        ok(len(records)) == 1
+        ok(records[0].levelname) == 'WARNING'
+
+    def test_errors(self):
+        self.db.send_request(self.stop, 'NOSUCHCOMMAND')
+        ok(str(self.wait())) == "ERR unknown command 'NOSUCHCOMMAND'"
+        self.db.send_request(self.stop, 'GET')
+        ok(self.wait()).instance_of(akane.ReplyError)
+
+
+if __name__ == '__main__':
+    runner([
+        MemoryBackendTest
+    ])
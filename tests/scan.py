@@ -0,0 +1,59 @@
+from akane.client import Client
+
+from minitest import TestCase, ok, runner
+
+
+class FakeClient(Client):
+    """Answers ``SCAN`` requests from a list of pages when told to."""
+
+    def __init__(self, pages):
+        self._pages = pages
+        self.requests = []
+        self._pending = []
+
+    def send_request(self, callback, *args):
+        self.requests.append(args)
+        self._pending.append(callback)
+
+    def reply(self):
+        self._pending.pop(0)(self._pages.pop(0))
+
+
+class ScanIteratorTest(TestCase):
+    name = 'Scan Iterator'
+
+    def test_pages(self):
+        client = FakeClient([['3', ['a', 'b']], ['7', []], ['0', ['c']]])
+        pages = []
+        keys = client.scan_iter(match='k*', count=2)
+
+        keys.next(pages.append)
+        ok(client.requests) == [('SCAN', 0, 'MATCH', 'k*', 'COUNT', 2)]
+        client.reply()
+        ok(pages) == [['a', 'b']]
+
+        # The next page is requested before it's asked for, empty pages
+        # are skipped.
+        ok(client.requests[1]) == ('SCAN', '3', 'MATCH', 'k*', 'COUNT', 2)
+        client.reply()
+        ok(client.requests[2]) == ('SCAN', '7', 'MATCH', 'k*', 'COUNT', 2)
+        client.reply()
+        ok(len(client.requests)) == 3
+
+        keys.next(pages.append)
+        keys.next(pages.append)
+        ok(pages) == [['a', 'b'], ['c'], None]
+
+    def test_zscan_pairs(self):
+        client = FakeClient([['0', ['a', '1', 'b', '2.5']]])
+        pages = []
+        client.zscan_iter('z').each(pages.append, callback=pages.append)
+        ok(client.requests) == [('ZSCAN', 'z', 0)]
+        client.reply()
+        ok(pages) == [[('a', 1.0), ('b', 2.5)], None]
+
+
+if __name__ == '__main__':
+    runner([
+        ScanIteratorTest
+    ])
@@ -1,3 +1,5 @@
+import time
+
 import tornado.ioloop
 import tornado.testing
 import akane
@@ -11,6 +13,7 @@ class ServerCommandsTest(TornadoTestCase):
     def setup(self):
         self.db = akane.Client({
             'connections': 1,
+            'decode_responses': True,
             'ioloop': self.io_loop
         })
 
@@ -46,12 +49,191 @@ class ServerCommandsTest(TornadoTestCase):
         self.db.exists('test_not_exists', callback=self.stop)
         ok(self.wait()) == 0
 
+    def test_multiple_requests_in_flight(self):
+        replies = []
+        def collect(reply):
+            replies.append(reply)
+            if len(replies) == 3:
+                self.stop()
+
+        self.db.set('test_in_flight', 'value', callback=collect)
+        self.db.get('test_in_flight', callback=collect)
+        self.db.exists('test_in_flight', callback=collect)
+        self.wait()
+        ok(replies) == ['OK', 'value', 1]
+
+    def test_pipeline(self):
+        pipe = self.db.pipeline()
+        pipe.set('test_pipeline', 'value')
+        pipe.get('test_pipeline')
+        # Not an integer, the error stays at its place in the replies.
+        pipe.incr('test_pipeline')
+        pipe.get('test_pipeline')
+        pipe.execute(callback=self.stop)
+
+        replies = self.wait()
+        ok(replies[:2]) == ['OK', 'value']
+        ok(replies[2]).instance_of(akane.ReplyError)
+        ok(replies[3]) == 'value'
+        ok(len(pipe)) == 0
+
+    def test_pool_wait_queue(self):
+        db = akane.Client({
+            'connections': 1,
+            'max_pending': 1,
+            'decode_responses': True,
+            'ioloop': self.io_loop
+        })
+
+        replies = []
+        def collect(reply):
+            replies.append(reply)
+            if len(replies) == 2:
+                self.stop()
+
+        db.exists('test_pool_wait_queue', callback=collect)
+        db.exists('test_pool_wait_queue', callback=collect)
+        ok(db.stats()['waiters']) == 1
+        self.wait()
+        ok(replies) == [0, 0]
+        ok(db.stats()['waits']) == 1
+
+    def test_corking(self):
+        db = akane.Client({
+            'connections': 1,
+            'cork': True,
+            'decode_responses': True,
+            'ioloop': self.io_loop
+        })
+
+        replies = []
+        def collect(reply):
+            replies.append(reply)
+            if len(replies) == 3:
+                self.stop()
+
+        db.set('test_corking', 'value', callback=collect)
+        db.get('test_corking', callback=collect)
+        db.delete(('test_corking',), callback=collect)
+        self.wait()
+        ok(replies) == ['OK', 'value', 1]
+
+    def test_batch_client(self):
+        db = akane.BatchClient(self.db)
+        db.set('test_batch_client', 'value', callback=self.stop)
+        ok(self.wait()) == 'OK'
+
+        replies = []
+        def collect(reply):
+            replies.append(reply)
+            if len(replies) == 3:
+                self.stop()
+
+        db.get('test_batch_client', callback=collect)
+        db.get('test_batch_client', callback=collect)
+        db.get('test_not_exists', callback=collect)
+        self.wait()
+        ok(replies) == ['value', 'value', None]
+
+    def test_caching_client(self):
+        db = akane.CachingClient(self.db, notifications=False)
+        db.set('test_caching_client', 'value', callback=self.stop)
+        ok(self.wait()) == 'OK'
+
+        db.get('test_caching_client', callback=self.stop)
+        ok(self.wait()) == 'value'
+        db.get('test_caching_client', callback=self.stop)
+        ok(self.wait()) == 'value'
+        ok(db.stats()['hits']) == 1
+
+        db.set('test_caching_client', 'other', callback=self.stop)
+        self.wait()
+        db.get('test_caching_client', callback=self.stop)
+        ok(self.wait()) == 'other'
+        ok(db.stats()['invalidations']) == 1
+
+    def test_pubsub(self):
+        pubsub = self.db.pubsub()
+        pubsub.subscribe(['test_pubsub'], lambda c, m: self.stop((c, m)))
+
+        # Give the subscription some time to reach the server.
+        self.io_loop.add_timeout(time.time() + 0.1, lambda:
+            self.db.publish('test_pubsub', 'message'))
+        ok(self.wait()) == ('test_pubsub', ['message'])
+        pubsub.close()
+
+    def test_script(self):
+        script = self.db.register_script('return {KEYS[1], ARGV[1]}')
+        script(keys=('test_script',), args=('value',), callback=self.stop)
+        ok(self.wait()) == ['test_script', 'value']
+
+        self.db.script_flush(callback=self.stop)
+        ok(self.wait()) == 'OK'
+        script(keys=('test_script',), args=('value',), callback=self.stop)
+        ok(self.wait()) == ['test_script', 'value']
+
+    def test_transaction(self):
+        self.db.transaction(self.stop, watch=('test_transaction',))
+        tr = self.wait()
+        tr.multi()
+        tr.set('test_transaction', 'value')
+        tr.get('test_transaction')
+        tr.execute(callback=self.stop)
+        ok(self.wait()) == ['OK', 'value']
+
+    def test_transaction_watch_error(self):
+        other = akane.Client({'ioloop': self.io_loop})
+
+        self.db.transaction(self.stop, watch=('test_transaction',))
+        tr = self.wait()
+        other.set('test_transaction', 'changed', callback=self.stop)
+        self.wait()
+
+        tr.multi()
+        tr.set('test_transaction', 'value')
+        tr.execute(callback=self.stop)
+        ok(self.wait()).instance_of(akane.WatchError)
+
+    def test_future(self):
+        future = self.db.set('test_future', 'value')
+        self.io_loop.add_future(future, self.stop)
+        ok(self.wait().result()) == 'OK'
+
+        future = self.db.send_request(None, 'BOGUS')
+        self.io_loop.add_future(future, self.stop)
+        ok(self.wait().exception()).instance_of(akane.ReplyError)
+
+    def test_get_stream(self):
+        value = 'x' * 100000
+        self.db.set('test_get_stream', value, callback=self.stop)
+        self.wait()
+
+        chunks = []
+        self.db.get_stream('test_get_stream',
+                           lambda chunk: chunks.append(chunk.tobytes()),
+                           threshold=1000, callback=self.stop)
+        ok(self.wait()) == len(value)
+        ok(b''.join(chunks)) == value.encode()
+
+        buf = bytearray(len(value))
+        self.db.get_stream('test_get_stream', buf, threshold=1000,
+                           callback=self.stop)
+        ok(self.wait()) == len(value)
+        ok(bytes(buf)) == value.encode()
+
     def teardown(self):
         keys = (
             'test_get_and_set',
             'test_delete',
             'test_dump',
-            'test_exists'
+            'test_exists',
+            'test_in_flight',
+            'test_pipeline',
+            'test_batch_client',
+            'test_caching_client',
+            'test_transaction',
+            'test_future',
+            'test_get_stream'
         )
 
         self.db.delete(keys, callback=self.stop)
@@ -0,0 +1,90 @@
+import akane
+from akane.memory import get_server
+from akane.sharding import HashRing, hash_tag
+
+from minitest import TornadoTestCase, TestCase, ok, runner
+
+
+class HashRingTest(TestCase):
+    name = 'Consistent Hashing'
+
+    def test_hash_tag(self):
+        ok(hash_tag('user:1')) == 'user:1'
+        ok(hash_tag('{user:1}:name')) == 'user:1'
+        ok(hash_tag('name:{user:1}')) == 'user:1'
+        ok(hash_tag('{}:name')) == '{}:name'
+        ok(hash_tag(b'{user:1}:name')) == b'user:1'
+
+    def test_bytes_and_text_keys_same_node(self):
+        ring = HashRing([('a', 1), ('b', 1), ('c', 1)])
+        for i in range(100):
+            key = '{user:%d}:name' % i
+            ok(ring.get_node(key.encode('utf-8'))) == ring.get_node(key)
+
+    def test_same_hash_tag_same_node(self):
+        ring = HashRing([('a', 1), ('b', 1), ('c', 1)])
+        for i in range(100):
+            ok(ring.get_node('{user:%d}:name' % i)) == \
+                ring.get_node('{user:%d}:email' % i)
+
+    def test_distribution(self):
+        ring = HashRing([('a', 1), ('b', 1), ('c', 2)])
+        counts = {'a': 0, 'b': 0, 'c': 0}
+        for i in range(10000):
+            counts[ring.get_node('key:%d' % i)] += 1
+        ok(counts['a']) > 2000
+        ok(counts['b']) > 2000
+        ok(counts['c']) > 4000
+
+    def test_removing_a_node_only_moves_its_keys(self):
+        before = HashRing([('a', 1), ('b', 1), ('c', 1)])
+        after = HashRing([('a', 1), ('b', 1)])
+        for i in range(1000):
+            key = 'key:%d' % i
+            if before.get_node(key) != 'c':
+                ok(after.get_node(key)) == before.get_node(key)
+
+
+
+class ShardedClientTest(TornadoTestCase):
+    name = 'Sharded Client'
+
+    def setup(self):
+        # Two in-memory servers.
+        self.nodes = ['localhost:16001', 'localhost:16002']
+        for node in self.nodes:
+            host, port = node.split(':')
+            get_server(host, int(port)).flushall()
+        self.db = akane.ShardedClient(self.nodes, {
+            'backend': 'memory',
+            'decode_responses': True,
+            'ioloop': self.io_loop
+        })
+
+    def test_mset_mget(self):
+        keys = ['key:%d' % i for i in range(20)]
+        self.db.mset(dict((key, key) for key in keys), callback=self.stop)
+        ok(self.wait()) == 'OK'
+        self.db.mget(keys, callback=self.stop)
+        ok(self.wait()) == keys
+
+    def test_scan_iter(self):
+        keys = ['scan:%d' % i for i in range(20)]
+        self.db.mset(dict((key, key) for key in keys), callback=self.stop)
+        self.wait()
+        found = []
+        self.db.scan_iter(match='scan:*', count=5).each(
+            found.extend, callback=self.stop)
+        ok(self.wait()) == None
+        ok(sorted(found)) == sorted(keys)
+
+    def test_keyless_command(self):
+        self.db.publish('channel', 'message', callback=self.stop)
+        ok(self.wait()).instance_of(ValueError)
+
+
+if __name__ == '__main__':
+    runner([
+        HashRingTest,
+        ShardedClientTest
+    ])
@@ -0,0 +1,45 @@
+from akane.stats import Histogram, Stats
+
+from minitest import TestCase, ok, runner
+
+
+class StatsTest(TestCase):
+    name = 'Stats'
+
+    def test_histogram(self):
+        histogram = Histogram()
+        for value in range(1, 1001):
+            histogram.record(value)
+        ok(histogram.count) == 1000
+        ok(histogram.max) == 1000
+        ok(histogram.percentile(0.01)) == 10
+        # Large values are rounded up by at most 1/32.
+        ok(500 <= histogram.percentile(0.5) <= 500 * 33 / 32.0) == True
+        ok(histogram.percentile(1.0)) == 1000
+
+    def test_wrap(self):
+        stats = Stats()
+        traced = []
+        replies = []
+        stats.add_hook(before=lambda args: args[1],
+                       after=lambda args, reply, elapsed, token:
+                       traced.append((args[0], reply, token)))
+
+        stats.wrap(replies.append, ('GET', 'a'))('1')
+        stats.wrap(None, ('SET', 'a', '1'))(ValueError('oops'))
+        ok(replies) == ['1']
+        ok([t[0] for t in traced]) == ['GET', 'SET']
+        ok(traced[0][2]) == 'a'
+
+        snapshot = stats.snapshot()
+        ok(sorted(snapshot['commands'])) == ['GET', 'SET']
+        ok(snapshot['commands']['GET']['count']) == 1
+        ok(snapshot['replies']) == 2
+        ok(snapshot['errors']) == 1
+        ok(snapshot['pools']) == []
+
+
+if __name__ == '__main__':
+    runner([
+        StatsTest
+    ])